@@ -2,8 +2,25 @@
 
 import { fetchJSON } from '../fetchJSON.ts';
 
-import { FileDrops, RainerTree, RefactorRainerFile } from './types';
-import { RainerFile } from './models';
+import { FileDrops, RainerBatch, RainerBatchResult, RainerMetrics, RainerSearchResult, RainerTelemetrySummary, RainerTree, RainerTreeNode, RefactorRainerFile } from './types';
+import { RainerFile, RainerJob } from './models';
+
+export async function endpoint_apply_batch(
+	body: RainerBatch
+): Promise<RainerBatchResult> {
+	return fetchJSON('rainer/batch', {
+		method: "POST",
+		body: JSON.stringify(body)
+	});
+}
+
+export async function endpoint_cancel_job(
+	params: { job_id: string }
+): Promise<void> {
+	return fetchJSON(`rainer/jobs/${params.job_id}/cancel` , {
+		method: "POST"
+	});
+}
 
 export async function endpoint_create_directory(
 	body: {project: string, path: string}
@@ -16,7 +33,7 @@ export async function endpoint_create_directory(
 
 export async function endpoint_create_file(
 	body: RefactorRainerFile
-): Promise<RainerFile> {
+): Promise<RainerJob> {
 	return fetchJSON('rainer/file/new', {
 		method: "POST",
 		body: JSON.stringify(body)
@@ -56,15 +73,47 @@ export async function endpoint_get_file_drops(
 	});
 }
 
-export async function endpoint_get_rainer_tree(): Promise<RainerTree> {
-	return fetchJSON('rainer/tree', {
+export async function endpoint_get_job(
+	params: { job_id: string }
+): Promise<RainerJob> {
+	return fetchJSON(`rainer/jobs/${params.job_id}` , {
+		method: "GET"
+	});
+}
+
+export async function endpoint_get_metrics(): Promise<RainerMetrics> {
+	return fetchJSON('rainer/metrics', {
+		method: "GET"
+	});
+}
+
+export async function endpoint_get_rainer_tree(
+	query?: { project?: string, prefix?: string, depth?: string }
+): Promise<RainerTree | RainerTreeNode> {
+	return fetchJSON('rainer/tree' + (query ? '?' + new URLSearchParams(query).toString() : ''), {
+		method: "GET"
+	});
+}
+
+export async function endpoint_get_telemetry_summary(
+	query?: { days?: string, operation?: string }
+): Promise<RainerTelemetrySummary[]> {
+	return fetchJSON('rainer/telemetry' + (query ? '?' + new URLSearchParams(query).toString() : ''), {
+		method: "GET"
+	});
+}
+
+export async function endpoint_search_project(
+	query?: { project?: string, query?: string, prefix?: string, context?: string, case_sensitive?: string }
+): Promise<RainerSearchResult> {
+	return fetchJSON('rainer/search' + (query ? '?' + new URLSearchParams(query).toString() : ''), {
 		method: "GET"
 	});
 }
 
 export async function endpoint_update_file(
 	body: RefactorRainerFile
-): Promise<RainerFile> {
+): Promise<RainerJob> {
 	return fetchJSON('rainer/file/update', {
 		method: "PUT",
 		body: JSON.stringify(body)
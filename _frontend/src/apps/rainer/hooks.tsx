@@ -6,11 +6,13 @@ import {
   endpoint_get_file_contents,
   endpoint_create_file,
   endpoint_update_file,
+  endpoint_get_job,
   endpoint_delete_file,
   endpoint_create_directory,
   endpoint_delete_directory,
 } from "./endpoints";
-import { RefactorRainerFile } from "@/apps/rainer/types";
+import { RainerOperationEvent, RainerTree, RefactorRainerFile } from "@/apps/rainer/types";
+import { RainerJob } from "@/apps/rainer/models";
 
 type FileIdentifier = { project: string; path: string };
 
@@ -30,6 +32,60 @@ interface RainerContextType {
   deleteDirectory: (key: FileIdentifier) => void;
 }
 
+const JOB_POLL_INTERVAL_MS = 1500;
+
+// File generations run as background jobs; resolve once the job has finished
+async function waitForJob(job: RainerJob): Promise<RainerJob> {
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    job = await endpoint_get_job({ job_id: job.id });
+  }
+  if (job.status === "failed") throw new Error(job.error || "Job failed");
+  return job;
+}
+
+// How long to wait before reopening a job event stream the server turned away (503, too many open streams)
+const JOB_EVENTS_RETRY_MS = 5000;
+
+// Follow a job's progress events live; returns a function that closes the stream
+export function subscribeToJobEvents(jobId: string, onEvent: (event: RainerOperationEvent) => void): () => void {
+  let source: EventSource | null = null;
+  let lastEventId = "";
+  let closed = false;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+
+  const close = () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+
+  const open = () => {
+    const resume = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : "";
+    source = new EventSource(`${import.meta.env.VITE_QUICKE_API_ROOT}/rainer/jobs/${jobId}/events${resume}`);
+    const handle = (message: MessageEvent) => {
+      if (message.lastEventId) lastEventId = message.lastEventId;
+      const event = JSON.parse(message.data) as RainerOperationEvent;
+      onEvent(event);
+      if (event.type === "job_end") close();
+    };
+    for (const type of [
+      "job_start", "job_end", "operation_start", "operation_end", "step_start", "step_end",
+      "agent_turn_start", "agent_turn_end", "tool_call", "tool_output", "handoff",
+      "message", "message_delta", "compaction", "patch_applied", "patch_failed",
+    ]) {
+      source.addEventListener(type, handle);
+    }
+    // EventSource reconnects by itself when a stream ends, but gives up on an error response
+    source.onerror = () => {
+      if (!closed && source?.readyState === EventSource.CLOSED) retry = setTimeout(open, JOB_EVENTS_RETRY_MS);
+    };
+  };
+
+  open();
+  return close;
+}
+
 const RainerContext = createContext<RainerContextType | null>(null);
 
 const RainerProjectContext = createContext<{
@@ -40,7 +96,8 @@ const RainerProjectContext = createContext<{
 function useTree() {
   return useQuery({
     queryKey: ["rainer", "tree"],
-    queryFn: endpoint_get_rainer_tree,
+    // Without a project the endpoint returns every full tree
+    queryFn: () => endpoint_get_rainer_tree() as Promise<RainerTree>,
   });
 }
 
@@ -57,14 +114,14 @@ export const RainerProvider: React.FC<{ children: React.ReactNode }> = ({ childr
   const treeQuery = useTree();
 
   const createFileMutation = useMutation({
-    mutationFn: endpoint_create_file,
+    mutationFn: async (payload: RefactorRainerFile) => waitForJob(await endpoint_create_file(payload)),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ["rainer", "tree"] });
     },
   });
 
   const updateFileMutation = useMutation({
-    mutationFn: endpoint_update_file,
+    mutationFn: async (payload: RefactorRainerFile) => waitForJob(await endpoint_update_file(payload)),
     onSuccess: (_data, vars) => {
       queryClient.invalidateQueries({ queryKey: ["rainer", "file", vars.project, vars.path] });
     },
@@ -15,7 +15,48 @@ export interface CodeGenerationData {
   drop_number: number;
 }
 
+export interface CodeGenerationTelemetry {
+  id: string;
+  name: string;
+  created_at: Date;
+  updated_at: Date;
+  deleted_at: Date;
+  generation: CodeGenerationData | undefined;
+  operation: string;
+  llm_model: string;
+  rainer_project: string;
+  rainer_path: string;
+  success: boolean;
+  wall_seconds: number;
+  iterations: number;
+  agent_turns: Record<string, any>[];
+  tool_calls: Record<string, { count: number, seconds: number }>;
+  input_tokens: number;
+  output_tokens: number;
+  tokens_saved: number;
+  stop_reason: string;
+  abandoned_turns: number;
+  abandoned_tool_calls: number;
+  abandoned_tokens: number;
+}
+
 export interface RainerFile {
   project: string;
   path: string;
 }
+
+export interface RainerJob {
+  id: string;
+  name: string;
+  created_at: Date;
+  updated_at: Date;
+  deleted_at: Date;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  payload: Record<string, any>;
+  result: Record<string, any>;
+  error: string;
+  started_at: Date;
+  finished_at: Date;
+  claimed_until: Date;
+}
@@ -7,6 +7,79 @@ export type ProjectTree = TreeNode & { __path__: string }
 
 export type RainerTree = Record<string, ProjectTree>;
 
+export type RainerTreeNode = {
+    name: string;
+    path: string;
+    type: "file" | "directory";
+    child_count?: number;
+    children?: RainerTreeNode[];
+}
+
+export type RainerSearchMatch = {
+    path: string;
+    line: number;
+    text: string;
+    before: string[];
+    after: string[];
+}
+
+export type RainerSearchResult = {
+    matches: RainerSearchMatch[];
+    complete: boolean;
+    truncated: boolean;
+}
+
+
+export type RainerBatchOperation =
+    | { action: "create" | "update"; path: string; content: string }
+    | { action: "delete"; path: string };
+
+export type RainerBatch = {
+    project: string;
+    operations: RainerBatchOperation[];
+}
+
+export type RainerBatchResult = {
+    project: string;
+    version: number;
+    etag: string;
+}
+
+// Progress event of a background job, streamed from rainer/jobs/<job_id>/events
+export type RainerOperationEvent = {
+    type: "job_start" | "job_end" | "operation_start" | "operation_end" | "step_start" | "step_end"
+        | "agent_turn_start" | "agent_turn_end" | "tool_call" | "tool_output" | "handoff"
+        | "message" | "message_delta" | "compaction" | "patch_applied" | "patch_failed";
+    time?: number;
+    [key: string]: unknown;
+}
+
+export type RainerPercentiles = {
+    p50: number;
+    p95: number;
+}
+
+// Agent operation performance per operation type and model, from rainer/telemetry
+export type RainerTelemetrySummary = {
+    operation: string;
+    llm_model: string;
+    runs: number;
+    success_rate: number;
+    wall_seconds: RainerPercentiles;
+    turn_seconds: RainerPercentiles;
+    iterations: RainerPercentiles;
+    input_tokens: RainerPercentiles;
+    output_tokens: RainerPercentiles;
+    tokens_saved: number;
+    tool_calls: Record<string, { count: number, seconds: number }>;
+    timeouts: number;
+    cancellations: number;
+    abandoned_turns: number;
+    abandoned_tool_calls: number;
+    abandoned_tokens: number;
+}
+
+export type RainerMetrics = Record<string, number>;
 
 export type RefactorRainerFile = RainerFile & {content: string; file_references: RainerFile[]};
 
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -72,6 +73,10 @@ CORS_ALLOWED_ORIGINS = [
 ]
 CSRF_TRUSTED_ORIGINS = [*CORS_ALLOWED_ORIGINS]
 
+# fetchJSON revalidates GETs with If-None-Match and reads the ETag of the response
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 ROOT_URLCONF = 'api.urls'
@@ -162,7 +167,7 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CELERY_BROKER_URL = "redis://192.168.1.116:6379"  # Or your actual Redis URL
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://192.168.1.116:6379")  # Or your actual Redis URL
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
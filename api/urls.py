@@ -5,6 +5,7 @@ from django.urls import include, path
 from rest_framework import routers
 
 from rainer import ensure_migrations
+from rainer.endpoints import job_events
 
 router = routers.DefaultRouter()
 
@@ -19,6 +20,7 @@ for app in QUICKE_APPS:
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('rainer/jobs/<str:job_id>/events', job_events),
     path('', include(router.urls)),
     path('', include("quicke.urls")),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -1,8 +1,7 @@
-from agents import Agent
-from .tools import project_tree, project_file_lookup
+import threading
+from collections.abc import Mapping
+
 from .lib import load_directives, load_persona
-from rainer.settings import DEFAULT_GPT_MODEL
-from . import personas, directives, intros, models  # New module: `intros.py` stores *_INTRO constants
 
 
 def load_constant(module, const_name, default):
@@ -10,6 +9,12 @@ def load_constant(module, const_name, default):
 
 
 def build_agent(name: str):
+    # Imported here so importing the team costs nothing until an agent is needed
+    from agents import Agent
+    from rainer.settings import DEFAULT_GPT_MODEL
+    from .tools import project_tree, project_file_lookup, project_file_batch_lookup, project_grep
+    from . import personas, directives, intros, models  # New module: `intros.py` stores *_INTRO constants
+
     agent_persona = load_constant(personas, f"{name}_PERSONA", default="NO_PERSONA")
     agent_directives = load_constant(directives, f"{name}_DIRECTIVES", default=[])
     agent_intro = load_constant(intros, f"{name}_INTRO", default="NO_INTRO")
@@ -19,7 +24,7 @@ def build_agent(name: str):
         name=name,
         instructions=load_persona(agent_persona) + "\n\n" + load_directives(agent_directives),
         model=agent_model,
-        tools=[project_tree, project_file_lookup],
+        tools=[project_tree, project_file_lookup, project_file_batch_lookup, project_grep],
     )
 
     # Attach extra agent metadata
@@ -27,29 +32,57 @@ def build_agent(name: str):
     return agent
 
 
-# Instantiate all agents
-AGENT_NEONRAIL = build_agent("NEONRAIL")
-AGENT_SUGARBYTE = build_agent("SUGARBYTE")
-AGENT_BLACKSOCKET = build_agent("BLACKSOCKET")
-AGENT_CHROMEDUMP = build_agent("CHROMEDUMP")
-AGENT_ZENPROXY = build_agent("ZENPROXY")
-AGENT_HEXLACE = build_agent("HEXLACE")
-AGENT_QUANTFLASH = build_agent("QUANTFLASH")
-AGENT_GUTTERZEN = build_agent("GUTTERZEN")
-AGENT_NULLDIVE = build_agent("NULLDIVE")
-AGENT_CASSETTEECHO = build_agent("CASSETTEECHO")
-AGENT_OVERDRIVE = build_agent("OVERDRIVE")
-
-A_TEAM = {
-    "NEONRAIL": AGENT_NEONRAIL,
-    "SUGARBYTE": AGENT_SUGARBYTE,
-    "BLACKSOCKET": AGENT_BLACKSOCKET,
-    "CHROMEDUMP": AGENT_CHROMEDUMP,
-    "ZENPROXY": AGENT_ZENPROXY,
-    "HEXLACE": AGENT_HEXLACE,
-    "QUANTFLASH": AGENT_QUANTFLASH,
-    "GUTTERZEN": AGENT_GUTTERZEN,
-    "NULLDIVE": AGENT_NULLDIVE,
-    "CASSETTEECHO": AGENT_CASSETTEECHO,
-    "OVERDRIVE": AGENT_OVERDRIVE,
-}
+TEAM_NAMES = (
+    "NEONRAIL",
+    "SUGARBYTE",
+    "BLACKSOCKET",
+    "CHROMEDUMP",
+    "ZENPROXY",
+    "HEXLACE",
+    "QUANTFLASH",
+    "GUTTERZEN",
+    "NULLDIVE",
+    "CASSETTEECHO",
+    "OVERDRIVE",
+)
+
+
+class LazyTeam(Mapping):
+    """Agents by name, each built on first access and cached for the life of the process."""
+
+    def __init__(self, names):
+        self._names = tuple(names)
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str):
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self._names:
+            raise KeyError(name)
+
+        with self._lock:
+            if name not in self._agents:
+                self._agents[name] = build_agent(name)
+            return self._agents[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+A_TEAM = LazyTeam(TEAM_NAMES)
+
+
+def __getattr__(name: str):
+    # AGENT_NEONRAIL etc. resolve through A_TEAM, so `from gpt.the_a_team import AGENT_X` builds only that agent
+    if name.startswith("AGENT_") and name[len("AGENT_"):] in A_TEAM:
+        return A_TEAM[name[len("AGENT_"):]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + [f"AGENT_{name}" for name in TEAM_NAMES])
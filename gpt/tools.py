@@ -1,27 +1,146 @@
-﻿import json
-from typing import Optional
+﻿import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from agents import function_tool
+from agents import function_tool, RunContextWrapper
 
-from rainer.fileapi import get_rainer_file_contents, project_trees
+from rainer.fileapi import get_rainer_file_contents, get_project_tree_json, sync_tree, search_project_files
+
+# Most files one project_file_batch_lookup call returns
+MAX_BATCH_LOOKUP_PATHS = 20
+
+DEADLINE_PASSED = "Operation deadline passed; not looked up"
+
+
+def read_project_file(project: str, path: str) -> str:
+    if not path.strip():
+        return "No path provided"
+    try:
+        return get_rainer_file_contents(project, path) or "File does not exist"
+    except UnicodeDecodeError:
+        return "File is not a text file"
+    except OSError as e:
+        return f"File could not be read: {e.strerror}"
+
+
+def read_project_tree(project: str) -> str:
+    sync_tree(project)
+    return get_project_tree_json(project)
+
+
+class ToolContext:
+    """
+    Run context of one agent operation, handed to its tools by the Runner.
+
+    Each file is read once per operation, off the event loop; lookups that arrive while the
+    read is still running (parallel tool calls, agents answering side by side) wait for it.
+    Once the operation's `deadline` (a time.monotonic() value) has passed, tools start no new work.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self._reads: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.deadline = deadline
+        self.lookups = 0
+        self.reads = 0
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    async def read_file(self, project: str, path: str) -> str:
+        self.lookups += 1
+        key = (project, path.strip().lstrip("/"))
+        read = self._reads.get(key)
+        if read is None:
+            self.reads += 1
+            read = self._reads[key] = asyncio.ensure_future(asyncio.to_thread(read_project_file, *key))
+        return await asyncio.shield(read)
+
+
+def tool_context(ctx: Optional[RunContextWrapper[Any]]) -> Optional[ToolContext]:
+    context = ctx.context if ctx is not None else None
+    return context if isinstance(context, ToolContext) else None
+
+
+async def lookup_file(ctx: RunContextWrapper[Any], project: str, path: str) -> str:
+    context = tool_context(ctx)
+    if context is not None:
+        if context.expired():
+            return DEADLINE_PASSED
+        return await context.read_file(project, path)
+    return await asyncio.to_thread(read_project_file, project, path)
 
 
 @function_tool(
     name_override="project_file_lookup",
     description_override="Lookup files in the project directory by providing a relative file path"
 )
-async def project_file_lookup(project: str, path: str) -> Optional[str]:
+async def project_file_lookup(ctx: RunContextWrapper[Any], project: str, path: str) -> Optional[str]:
     if not project.strip():
         return "No branch name provided"
 
-    if not path.strip():
-        return "No path provided"
+    return await lookup_file(ctx, project, path)
+
+
+@function_tool(
+    name_override="project_file_batch_lookup",
+    description_override="Lookup several files in the project directory at once by providing their relative "
+                         f"file paths (at most {MAX_BATCH_LOOKUP_PATHS}); prefer this over many single lookups"
+)
+async def project_file_batch_lookup(ctx: RunContextWrapper[Any], project: str, paths: List[str]) -> str:
+    if not project.strip():
+        return "No branch name provided"
+
+    paths = list(dict.fromkeys(path.strip() for path in paths if path.strip()))
+    if not paths:
+        return "No paths provided"
 
-    return get_rainer_file_contents(project, path) or "File does not exist"
+    skipped = paths[MAX_BATCH_LOOKUP_PATHS:]
+    paths = paths[:MAX_BATCH_LOOKUP_PATHS]
+    contents = await asyncio.gather(*(lookup_file(ctx, project, path) for path in paths))
+
+    sections = [f"--- FILE: {path} ---\n{text}" for path, text in zip(paths, contents)]
+    if skipped:
+        sections.append(f"(not looked up, over the limit of {MAX_BATCH_LOOKUP_PATHS}: {', '.join(skipped)})")
+    return "\n\n".join(sections)
 
 
 @function_tool(
     name_override="project_tree", description_override="Provides the tree structure of the given project"
 )
 async def project_tree(project: str) -> str:
-    return json.dumps(project_trees.get(project, {}))
\ No newline at end of file
+    # Off the loop: syncing stats every directory of the project, and a changed tree is serialized again
+    return await asyncio.to_thread(read_project_tree, project)
+
+
+@function_tool(
+    name_override="project_grep",
+    description_override="Search the project's files for a literal, case-insensitive string; "
+                         "optionally limit the search to a directory with path_prefix (use \"\" for the whole project)"
+)
+async def project_grep(ctx: RunContextWrapper[Any], project: str, query: str, path_prefix: str) -> str:
+    if not query.strip():
+        return "No query provided"
+    context = tool_context(ctx)
+    if context is not None and context.expired():
+        return DEADLINE_PASSED
+
+    # Off the loop: until the search index is ready this reads every file of the project
+    result = await asyncio.to_thread(search_project_files, project, query, path_prefix.strip().strip("/"),
+                                     context=1, max_results=30)
+    if result is None:
+        return "Project does not exist"
+    if not result["matches"]:
+        return "No matches"
+
+    lines = []
+    for match in result["matches"]:
+        for offset, text in enumerate(match["before"], start=match["line"] - len(match["before"])):
+            lines.append(f"{match['path']}-{offset}- {text}")
+        lines.append(f"{match['path']}:{match['line']}: {match['text']}")
+        for offset, text in enumerate(match["after"], start=match["line"] + 1):
+            lines.append(f"{match['path']}-{offset}- {text}")
+        lines.append("--")
+
+    if result["truncated"]:
+        lines.append("(more matches not shown; narrow the query or path_prefix)")
+    return "\n".join(lines)
@@ -1,22 +1,38 @@
 ﻿FETCH_JSON = """
 
+// Last ETag and parsed body per GET url, used to revalidate with If-None-Match
+const etagCache = new Map<string, { etag: string; body: any }>();
+
 export const createFetchJSON = (apiRoot: string) => {
     return async (url: string, options: RequestInit = {}): Promise<any> => {
         const fullUrl = `${apiRoot}${url.startsWith("/") ? url : `/${url}`}`;
+        const isGet = (options.method || "GET").toUpperCase() === "GET";
+        const cached = isGet ? etagCache.get(fullUrl) : undefined;
 
         const response = await fetch(fullUrl, {
             ...options,
             headers: {
                 "Content-Type": "application/json",
+                ...(cached ? { "If-None-Match": cached.etag } : {}),
                 ...(options.headers || {}),
             },
         });
 
+        if (response.status === 304 && cached) {
+            return cached.body;
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP error! Status: ${response.status}`);
         }
 
-        return response.json();
+        const body = await response.json();
+        const etag = response.headers.get("ETag");
+        if (isGet && etag) {
+            etagCache.set(fullUrl, { etag, body });
+        }
+
+        return body;
     };
 };
 
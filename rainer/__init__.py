@@ -1,6 +1,6 @@
 from .settings import RAINER_PROJECTS, EXCLUDED_FILE_EXTENSIONS, EXCLUDED_FILE_NAMES, EXCLUDED_DIRS
 from .types import RainerFile
-from .fileapi import build_rainer_trees
+from .fileapi import build_rainer_trees, project_trees
 
 
 def ensure_migrations(app_name="rainer") -> None:
@@ -24,5 +24,4 @@ def ensure_migrations(app_name="rainer") -> None:
     except Exception as e:
         print(f"Error occurred while checking or applying migrations for {app_name}: {e}")
 
-project_trees = build_rainer_trees()
 paths = {project: path for project, path in RAINER_PROJECTS.items()}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CodeGenerationData
+from .models import CodeGenerationData, CodeGenerationTelemetry, RainerJob
 
 
 @admin.register(CodeGenerationData)  # 📝 Registering the CodeGenerationData model with the admin site
@@ -10,3 +10,17 @@ class CodeGenerationDataAdmin(admin.ModelAdmin):
     )  # 👀 Fields to display in the list view
     search_fields = ('llm_model',)  # 🔍 Fields to search in the admin interface
     list_filter = ('llm_model',)  # 📊 Fields to filter the list view
+
+
+
+@admin.register(RainerJob)
+class RainerJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'status', 'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
+
+
+@admin.register(CodeGenerationTelemetry)
+class CodeGenerationTelemetryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'operation', 'llm_model', 'success', 'stop_reason', 'wall_seconds', 'iterations',
+                    'input_tokens', 'output_tokens')
+    list_filter = ('operation', 'llm_model', 'success', 'stop_reason')
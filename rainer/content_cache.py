@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+FileStat = Tuple[int, int]
+
+
+class FileContentCache:
+    """
+    Byte-capped LRU of decoded file contents.
+
+    Entries are keyed by absolute path and only served while the file's (mtime_ns, size)
+    still matches the stat taken when they were stored; the fileapi write functions also
+    drop entries explicitly through `invalidate()`. Content digests (used for ETags) are
+    kept separately, capped by count rather than bytes, so files too large to cache still
+    only get hashed once per change.
+    """
+
+    def __init__(self, max_bytes: int, max_digests: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_digests = max_digests
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[FileStat, str]]" = OrderedDict()
+        self._digests: "OrderedDict[str, Tuple[FileStat, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, abs_path: str, signature: FileStat) -> Optional[str]:
+        key = os.path.abspath(abs_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, abs_path: str, signature: FileStat, contents: str) -> None:
+        size = signature[1]
+        if size > self.max_bytes:
+            return
+
+        key = os.path.abspath(abs_path)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (signature, contents)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_digest(self, abs_path: str, signature: FileStat) -> Optional[str]:
+        key = os.path.abspath(abs_path)
+        with self._lock:
+            entry = self._digests.get(key)
+            if entry is None or entry[0] != signature:
+                return None
+            self._digests.move_to_end(key)
+            return entry[1]
+
+    def put_digest(self, abs_path: str, signature: FileStat, digest: str) -> None:
+        key = os.path.abspath(abs_path)
+        with self._lock:
+            self._digests[key] = (signature, digest)
+            self._digests.move_to_end(key)
+            while len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+
+    def invalidate(self, abs_path: str) -> None:
+        """Drop the entry for `abs_path` and, if it is a directory, every entry below it."""
+        key = os.path.abspath(abs_path)
+        prefix = os.path.join(key, "")
+        with self._lock:
+            for cached in [k for k in self._entries if k == key or k.startswith(prefix)]:
+                self._drop(cached)
+            for cached in [k for k in self._digests if k == key or k.startswith(prefix)]:
+                del self._digests[cached]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "digests": len(self._digests),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, key: str) -> None:
+        signature, _ = self._entries.pop(key)
+        self.current_bytes -= signature[1]
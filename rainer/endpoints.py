@@ -1,29 +1,114 @@
+import asyncio
 import json
 import mimetypes
 import os
+import threading
+import time
+import uuid
+from datetime import timedelta
 
 from django.db import models
-from django.http import JsonResponse, FileResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 
 import quicke
-from rainer.models import CodeGenerationData
+from rainer.models import CodeGenerationData, CodeGenerationTelemetry, RainerJob, RainerJobStatus
 from rainer.types import RainerFile
 from .fileapi import (
-    get_rainer_file_contents, project_trees, update_rainer_file, unpack_file_ref,
-    create_rainer_directory, create_rainer_file, delete_rainer_file, delete_rainer_directory,
-    get_file_path
+    get_rainer_file_contents, get_trees_json,
+    create_rainer_directory, delete_rainer_file, delete_rainer_directory,
+    get_file_path, get_rainer_tree_node, sync_trees, parse_byte_range, iter_file_range, get_trees_etag, get_rainer_file_digest,
+    search_project_files, apply_rainer_batch, content_cache
 )
-from .settings import DEFAULT_GPT_MODEL
+from .events import get_event_log
+from .jobs import enqueue_job, fail_expired_job
+from .settings import RAINER_MAX_EVENT_STREAMS
+
+# Seconds between SSE comments that keep idle job event streams (and proxies) alive
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+# A job event stream is closed after this long, freeing its connection; the client reconnects and resumes
+JOB_EVENTS_MAX_SECONDS = 60
+# How often an open job event stream checks for new events
+JOB_EVENTS_POLL_SECONDS = 0.5
+# Seconds a client turned away because RAINER_MAX_EVENT_STREAMS streams are open should wait
+JOB_EVENTS_RETRY_AFTER_SECONDS = 5
+
+_event_streams = threading.BoundedSemaphore(RAINER_MAX_EVENT_STREAMS)
+
+
+def is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+def rainer_tree_etag(_):
+    # Runs before the view, so external edits are picked up before the validator is computed
+    sync_trees()
+    return get_trees_etag()
+
+
+def file_contents_etag(request):
+    digest = get_rainer_file_digest(request.GET.get("project", ""), request.GET.get("path", ""))
+    if not digest:
+        return None
+    # JSON and raw modes are different representations of the same file
+    return f"{request.GET.get('mode', 'json')}-{digest}"
 
 
 # 🌳 Endpoint to get the Rainer tree structure
+# Without `project` every full tree is returned; with it, the node at `prefix` expanded `depth` levels
+@condition(etag_func=rainer_tree_etag)
 @quicke.endpoint("rainer/tree", {
-    "response_type": "RainerTree",
-    "imports": [("./types", "RainerTree")]
+    "response_type": "RainerTree | RainerTreeNode",
+    "query_params": ["project", "prefix", "depth"],
+    "imports": [("./types", "RainerTree, RainerTreeNode")]
+})
+def get_rainer_tree(request):
+    project = request.GET.get("project", "")
+    if not project:
+        return HttpResponse(get_trees_json(), content_type="application/json")
+
+    try:
+        depth = int(request.GET.get("depth") or 1)
+    except ValueError:
+        return JsonResponse({"error": "depth must be an integer"}, status=400)
+
+    node = get_rainer_tree_node(project, request.GET.get("prefix", ""), max(depth, 0))
+    if node is None:
+        return JsonResponse({"error": "Path not found"}, status=404)
+
+    return JsonResponse(node)
+
+
+# 🔎 Endpoint to search file contents of a project for a literal string
+# `complete` is false while the background index is still being built (results then come from a full scan)
+@quicke.endpoint("rainer/search", {
+    "response_type": "RainerSearchResult",
+    "query_params": ["project", "query", "prefix", "context", "case_sensitive"],
+    "imports": [("./types", "RainerSearchResult")]
 })
-def get_rainer_tree(_):
-    return JsonResponse(project_trees, safe=False)
+def search_project(request):
+    try:
+        context = int(request.GET.get("context") or 2)
+    except ValueError:
+        return JsonResponse({"error": "context must be an integer"}, status=400)
+
+    result = search_project_files(
+        request.GET.get("project", ""),
+        request.GET.get("query", ""),
+        request.GET.get("prefix", "").strip("/"),
+        min(max(context, 0), 10),
+        request.GET.get("case_sensitive", "") in ("1", "true"),
+    )
+    if result is None:
+        return JsonResponse({"error": "Unknown project or empty query"}, status=400)
+
+    return JsonResponse(result)
 
 
 # Ensure `.webp` and other formats are recognized
@@ -34,7 +119,42 @@ mimetypes.add_type("image/jpeg", ".jpeg")
 mimetypes.add_type("image/gif", ".gif")
 
 
+def stream_file_response(request, file_path: str, mime_type: str | None):
+    """Serve raw file bytes in chunks, honoring a single HTTP Range if the client sent one."""
+    size = os.path.getsize(file_path)
+    content_type = mime_type or "text/plain; charset=utf-8"
+
+    # A Range conditioned on a stale If-Range validator gets the full, current file instead
+    if_range = request.headers.get("If-Range", "")
+    range_header = request.headers.get("Range", "")
+    if if_range and if_range.strip('"') != file_contents_etag(request):
+        range_header = ""
+
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(iter_file_range(file_path), content_type=content_type)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(file_path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
 # 📁 Endpoint to get the contents of a specific file
+# `mode=raw` streams the bytes as-is (with Range support) instead of a JSON-encoded string
+@condition(etag_func=file_contents_etag)
 @quicke.endpoint("rainer/file", {
     "response_type": "string",
     "query_params": ["project", "path"]
@@ -50,6 +170,9 @@ def get_file_contents(request):
     if not os.path.isfile(file_path):
         return JsonResponse({"error": "File not found"}, status=404)
 
+    if request.GET.get("mode", "json") == "raw":
+        return stream_file_response(request, file_path, mime_type)
+
     if mime_type and mime_type.startswith("image/"):
         return FileResponse(open(file_path, "rb"), content_type=mime_type)
 
@@ -57,68 +180,120 @@ def get_file_contents(request):
 
 
 # ✍️ Endpoint to create a new file
+# The agent operation runs as a background job; poll rainer/jobs/<id> for the outcome
 @csrf_exempt
 @quicke.endpoint("rainer/file/new", {
     "method": "POST",
     "body_type": "RefactorRainerFile",
-    "response_type": "RainerFile",
-    "imports": [("./types", "RefactorRainerFile"), ("./models", "RainerFile")]
+    "response_type": "RainerJob",
+    "imports": [("./types", "RefactorRainerFile"), ("./models", "RainerJob")]
 })
 def create_file(request):
-    refactor_file = json.loads(request.body)
-    project, path = unpack_file_ref(refactor_file)
-
-    from rainer.operations import makefile_op
-    success, response = makefile_op.execute(refactor_file)
-    if not success or response.strip().startswith(">>>TASK_FAILED"):
-        print("failed")
-        return JsonResponse({"project": project, "path": path}, status=200)
-
-    print(response)
-    create_rainer_file(project, path, f"{response}\n")
-
-    CodeGenerationData.objects.create(
-        llm_model=DEFAULT_GPT_MODEL,
-        instructions=[],
-        response=response,
-        rainer_project=project,
-        rainer_path=path,
-        drop_number=CodeGenerationData.create_drop_number()
-    )
-
-    return JsonResponse({"project": project, "path": path}, status=201)
+    job = enqueue_job("file/new", json.loads(request.body))
+    return JsonResponse(job.to_dict(), status=202)
 
 
 # 🔄 Endpoint to update an existing file
+# The agent operation runs as a background job; poll rainer/jobs/<id> for the outcome
 @csrf_exempt
 @quicke.endpoint("rainer/file/update", {
     "method": "PUT",
     "body_type": "RefactorRainerFile",
-    "response_type": "RainerFile",
-    "imports": [("./types", "RefactorRainerFile"), ("./models", "RainerFile")]
+    "response_type": "RainerJob",
+    "imports": [("./types", "RefactorRainerFile"), ("./models", "RainerJob")]
 })
 def update_file(request):
-    refactor_file = json.loads(request.body)
-    project, path = unpack_file_ref(refactor_file)
-
-    from rainer.operations import refactor_op_new
-    response = refactor_op_new.execute(refactor_file)
-    if not response.strip() or response.strip().startswith("FAILED"):
-        print("failed")
-        return JsonResponse({"project": project, "path": path}, status=200)
-
-    update_rainer_file(project, path, f"{response}\n")
-
-    CodeGenerationData.objects.create(
-        llm_model=DEFAULT_GPT_MODEL,
-        instructions=[],
-        response=response,
-        rainer_project=project,
-        rainer_path=path,
-        drop_number=CodeGenerationData.create_drop_number()
-    )
+    job = enqueue_job("file/update", json.loads(request.body))
+    return JsonResponse(job.to_dict(), status=202)
+
+
+# ⏳ Endpoint to get the state of a background job
+@quicke.endpoint("rainer/jobs/<str:job_id>", {
+    "response_type": "RainerJob",
+    "imports": [("./models", "RainerJob")]
+})
+def get_job(request, job_id):
+    job = RainerJob.objects.filter(id=job_id).first() if is_uuid(job_id) else None
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
 
-    return JsonResponse({"project": project, "path": path}, status=200)
+    if job.status == RainerJobStatus.RUNNING and fail_expired_job(job_id):
+        job.refresh_from_db()
+    return JsonResponse(job.to_dict())
+
+
+# 🛑 Endpoint to cancel a background job; a running operation stops before its next agent turn
+@csrf_exempt
+@quicke.endpoint("rainer/jobs/<str:job_id>/cancel", {
+    "method": "POST",
+    "response_type": "void"
+})
+def cancel_job(request, job_id):
+    if not is_uuid(job_id) or not RainerJob.objects.filter(id=job_id).exists():
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    get_event_log().cancel(job_id)
+    return JsonResponse({}, status=202)
+
+
+# 📡 Server-sent events with a job's progress: steps, agent turns, tool calls, handoffs,
+# partial messages and token counts. Ends with a `job_end` event.
+# Not a quicke endpoint (the generated fetchJSON client cannot consume a stream); routed in api/urls.py
+# Async, so under ASGI an open stream costs a coroutine instead of a worker. Each stream is closed after
+# JOB_EVENTS_MAX_SECONDS and resumed from its last event id (the Last-Event-ID header EventSource sends
+# on reconnect, or the last_event_id query parameter); at most RAINER_MAX_EVENT_STREAMS are open per process.
+async def job_events(request, job_id):
+    if not is_uuid(job_id) or not await RainerJob.objects.filter(id=job_id).aexists():
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    try:
+        start = int(request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or "-1") + 1
+    except ValueError:
+        start = 0
+
+    if not _event_streams.acquire(blocking=False):
+        response = JsonResponse({"error": "Too many open job event streams"}, status=503)
+        response["Retry-After"] = str(JOB_EVENTS_RETRY_AFTER_SECONDS)
+        return response
+
+    async def stream():
+        try:
+            index = start
+            yield "retry: 2000\n\n"
+            closes_at = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+            last_sent = time.monotonic()
+            while time.monotonic() < closes_at:
+                # No waiting inside read(): a thread blocked on the log would be held as long as the stream
+                events = await asyncio.to_thread(get_event_log().read, job_id, index, 0)
+                if not events:
+                    if time.monotonic() - last_sent < JOB_EVENTS_KEEPALIVE_SECONDS:
+                        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+                        continue
+                    job = await RainerJob.objects.filter(id=job_id).afirst()
+                    if job and job.status == RainerJobStatus.RUNNING and await asyncio.to_thread(fail_expired_job, job_id):
+                        continue  # Its job_end event is read on the next pass
+                    if job is None or job.done:
+                        # The stream expired or was evicted; still tell the client how the job ended
+                        end = {"type": "job_end", "status": job.status if job else "failed", "error": job.error if job else ""}
+                        yield f"event: job_end\ndata: {json.dumps(end)}\n\n"
+                        return
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                    continue
+
+                for event in events:
+                    yield f"id: {index}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                    index += 1
+                    if event["type"] == "job_end":
+                        return
+                last_sent = time.monotonic()
+        finally:
+            _event_streams.release()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 # 🗑️ Endpoint to delete a file
@@ -164,6 +339,29 @@ def delete_directory(request):
     return JsonResponse({}, status=204)
 
 
+# 📦 Endpoint to apply several file creates, updates and deletes at once
+# Either every operation lands or none does; the tree is refreshed once for the whole batch
+@csrf_exempt
+@quicke.endpoint("rainer/batch", {
+    "method": "POST",
+    "body_type": "RainerBatch",
+    "response_type": "RainerBatchResult",
+    "imports": [("./types", "RainerBatch, RainerBatchResult")]
+})
+def apply_batch(request):
+    data = json.loads(request.body)
+    project = data.get("project", "")
+
+    try:
+        version = apply_rainer_batch(project, data.get("operations", []))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except OSError as e:
+        return JsonResponse({"error": f"Batch rolled back: {e}"}, status=500)
+
+    return JsonResponse({"project": project, "version": version, "etag": get_trees_etag()}, status=200)
+
+
 # 📊 Endpoint to get file drops based on RainerFile
 @csrf_exempt
 @quicke.endpoint("rainer/file/drops", {
@@ -178,3 +376,72 @@ def get_file_drops(request):
         'drop_number').annotate(count=models.Count('id'))
     drop_dict = {str(drop['drop_number']): drop['count'] for drop in drops}
     return JsonResponse(drop_dict, safe=False)
+
+
+# ⏱️ Endpoint for p50/p95 latency and token usage of agent operations, per operation type and model
+@quicke.endpoint("rainer/telemetry", {
+    "method": "GET",
+    "response_type": "RainerTelemetrySummary[]",
+    "query_params": ["days", "operation"],
+    "imports": [("./types", "RainerTelemetrySummary")]
+})
+def get_telemetry_summary(request):
+    from .operations.telemetry import spread
+
+    try:
+        days = float(request.GET.get("days", "7"))
+    except ValueError:
+        return JsonResponse({"error": "days must be a number"}, status=400)
+
+    runs = CodeGenerationTelemetry.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    if request.GET.get("operation"):
+        runs = runs.filter(operation=request.GET["operation"])
+
+    groups = {}
+    for run in runs.only("operation", "llm_model", "success", "wall_seconds", "iterations", "agent_turns",
+                         "tool_calls", "input_tokens", "output_tokens", "tokens_saved", "stop_reason",
+                         "abandoned_turns", "abandoned_tool_calls", "abandoned_tokens").iterator():
+        groups.setdefault((run.operation, run.llm_model), []).append(run)
+
+    summaries = []
+    for (operation, llm_model), group in sorted(groups.items()):
+        tools = {}
+        for run in group:
+            for tool, stats in run.tool_calls.items():
+                total = tools.setdefault(tool, {"count": 0, "seconds": 0.0})
+                total["count"] += stats.get("count", 0)
+                total["seconds"] = round(total["seconds"] + stats.get("seconds", 0), 3)
+
+        summaries.append({
+            "operation": operation,
+            "llm_model": llm_model,
+            "runs": len(group),
+            "success_rate": round(sum(run.success for run in group) / len(group), 3),
+            "wall_seconds": spread([run.wall_seconds for run in group]),
+            "turn_seconds": spread([turn.get("seconds", 0) for run in group for turn in run.agent_turns]),
+            "iterations": spread([run.iterations for run in group]),
+            "input_tokens": spread([run.input_tokens for run in group]),
+            "output_tokens": spread([run.output_tokens for run in group]),
+            "tokens_saved": sum(run.tokens_saved for run in group),
+            "tool_calls": tools,
+            "timeouts": sum(run.stop_reason == "timeout" for run in group),
+            "cancellations": sum(run.stop_reason == "cancelled" for run in group),
+            "abandoned_turns": sum(run.abandoned_turns for run in group),
+            "abandoned_tool_calls": sum(run.abandoned_tool_calls for run in group),
+            "abandoned_tokens": sum(run.abandoned_tokens for run in group),
+        })
+
+    return JsonResponse(summaries, safe=False)
+
+
+# 📈 Endpoint for the live counters of agent operations, e.g. work abandoned at timeouts and cancellations,
+# and of this web process's file content cache (file_content_cache.hits, .misses, .evictions, ...)
+@quicke.endpoint("rainer/metrics", {
+    "method": "GET",
+    "response_type": "RainerMetrics",
+    "imports": [("./types", "RainerMetrics")]
+})
+def get_metrics(request):
+    from .metrics import get_metrics as get_process_metrics
+    cache_stats = {f"file_content_cache.{name}": value for name, value in content_cache.stats().items()}
+    return JsonResponse(dict(sorted({**get_process_metrics().snapshot(), **cache_stats}.items())))
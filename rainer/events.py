@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .settings import RAINER_JOBS_BACKEND
+
+# How long a stream's events (and its cancel flag) are kept after the last write
+EVENT_TTL_SECONDS = 3600
+
+
+class MemoryEventLog:
+    """Event streams kept in this process; enough when jobs run on the in-process thread pool."""
+
+    def __init__(self, max_streams: int = 200):
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._cancelled = set()
+        self._condition = threading.Condition()
+
+    def append(self, stream: str, event: Dict) -> None:
+        with self._condition:
+            self._streams.setdefault(stream, []).append(event)
+            self._streams.move_to_end(stream)
+            while len(self._streams) > self.max_streams:
+                dropped, _ = self._streams.popitem(last=False)
+                self._cancelled.discard(dropped)
+            self._condition.notify_all()
+
+    def read(self, stream: str, start: int, timeout: float) -> List[Dict]:
+        """Events from index `start` on, waiting up to `timeout` seconds for at least one."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._streams.get(stream, [])) > start, timeout)
+            return self._streams.get(stream, [])[start:]
+
+    def cancel(self, stream: str) -> None:
+        with self._condition:
+            self._cancelled.add(stream)
+
+    def is_cancelled(self, stream: str) -> bool:
+        return stream in self._cancelled
+
+
+class RedisEventLog:
+    """Event streams in Redis lists, so a web process can follow operations running on Celery workers."""
+
+    def __init__(self, url: str, poll_seconds: float = 0.25):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.poll_seconds = poll_seconds
+
+    def append(self, stream: str, event: Dict) -> None:
+        key = f"rainer:events:{stream}"
+        pipeline = self._redis.pipeline()
+        pipeline.rpush(key, json.dumps(event))
+        pipeline.expire(key, EVENT_TTL_SECONDS)
+        pipeline.execute()
+
+    def read(self, stream: str, start: int, timeout: float) -> List[Dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._redis.lrange(f"rainer:events:{stream}", start, -1)
+            if events or time.monotonic() >= deadline:
+                return [json.loads(event) for event in events]
+            time.sleep(self.poll_seconds)
+
+    def cancel(self, stream: str) -> None:
+        self._redis.set(f"rainer:cancel:{stream}", 1, ex=EVENT_TTL_SECONDS)
+
+    def is_cancelled(self, stream: str) -> bool:
+        return bool(self._redis.exists(f"rainer:cancel:{stream}"))
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    """The process-wide event log: Redis (the Celery broker) for Celery jobs, memory otherwise."""
+    global _event_log
+    with _event_log_lock:
+        if _event_log is None:
+            from django.conf import settings
+            broker_url = getattr(settings, "CELERY_BROKER_URL", "")
+            if RAINER_JOBS_BACKEND == "celery" and broker_url.startswith("redis"):
+                _event_log = RedisEventLog(broker_url)
+            else:
+                _event_log = MemoryEventLog()
+        return _event_log
+
+
+def emit_event(stream: Optional[str], event_type: str, **data) -> None:
+    if not stream:
+        return
+    try:
+        get_event_log().append(stream, {"type": event_type, "time": time.time(), **data})
+    except Exception as e:
+        # Progress reporting must never take the operation down with it
+        print(f"⚠️ Could not emit {event_type} event: {e}")
+
+
+def is_cancelled(stream: Optional[str]) -> bool:
+    return bool(stream) and get_event_log().is_cancelled(stream)
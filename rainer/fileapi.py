@@ -1,9 +1,24 @@
+import atexit
+import hashlib
+import json
 import os
+import re
 import shutil
-from typing import Dict, Tuple, Union
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from .types import RainerFile
-from .settings import RAINER_PROJECTS, EXCLUDED_FILE_EXTENSIONS, EXCLUDED_FILE_NAMES, EXCLUDED_DIRS
+from .settings import RAINER_PROJECTS, RAINER_TREE_SYNC_INTERVAL, RAINER_FILE_CHUNK_SIZE, \
+    RAINER_FILE_CACHE_MAX_BYTES, RAINER_SNAPSHOT_DIR, RAINER_SEARCH_INDEX, RAINER_SEARCH_REFRESH_INTERVAL, \
+    RAINER_SEARCH_MAX_FILE_BYTES, RAINER_BATCH_TEMP_SUFFIX
+from .tree_index import ProjectTreeIndex, materialize_tree, walk_tree, iter_tree_files, split_rel_path
+from .content_cache import FileContentCache
+from .search_index import TrigramIndex, match_lines
 
 
 def unpack_file_ref(file_ref: RainerFile) -> Tuple[str, str]:
@@ -18,25 +33,7 @@ def unpack_file_ref(file_ref: RainerFile) -> Tuple[str, str]:
 
 
 def build_nested_tree(base_dir: str) -> Dict[str, Union[str, Dict]]:
-    tree = {}
-    abs_base = os.path.abspath(base_dir)
-
-    for root, dirs, files in os.walk(abs_base, topdown=True):
-        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
-
-        rel_root = os.path.relpath(root, abs_base).replace("\\", "/")
-        node = tree
-        if rel_root != ".":
-            for part in rel_root.split("/"):
-                node = node.setdefault(part, {})
-
-        files = [f for f in files if
-                 f not in EXCLUDED_FILE_NAMES and os.path.splitext(f)[1] not in EXCLUDED_FILE_EXTENSIONS]
-
-        for file in files:
-            node[file] = os.path.join(rel_root, file) if rel_root != "." else file
-
-    return tree
+    return materialize_tree(walk_tree(os.path.abspath(base_dir)))
 
 
 def replace_slashes(path: str) -> str:
@@ -53,9 +50,101 @@ def build_rainer_trees() -> Dict[str, Dict[str, Union[str, Dict]]]:
     }
 
 
-def refresh_trees() -> None:
-    global project_trees
-    project_trees = build_rainer_trees()
+def refresh_trees() -> Dict[str, float]:
+    """Rescan every project in parallel; returns the scan time per project in seconds."""
+    if not tree_indexes:
+        return {}
+
+    # scandir/stat release the GIL, so projects scan concurrently and boot tracks the largest one
+    with ThreadPoolExecutor(max_workers=len(tree_indexes)) as executor:
+        list(executor.map(ProjectTreeIndex.rebuild, tree_indexes.values()))
+
+    return {project: index.scan_seconds for project, index in tree_indexes.items()}
+
+
+def snapshot_path(project: str) -> str:
+    return os.path.join(RAINER_SNAPSHOT_DIR, re.sub(r"[^\w.-]", "_", project) + ".json")
+
+
+def load_trees() -> Dict[str, float]:
+    """Warm-start every project from its snapshot in parallel, scanning those without a usable one."""
+    if not RAINER_SNAPSHOT_DIR:
+        return refresh_trees()
+    if not tree_indexes:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(tree_indexes)) as executor:
+        list(executor.map(lambda i: i.warm_start(snapshot_path(i.project)), tree_indexes.values()))
+
+    return {project: index.scan_seconds for project, index in tree_indexes.items()}
+
+
+def save_snapshots() -> None:
+    if not RAINER_SNAPSHOT_DIR:
+        return
+    for project, index in tree_indexes.items():
+        try:
+            index.save_snapshot(snapshot_path(project))
+        except OSError as e:
+            print(f"⚠️ Could not save tree snapshot for {project}: {e}")
+
+
+def print_scan_timings(timings: Dict[str, float]) -> None:
+    for project, seconds in timings.items():
+        index = tree_indexes[project]
+        how = "Restored" if index.restored else "Scanned"
+        print(f"🌳 {how} {project} in {seconds:.3f}s ({len(index.dir_stats)} directories)")
+
+
+def refresh_tree_path(project: str, relative_path: str) -> None:
+    index = tree_indexes.get(project)
+    if index:
+        index.refresh_path(relative_path)
+
+
+def sync_trees(min_interval: float = RAINER_TREE_SYNC_INTERVAL) -> None:
+    for index in tree_indexes.values():
+        index.sync(min_interval)
+
+
+def sync_tree(project: str, min_interval: float = RAINER_TREE_SYNC_INTERVAL) -> None:
+    """`sync_trees` for one project only."""
+    index = tree_indexes.get(project)
+    if index is not None:
+        index.sync(min_interval)
+
+
+def get_project_tree_json(project: str) -> str:
+    index = tree_indexes.get(project)
+    return index.tree_json().decode("utf-8") if index else "{}"
+
+
+def get_project_tree_outline_json(project: str, depth: int) -> str:
+    """`get_project_tree_json` cut off `depth` levels down, where directories only show how many entries they have."""
+    node = get_rainer_tree_node(project, "", depth)
+    return json.dumps(tree_outline(node)) if node else "{}"
+
+
+def tree_outline(node: Dict) -> Union[str, Dict]:
+    """A `describe_node` view in the shape of the tree JSON: files map to their path, unexpanded directories to a count."""
+    if node["type"] == "file":
+        return node["path"]
+    if "children" not in node:
+        return f"[{node['child_count']} entries]"
+    return {child["name"]: tree_outline(child) for child in node["children"]}
+
+
+def get_trees_json() -> bytes:
+    """JSON of every project tree, stitched together from each project's cached serialization."""
+    return b"{" + b", ".join(
+        json.dumps(project).encode("utf-8") + b": " + index.tree_json()
+        for project, index in tree_indexes.items()
+    ) + b"}"
+
+
+def get_rainer_tree_node(project: str, prefix: str = "", depth: int = 1) -> Optional[Dict]:
+    index = tree_indexes.get(project)
+    return index.describe(prefix, depth) if index else None
 
 
 def get_file_path(project: str, relative_path: str) -> str:
@@ -66,10 +155,181 @@ def get_file_path(project: str, relative_path: str) -> str:
 
 def get_rainer_file_contents(project: str, relative_path: str) -> str:
     abs_path = get_file_path(project, relative_path)
-    if abs_path and os.path.isfile(abs_path):
+    if not abs_path:
+        return ""
+
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return ""
+    if not stat.S_ISREG(st.st_mode):
+        return ""
+
+    signature = (st.st_mtime_ns, st.st_size)
+    contents = content_cache.get(abs_path, signature)
+    if contents is None:
         with open(abs_path, "r", encoding="utf-8") as f:
-            return f.read()
-    return ""
+            contents = f.read()
+        content_cache.put(abs_path, signature, contents)
+
+    return contents
+
+
+def get_rainer_file_digest(project: str, relative_path: str) -> str:
+    """Content hash of a project file, recomputed only when its (mtime, size) changes."""
+    abs_path = get_file_path(project, relative_path)
+    if not abs_path:
+        return ""
+
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return ""
+    if not stat.S_ISREG(st.st_mode):
+        return ""
+
+    signature = (st.st_mtime_ns, st.st_size)
+    digest = content_cache.get_digest(abs_path, signature)
+    if digest is None:
+        hasher = hashlib.blake2b(digest_size=16)
+        for chunk in iter_file_range(abs_path):
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        content_cache.put_digest(abs_path, signature, digest)
+
+    return digest
+
+
+def get_trees_etag() -> str:
+    """
+    Validator for `project_trees`, derived from every project's tree digest, so all worker processes
+    serving the same files agree on it. Weak, since processes may list the same tree in a different order.
+    """
+    digests = ";".join(f"{project}:{index.digest()}" for project, index in sorted(tree_indexes.items()))
+    return f'W/"{hashlib.blake2b(digests.encode("utf-8"), digest_size=16).hexdigest()}"'
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `bytes=` header into an inclusive (start, end) pair.
+    Returns None when there is nothing usable to honor (missing, malformed or multi-range),
+    and raises ValueError when the range cannot be satisfied for a file of `size` bytes.
+    """
+    unit, _, spec = (range_header or "").strip().partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    first, dash, last = (part.strip() for part in spec.partition("-"))
+    if not dash or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def iter_file_range(abs_path: str, start: int = 0, length: Optional[int] = None,
+                    chunk_size: int = RAINER_FILE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield raw bytes of `abs_path` in chunks, starting at `start` for `length` bytes (or to EOF)."""
+    with open(abs_path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def read_search_file(project: str, relative_path: str) -> str:
+    try:
+        # Same rules as the index: files over RAINER_SEARCH_MAX_FILE_BYTES are not searched,
+        # files with NUL bytes are binary
+        if os.path.getsize(get_file_path(project, relative_path)) > RAINER_SEARCH_MAX_FILE_BYTES:
+            return ""
+        contents = get_rainer_file_contents(project, relative_path)
+    except (OSError, UnicodeDecodeError):
+        return ""
+    return "" if "\0" in contents else contents
+
+
+def search_project_files(project: str, query: str, prefix: str = "", context: int = 2,
+                         case_sensitive: bool = False, max_results: int = 50) -> Optional[Dict]:
+    """
+    Literal search over a project's files. Returns None for unknown projects; until the
+    background index has finished its first pass, every file is scanned instead.
+    """
+    index = search_indexes.get(project)
+    if index is None or not query:
+        return None
+
+    read_file = partial(read_search_file, project)
+    if index.ready:
+        return index.search(query, read_file, prefix, context, case_sensitive, max_results)
+
+    matches = []
+    for path in iter_tree_files(tree_indexes[project].tree):
+        if prefix and path != prefix and not path.startswith(prefix.rstrip("/") + "/"):
+            continue
+        for match in match_lines(read_file(path), query, case_sensitive, context):
+            if len(matches) == max_results:
+                return {"matches": matches, "complete": False, "truncated": True}
+            matches.append({"path": path, **match})
+
+    return {"matches": matches, "complete": False, "truncated": False}
+
+
+def update_search_path(project: str, relative_path: str, text_content: Optional[str] = None) -> None:
+    """Reflect a fileapi write in the search index; `text_content` is None for deletions."""
+    index = search_indexes.get(project)
+    parts = split_rel_path(relative_path)
+    if index is None or parts is None:
+        return
+
+    if text_content is None:
+        index.remove("/".join(parts))
+    else:
+        index.index_file("/".join(parts), text_content)
+
+
+def index_project_files() -> None:
+    """Background loop keeping each project's search index in line with its tree and file contents."""
+    while True:
+        try:
+            refresh_search_indexes()
+        except Exception as e:
+            # One failed pass must not stop search refreshes for the life of the process
+            print(f"⚠️ Search index refresh failed, retrying in {RAINER_SEARCH_REFRESH_INTERVAL}s: {e!r}")
+        time.sleep(RAINER_SEARCH_REFRESH_INTERVAL)
+
+
+def refresh_search_indexes() -> None:
+    """One pass of `index_project_files`: sync the trees, then reconcile each search index with its tree."""
+    sync_trees(0)
+    for project, index in list(search_indexes.items()):
+        started = time.perf_counter()
+        if index.needs_compaction:
+            # Retired postings outnumber live ones; build a fresh index and swap it in
+            index = TrigramIndex(project, index.abs_base, RAINER_SEARCH_MAX_FILE_BYTES)
+
+        first_pass = not index.ready
+        index.reconcile(list(iter_tree_files(tree_indexes[project].tree)))
+        search_indexes[project] = index
+
+        if first_pass:
+            print(f"🔎 Indexed {project} for search in {time.perf_counter() - started:.2f}s "
+                  f"({len(index.ids)} files, {len(index.postings)} trigrams)")
 
 
 def create_rainer_file(project: str, relative_path: str, text_content: str = "") -> None:
@@ -80,7 +340,9 @@ def create_rainer_file(project: str, relative_path: str, text_content: str = "")
         with open(abs_path, "w", encoding="utf-8") as f:
             f.write(text_content)
             print(f"Created {abs_path}")
-        refresh_trees()
+        content_cache.invalidate(abs_path)
+        refresh_tree_path(project, relative_path)
+        update_search_path(project, relative_path, text_content)
 
 
 def update_rainer_file(project: str, relative_path: str, new_content: str) -> None:
@@ -89,6 +351,8 @@ def update_rainer_file(project: str, relative_path: str, new_content: str) -> No
     if abs_path and os.path.isfile(abs_path):
         with open(abs_path, "w", encoding="utf-8") as f:
             f.write(new_content)
+        content_cache.invalidate(abs_path)
+        update_search_path(project, relative_path, new_content)
 
 
 def delete_rainer_file(project: str, relative_path: str) -> None:
@@ -96,7 +360,9 @@ def delete_rainer_file(project: str, relative_path: str) -> None:
     abs_path = os.path.join(base_path, relative_path) if base_path else ""
     if abs_path and os.path.isfile(abs_path):
         os.remove(abs_path)
-        refresh_trees()
+        content_cache.invalidate(abs_path)
+        refresh_tree_path(project, relative_path)
+        update_search_path(project, relative_path)
 
 
 def delete_rainer_directory(project: str, relative_path: str) -> None:
@@ -104,7 +370,9 @@ def delete_rainer_directory(project: str, relative_path: str) -> None:
     abs_path = os.path.join(base_path, relative_path) if base_path else ""
     if abs_path and os.path.isdir(abs_path):
         shutil.rmtree(abs_path)
-        refresh_trees()
+        content_cache.invalidate(abs_path)
+        refresh_tree_path(project, relative_path)
+        update_search_path(project, relative_path)
 
 
 def create_rainer_directory(project: str, relative_path: str) -> None:
@@ -112,8 +380,130 @@ def create_rainer_directory(project: str, relative_path: str) -> None:
     abs_path = os.path.join(base_path, relative_path) if base_path else ""
     if abs_path:
         os.makedirs(abs_path, exist_ok=True)
-        refresh_trees()
+        refresh_tree_path(project, relative_path)
 
 
-project_trees = build_rainer_trees()
+def batch_temp_path(abs_path: str, token: str, kind: str) -> str:
+    """Sibling of `abs_path`, so moving it into place is a same-directory rename."""
+    directory, name = os.path.split(abs_path)
+    return os.path.join(directory, f".{name}.{token}.{kind}{RAINER_BATCH_TEMP_SUFFIX}")
+
+
+def apply_rainer_batch(project: str, operations: List[Dict]) -> int:
+    """
+    Apply create/update/delete operations as one unit and return the new tree version.
+
+    New contents are first staged in temp files next to their targets; only once every
+    operation has been validated and staged are they renamed into place, with replaced and
+    deleted paths moved aside so a failure rolls the whole batch back. Raises ValueError
+    for invalid batches, leaving the project untouched.
+    """
+    base_path = paths.get(project, "")
+    if not base_path:
+        raise ValueError(f"Unknown project: {project}")
+
+    token = uuid.uuid4().hex[:8]
+    planned: List[Tuple[str, str, str, Optional[str], Optional[str]]] = []  # (action, rel, abs, staged, content)
+    created_dirs: List[str] = []
+    # Renames done so far, undone in reverse on failure: (abs_path, backup_path or None if newly placed)
+    journal: List[Tuple[str, Optional[str]]] = []
+
+    try:
+        for number, operation in enumerate(operations):
+            action = operation.get("action")
+            parts = split_rel_path(operation.get("path", ""))
+            if parts is None:
+                raise ValueError(f"Invalid path: {operation.get('path')!r}")
+            rel_path = "/".join(parts)
+            abs_path = os.path.join(base_path, rel_path)
+
+            if action == "delete":
+                if not os.path.lexists(abs_path):
+                    raise ValueError(f"Cannot delete missing path: {rel_path}")
+                planned.append((action, rel_path, abs_path, None, None))
+                continue
+
+            if action not in ("create", "update"):
+                raise ValueError(f"Unknown action: {action!r}")
+            if os.path.isdir(abs_path):
+                raise ValueError(f"Cannot {action} a directory: {rel_path}")
+            if action == "update" and not os.path.isfile(abs_path):
+                raise ValueError(f"Cannot update missing file: {rel_path}")
+            if not isinstance(operation.get("content"), str):
+                raise ValueError(f"Missing content for {rel_path}")
+
+            directory = os.path.dirname(abs_path)
+            missing_dirs = []
+            while not os.path.isdir(directory):
+                missing_dirs.append(directory)
+                directory = os.path.dirname(directory)
+            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+            created_dirs.extend(missing_dirs)
+
+            staged_path = batch_temp_path(abs_path, token, f"new{number}")
+            with open(staged_path, "w", encoding="utf-8") as f:
+                f.write(operation["content"])
+            planned.append((action, rel_path, abs_path, staged_path, operation["content"]))
+
+        for number, (action, rel_path, abs_path, staged_path, _) in enumerate(planned):
+            if os.path.lexists(abs_path):
+                backup_path = batch_temp_path(abs_path, token, f"old{number}")
+                os.replace(abs_path, backup_path)
+                journal.append((abs_path, backup_path))
+            if staged_path:
+                os.replace(staged_path, abs_path)
+                journal.append((abs_path, None))
+    except Exception:
+        for abs_path, backup_path in reversed(journal):
+            if backup_path is None:
+                os.remove(abs_path)
+            else:
+                os.replace(backup_path, abs_path)
+        for _, _, _, staged_path, _ in planned:
+            if staged_path and os.path.exists(staged_path):
+                os.remove(staged_path)
+        for directory in sorted(created_dirs, key=len, reverse=True):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        raise
+
+    for _, backup_path in journal:
+        if backup_path is None:
+            continue
+        if os.path.isdir(backup_path) and not os.path.islink(backup_path):
+            shutil.rmtree(backup_path)
+        else:
+            os.remove(backup_path)
+
+    for _, rel_path, abs_path, _, content in planned:
+        content_cache.invalidate(abs_path)
+        update_search_path(project, rel_path, content)
+
+    index = tree_indexes[project]
+    index.refresh_paths([rel_path for _, rel_path, _, _, _ in planned])
+    print(f"📦 Applied batch of {len(planned)} operations to {project} (tree version {index.version})")
+    return index.version
+
+
+content_cache = FileContentCache(RAINER_FILE_CACHE_MAX_BYTES)
+
+# Mutated in place by the tree indexes, so `from .fileapi import project_trees` stays current.
+# Trees are compact (files map to None); use `materialize_tree` or the *_json helpers for the public shape.
+project_trees: Dict[str, Dict[str, Union[str, Dict]]] = {}
+tree_indexes: Dict[str, ProjectTreeIndex] = {
+    project: ProjectTreeIndex(project, path, project_trees)
+    for project, path in RAINER_PROJECTS.items()
+}
+print_scan_timings(load_trees())
+atexit.register(save_snapshots)
+
+search_indexes: Dict[str, TrigramIndex] = {
+    project: TrigramIndex(project, index.abs_base, RAINER_SEARCH_MAX_FILE_BYTES)
+    for project, index in tree_indexes.items()
+}
+if RAINER_SEARCH_INDEX:
+    threading.Thread(target=index_project_files, name="rainer-search-index", daemon=True).start()
+
 paths = {project: path for project, path in RAINER_PROJECTS.items()}
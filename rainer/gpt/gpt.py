@@ -1,10 +1,13 @@
 import logging
-from typing import List
+from typing import List, Optional
 
 import openai
 from django.conf import settings
 
-from rainer.settings import DEFAULT_GPT_MODEL
+from rainer.operations.context_budget import estimate_tokens
+from rainer.rate_limits import get_scheduler, retry_after
+from rainer.resilience import call_with_retries_sync
+from rainer.settings import DEFAULT_GPT_MODEL, RAINER_RATE_LIMIT_OUTPUT_TOKENS
 
 logger = logging.getLogger(__name__)
 
@@ -13,9 +16,10 @@ class OpenAIProvider:
     def __init__(self, model):
         """Initialize OpenAI API client."""
         self.model = model or DEFAULT_GPT_MODEL
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # call_with_retries_sync retries, with backoff and through the rate limits
+        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
 
-    def send_instructions(self, instructions: List[str]):
+    def send_instructions(self, instructions: List[str], lane: Optional[str] = None):
         if len(instructions) == 0:
             return ""
 
@@ -25,11 +29,24 @@ class OpenAIProvider:
                 for instruction in instructions if instruction.strip()
             ]
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                response_format={"type": "text"}
-            )
+            scheduler = get_scheduler()
+            reserved = sum(estimate_tokens(m["content"]) for m in messages) + RAINER_RATE_LIMIT_OUTPUT_TOKENS
+
+            def attempt():
+                scheduler.acquire_sync(self.model, reserved, lane)
+                try:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        response_format={"type": "text"}
+                    )
+                except openai.RateLimitError as e:
+                    scheduler.pause_sync(self.model, retry_after(e))
+                    raise
+                scheduler.settle_sync(self.model, reserved, getattr(response.usage, "total_tokens", 0) or 0)
+                return response
+
+            response = call_with_retries_sync(self.model, attempt)
 
             response_message = response.choices[0].message.content
 
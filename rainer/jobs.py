@@ -0,0 +1,189 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import emit_event, is_cancelled
+from .fileapi import create_rainer_file, update_rainer_file, unpack_file_ref
+from .models import CodeGenerationData, CodeGenerationTelemetry, RainerJob, RainerJobStatus
+from .settings import DEFAULT_GPT_MODEL, RAINER_JOB_CLAIM_SECONDS, RAINER_JOBS_BACKEND, RAINER_JOBS_THREADS
+
+if TYPE_CHECKING:
+    from .operations.telemetry import OperationTelemetry
+
+
+class JobFailed(Exception):
+    pass
+
+
+def record_generation(project: str, path: str, response: str, llm_model: str = "") -> CodeGenerationData:
+    return CodeGenerationData.objects.create(
+        llm_model=llm_model or DEFAULT_GPT_MODEL,
+        instructions=[],
+        response=response,
+        rainer_project=project,
+        rainer_path=path,
+        drop_number=CodeGenerationData.create_drop_number()
+    )
+
+
+def record_telemetry(telemetry: "OperationTelemetry", project: str, path: str,
+                     generation: Optional[CodeGenerationData] = None) -> None:
+    fields = telemetry.to_fields()
+    fields["llm_model"] = fields["llm_model"] or DEFAULT_GPT_MODEL
+    CodeGenerationTelemetry.objects.create(generation=generation, rainer_project=project, rainer_path=path, **fields)
+
+
+def strip_result_marker(response: str, marker: str) -> str:
+    """The file contents of an operation result, without the marker it starts with."""
+    text = response.lstrip()
+    if not text.startswith(marker):
+        return response
+    return text[len(marker):].lstrip("\r\n")
+
+
+def generate_new_file(refactor_file: Dict[str, Any], event_stream: str = "") -> Dict[str, Any]:
+    project, path = unpack_file_ref(refactor_file)
+
+    from rainer.operations import makefile_op
+    from rainer.operations.telemetry import OperationTelemetry
+    telemetry = OperationTelemetry()
+    success, response = makefile_op.execute(refactor_file, event_stream=event_stream, telemetry=telemetry)
+    if not success or response.strip().startswith(">>>TASK_FAILED"):
+        record_telemetry(telemetry, project, path)
+        raise JobFailed(response.strip() or "File generation failed")
+
+    response = strip_result_marker(response, ">>>TASK_RESULT")
+    create_rainer_file(project, path, f"{response}\n")
+    record_telemetry(telemetry, project, path, record_generation(project, path, response, telemetry.llm_model))
+    return {"project": project, "path": path}
+
+
+def generate_file_update(refactor_file: Dict[str, Any], event_stream: str = "") -> Dict[str, Any]:
+    project, path = unpack_file_ref(refactor_file)
+
+    from rainer.operations import refactor_op_new
+    from rainer.operations.telemetry import OperationTelemetry
+    telemetry = OperationTelemetry()
+    success, response = refactor_op_new.execute(refactor_file, event_stream=event_stream, telemetry=telemetry)
+    if not success or not response.strip() or response.strip().startswith("FAILED"):
+        record_telemetry(telemetry, project, path)
+        raise JobFailed(response.strip() or "File update failed")
+
+    response = strip_result_marker(response, "TASK_OUTPUT")
+    update_rainer_file(project, path, response if response.endswith("\n") else f"{response}\n")
+    record_telemetry(telemetry, project, path, record_generation(project, path, response, telemetry.llm_model))
+    return {"project": project, "path": path}
+
+
+JOB_HANDLERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "file/new": generate_new_file,
+    "file/update": generate_file_update,
+}
+
+
+WORKER_LOST = "The worker running the job stopped"
+
+
+def claim_deadline() -> datetime:
+    return timezone.now() + timedelta(seconds=RAINER_JOB_CLAIM_SECONDS)
+
+
+def expired_claim(now: datetime) -> Q:
+    """Running jobs whose worker stopped renewing its claim (jobs started before claims were kept: by start time)."""
+    started_before = now - timedelta(seconds=RAINER_JOB_CLAIM_SECONDS)
+    return Q(status=RainerJobStatus.RUNNING) & (
+        Q(claimed_until__lt=now) | Q(claimed_until__isnull=True, started_at__lt=started_before))
+
+
+def fail_expired_job(job_id: str) -> bool:
+    """Fail the job if its worker died mid-run, ending its event stream. True if it was failed now."""
+    now = timezone.now()
+    failed = RainerJob.objects.filter(expired_claim(now), id=job_id).update(
+        status=RainerJobStatus.FAILED, error=WORKER_LOST, finished_at=now, updated_at=now)
+    if failed:
+        print(f"❌ Job {job_id} failed: {WORKER_LOST}")
+        emit_event(str(job_id), "job_end", status=RainerJobStatus.FAILED, error=WORKER_LOST)
+    return bool(failed)
+
+
+def renew_claim(job_id: str, stop: threading.Event) -> None:
+    """Keep extending the claim on a running job until stop is set."""
+    try:
+        while not stop.wait(RAINER_JOB_CLAIM_SECONDS / 3):
+            try:
+                RainerJob.objects.filter(id=job_id, status=RainerJobStatus.RUNNING).update(claimed_until=claim_deadline())
+            except Exception as e:
+                print(f"⚠️ Could not renew the claim on job {job_id}: {e}")
+    finally:
+        connection.close()
+
+
+def run_job(job_id: str) -> None:
+    # Claimed in one conditional UPDATE, so a redelivered Celery message picked up by a second
+    # worker finds the job no longer queued and leaves it alone
+    started_at = timezone.now()
+    claimed = RainerJob.objects.filter(id=job_id, status=RainerJobStatus.QUEUED).update(
+        status=RainerJobStatus.RUNNING, started_at=started_at, claimed_until=claim_deadline(), updated_at=started_at)
+    if not claimed:
+        return
+
+    job = RainerJob.objects.get(id=job_id)
+    stream = str(job.id)
+
+    if is_cancelled(stream):
+        job.status = RainerJobStatus.FAILED
+        job.error = "Cancelled before it started"
+    else:
+        emit_event(stream, "job_start", kind=job.kind)
+        print(f"🛠️ Running job {job.id} ({job.kind})")
+
+        # If this process dies, the claim runs out and whoever polls the job next fails it
+        stop_renewing = threading.Event()
+        threading.Thread(target=renew_claim, args=(stream, stop_renewing), name="rainer-job-claim", daemon=True).start()
+        try:
+            job.result = JOB_HANDLERS[job.kind](job.payload, event_stream=stream)
+            job.status = RainerJobStatus.SUCCEEDED
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            job.status = RainerJobStatus.FAILED
+            job.error = str(e)
+        finally:
+            stop_renewing.set()
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "started_at", "finished_at", "updated_at"])
+    emit_event(stream, "job_end", status=job.status, error=job.error)
+
+
+def run_job_in_thread(job_id: str) -> None:
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+
+
+def enqueue_job(kind: str, payload: Dict[str, Any]) -> RainerJob:
+    """Store a job and hand it to Celery, or to an in-process thread pool when RAINER_JOBS_BACKEND=thread."""
+    global _executor
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = RainerJob.objects.create(kind=kind, payload=payload)
+
+    if RAINER_JOBS_BACKEND == "thread":
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RAINER_JOBS_THREADS, thread_name_prefix="rainer-job")
+        _executor.submit(run_job_in_thread, str(job.id))
+    else:
+        from .tasks import run_rainer_job
+        run_rainer_job.delay(str(job.id))
+
+    return job
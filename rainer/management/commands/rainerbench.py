@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import time
+
+from django.core.management import BaseCommand
+
+OPERATIONS = ("makefile", "refactor", "requirements")
+
+# How often the loop monitor wakes up; late wake-ups mean something blocked the operation loop
+LAG_PROBE_SECONDS = 0.05
+
+
+def default_tool_calls(operation: str, project: str, target: str):
+    """Tool calls the mock makes each agent turn, so runs exercise our tools the way real ones do."""
+    if operation == "requirements":
+        return [{"name": "project_tree", "arguments": {"project": project}}]
+    return [
+        {"name": "project_file_lookup", "arguments": {"project": project, "path": target}},
+        {"name": "project_grep", "arguments": {
+            "project": project, "query": os.path.splitext(os.path.basename(target))[0], "path_prefix": ""}},
+    ]
+
+
+def make_spec(operation: str, project: str, target: str, instruction: str):
+    if operation == "requirements":
+        from task_manager.operations.op_make_requirements import make_spec as make_requirements_spec
+        return make_requirements_spec(project, target)
+
+    if operation == "makefile":
+        from rainer.operations.makefile_op import make_spec as make_operation_spec
+    else:
+        from rainer.operations.refactor_op_new import make_spec as make_operation_spec
+    return make_operation_spec({"project": project, "path": target, "content": instruction})
+
+
+async def run_timed(spec):
+    """Run one operation, splitting its wall time into model, tool, prompt building and remaining time."""
+    from rainer.operations.mock_model import ModelTime, model_time
+
+    model = ModelTime()
+    model_time.set(model)  # Only this task and the tasks it starts see it
+
+    init = spec.init
+    prompt_seconds = 0.0
+
+    def timed_init():
+        nonlocal prompt_seconds
+        started = time.perf_counter()
+        init()
+        prompt_seconds += time.perf_counter() - started
+
+    spec.init = timed_init
+
+    started = time.perf_counter()
+    success, _ = await spec.arun()
+    wall = time.perf_counter() - started
+    tools = sum(stats["seconds"] for stats in spec.telemetry.tool_calls.values())
+
+    return {
+        "success": success,
+        "wall": wall,
+        "model": model.seconds,
+        "model_calls": model.calls,
+        "tools": tools,
+        "prompt": prompt_seconds,
+        "other": max(0.0, wall - model.seconds - tools - prompt_seconds),
+        "tokens": spec.telemetry.input_tokens + spec.telemetry.output_tokens,
+    }
+
+
+async def monitor_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        expected = time.perf_counter() + LAG_PROBE_SECONDS
+        await asyncio.sleep(LAG_PROBE_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_benchmark(specs, concurrency: int):
+    slots = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lags = []
+
+    async def run_in_slot(spec):
+        async with slots:
+            return await run_timed(spec)
+
+    monitor = asyncio.ensure_future(monitor_lag(stop, lags))
+    results = await asyncio.gather(*(run_in_slot(spec) for spec in specs))
+    stop.set()
+    await monitor
+    return results, lags
+
+
+class Command(BaseCommand):
+    help = "Load-test an agent operation against the offline mock model: throughput, latency percentiles " \
+           "and time spent in our own code versus the model"
+
+    def add_arguments(self, parser):
+        parser.add_argument("operation", choices=OPERATIONS)
+        parser.add_argument("project", type=str, help="Project name as configured in RAINER_PROJECTS")
+        parser.add_argument("target", type=str, help="File path, or the task instruction for requirements")
+        parser.add_argument("--instruction", type=str, default="Add a docstring to every public function",
+                            help="Instruction for makefile and refactor")
+        parser.add_argument("--runs", type=int, default=20, help="Operations to run in total")
+        parser.add_argument("--concurrency", type=int, default=10, help="Operations running at the same time")
+        parser.add_argument("--latency", type=float, default=1.0, help="Simulated seconds per model call")
+        parser.add_argument("--jitter", type=float, default=0.25, help="Random ± seconds added to each call")
+        parser.add_argument("--reply-chars", type=int, default=2000, help="Length of the mock's text replies")
+        parser.add_argument("--failure-rate", type=float, default=0.0,
+                            help="Share of mock calls failing with a connection error, to exercise retries")
+        parser.add_argument("--slow-rate", type=float, default=0.0,
+                            help="Share of mock calls taking ten times as long, to exercise hedging")
+        parser.add_argument("--lane", choices=("interactive", "batch"), default=None,
+                            help="Rate limit lane of the operations; defaults to the operation's own")
+        parser.add_argument("--tool-calls", type=str, default=None,
+                            help='JSON list of {"name": ..., "arguments": {...}} made each agent turn; '
+                                 'defaults to a lookup and a grep of the target file')
+
+    def handle(self, *args, **options):
+        from rainer.operations import lib
+        from rainer.operations.mock_model import MockModelProvider
+        from rainer.operations.replay_cache import ReplayCache
+        from rainer.operations.telemetry import spread
+        from rainer.metrics import flush_metrics, get_metrics
+
+        operation, project, target = options["operation"], options["project"], options["target"]
+        tool_calls = json.loads(options["tool_calls"]) if options["tool_calls"] else \
+            default_tool_calls(operation, project, target)
+
+        # Wrapped like the real provider, so RAINER_RATE_LIMITS, retries and hedging can be load-tested too
+        lib.model_provider = lib.wrap_model_provider(MockModelProvider(
+            latency=options["latency"], jitter=options["jitter"], tool_calls=tool_calls,
+            reply_chars=options["reply_chars"], failure_rate=options["failure_rate"],
+            slow_rate=options["slow_rate"]))
+        lib.replay_cache = ReplayCache("", "off")  # Replayed turns would skip the mock and skew the numbers
+
+        # Loading agents and building specs hits the database, which cannot happen on the operation loop
+        specs, setup = [], []
+        for _ in range(options["runs"]):
+            started = time.perf_counter()
+            specs.append(make_spec(operation, project, target, options["instruction"]))
+            if options["lane"]:
+                specs[-1].lane = options["lane"]
+            setup.append(time.perf_counter() - started)
+
+        metrics_before = get_metrics().snapshot()
+        cpu_started, started = time.process_time(), time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(run_benchmark(specs, options["concurrency"]),
+                                                  lib.get_operation_loop())
+        results, lags = future.result()
+        wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+        def row(label: str, values, unit: str = "s"):
+            p = spread(values)
+            self.stdout.write(f"{label:<22}p50 {p['p50']:>9.3f}{unit}   p95 {p['p95']:>9.3f}{unit}")
+
+        succeeded = sum(result["success"] for result in results)
+        self.stdout.write(f"Operation:            {operation} ({project} | {target})")
+        self.stdout.write(f"Runs:                 {len(results)} ({succeeded} succeeded), "
+                          f"concurrency {options['concurrency']}")
+        self.stdout.write(f"Mock model:           {options['latency']}s ± {options['jitter']}s per call, "
+                          f"{sum(result['model_calls'] for result in results)} calls")
+        self.stdout.write(f"Total wall time:      {wall:.3f}s")
+        self.stdout.write(f"Throughput:           {len(results) / wall:.2f} operations/s")
+        self.stdout.write(f"CPU time (process):   {cpu:.3f}s")
+        self.stdout.write("")
+        self.stdout.write("Per operation:")
+        row("  Setup (DB, spec)", setup)
+        row("  Latency", [result["wall"] for result in results])
+        row("  Waiting on model", [result["model"] for result in results])
+        row("  Tool calls", [result["tools"] for result in results])
+        row("  Prompts, tree dumps", [result["prompt"] for result in results])
+        row("  Everything else", [result["other"] for result in results])
+        row("  Tokens", [result["tokens"] for result in results], unit="")
+        self.stdout.write("")
+        self.stdout.write(f"Operation loop blocked: {sum(lags):.3f}s in total, longest {max(lags, default=0):.3f}s")
+
+        flush_metrics()  # Rate limit and retry counters are published from a background thread
+        metrics_after = get_metrics().snapshot()
+        for lane in ("interactive", "batch"):
+            waits = metrics_after.get(f"rate_limit_waits.{lane}", 0) - metrics_before.get(f"rate_limit_waits.{lane}", 0)
+            if waits:
+                seconds = metrics_after[f"rate_limit_wait_seconds.{lane}"] - \
+                          metrics_before.get(f"rate_limit_wait_seconds.{lane}", 0)
+                self.stdout.write(f"Rate limited ({lane}): {waits:.0f} calls waited {seconds:.3f}s in total")
+
+        def counted(name: str) -> float:
+            return metrics_after.get(name, 0) - metrics_before.get(name, 0)
+
+        retries = {kind: counted(f"model_retries.{kind}") for kind in ("rate_limited", "timeout", "transient")}
+        if any(retries.values()) or counted("model_retries_exhausted"):
+            self.stdout.write(f"Retried:              " + ", ".join(f"{n:.0f} {kind}" for kind, n in retries.items())
+                              + f"; {counted('model_retries_exhausted'):.0f} gave up")
+        if counted("model_hedges"):
+            self.stdout.write(f"Hedged:               {counted('model_hedges'):.0f} calls, "
+                              f"{counted('model_hedge_wins'):.0f} won by the hedge")
@@ -4,7 +4,18 @@ from django.core.management import BaseCommand
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Ignore saved tree snapshots and rescan every project from scratch")
+
     def handle(self, *args, **options):
         from rainer import project_trees
+        from rainer.fileapi import refresh_trees, save_snapshots, print_scan_timings
+        from rainer.tree_index import materialize_tree
+
+        if options["rebuild"]:
+            print_scan_timings(refresh_trees())
+            save_snapshots()
+            return
 
-        print(json.dumps(project_trees, indent=4))
\ No newline at end of file
+        print(json.dumps({project: materialize_tree(tree) for project, tree in project_trees.items()}, indent=4))
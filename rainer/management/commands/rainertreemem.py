@@ -0,0 +1,85 @@
+import os
+import tempfile
+import tracemalloc
+
+from django.core.management import BaseCommand
+
+from rainer.settings import EXCLUDED_DIRS, EXCLUDED_FILE_EXTENSIONS, EXCLUDED_FILE_NAMES
+from rainer.tree_index import ProjectTreeIndex
+
+# Names that repeat across real repositories, mixed with unique ones
+COMMON_FILE_NAMES = ["__init__.py", "models.py", "views.py", "index.ts", "types.ts", "README.md"]
+
+
+def make_synthetic_repo(base_dir: str, n_files: int, depth: int, fanout: int) -> None:
+    leaf_dirs = [""]
+    for _ in range(depth):
+        leaf_dirs = [os.path.join(d, f"package_{i}") for d in leaf_dirs for i in range(fanout)]
+
+    for i in range(n_files):
+        rel_dir = leaf_dirs[i % len(leaf_dirs)]
+        name = COMMON_FILE_NAMES[i % len(COMMON_FILE_NAMES)] if i % 3 == 0 else f"module_{i}.py"
+        os.makedirs(os.path.join(base_dir, rel_dir), exist_ok=True)
+        open(os.path.join(base_dir, rel_dir, name), "a").close()
+
+
+def build_legacy_tree(base_dir: str):
+    """The nested dict `build_nested_tree` produced before the compact index, kept as the baseline."""
+    tree = {}
+    abs_base = os.path.abspath(base_dir)
+
+    for root, dirs, files in os.walk(abs_base, topdown=True):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+
+        rel_root = os.path.relpath(root, abs_base).replace("\\", "/")
+        node = tree
+        if rel_root != ".":
+            for part in rel_root.split("/"):
+                node = node.setdefault(part, {})
+
+        files = [f for f in files if
+                 f not in EXCLUDED_FILE_NAMES and os.path.splitext(f)[1] not in EXCLUDED_FILE_EXTENSIONS]
+
+        for file in files:
+            node[file] = os.path.join(rel_root, file) if rel_root != "." else file
+
+    return tree
+
+
+def build_index(base_dir: str) -> ProjectTreeIndex:
+    index = ProjectTreeIndex("synthetic", base_dir, {})
+    index.rebuild()
+    return index
+
+
+def measure(build) -> int:
+    """Bytes still allocated by `build()`'s result once it returns; nothing else is kept alive."""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+class Command(BaseCommand):
+    help = "Compare memory of the legacy nested tree against the compact tree index on a synthetic repo"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=80_000, help="Number of files to generate")
+        parser.add_argument("--depth", type=int, default=4, help="Directory nesting depth")
+        parser.add_argument("--fanout", type=int, default=8, help="Subdirectories per directory")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as base_dir:
+            make_synthetic_repo(base_dir, options["files"], options["depth"], options["fanout"])
+
+            legacy_bytes = measure(lambda: build_legacy_tree(base_dir))
+            compact_bytes = measure(lambda: build_index(base_dir))
+            json_bytes = len(build_index(base_dir).tree_json())
+
+        self.stdout.write(f"Files:                {options['files']}")
+        self.stdout.write(f"Legacy nested dicts:  {legacy_bytes / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"Compact tree index:   {compact_bytes / 1024 / 1024:.1f} MiB "
+                          f"(incl. directory stats)")
+        self.stdout.write(f"Cached JSON payload:  {json_bytes / 1024 / 1024:.1f} MiB")
@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from .settings import RAINER_JOBS_BACKEND
+
+
+# Publishes the metrics of code running on the shared operation loop, one update at a time and in order:
+# with RedisMetrics every update is a network round trip that would stall every operation on the loop
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rainer-metrics")
+
+# Seconds a process's gauges outlive its last update in Redis, so those of stopped workers drop out
+GAUGE_TTL_SECONDS = 300
+
+
+class MemoryMetrics:
+    """Counters and gauges kept in this process; enough when jobs run on the in-process thread pool."""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted({**self._counters, **self._gauges}.items()))
+
+
+class RedisMetrics:
+    """
+    Counters in a Redis hash, so the web process reports what Celery workers counted.
+    Gauges are kept per process and summed, e.g. the queue depths of all workers.
+    """
+
+    KEY = "rainer:metrics"
+    GAUGES_KEY = "rainer:metrics:gauges"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._process = f"{socket.gethostname()}:{os.getpid()}"
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        self._redis.hincrbyfloat(self.KEY, name, amount)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        key = f"{self.GAUGES_KEY}:{self._process}"
+        pipeline = self._redis.pipeline()
+        pipeline.hset(key, name, value)
+        pipeline.expire(key, GAUGE_TTL_SECONDS)
+        pipeline.execute()
+
+    def snapshot(self) -> Dict[str, float]:
+        values = {name.decode(): float(value) for name, value in self._redis.hgetall(self.KEY).items()}
+        for key in self._redis.scan_iter(f"{self.GAUGES_KEY}:*"):
+            for name, value in self._redis.hgetall(key).items():
+                values[name.decode()] = values.get(name.decode(), 0) + float(value)
+        return dict(sorted(values.items()))
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """The process-wide metrics: Redis (the Celery broker) for Celery jobs, memory otherwise."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            from django.conf import settings
+            broker_url = getattr(settings, "CELERY_BROKER_URL", "")
+            if RAINER_JOBS_BACKEND == "celery" and broker_url.startswith("redis"):
+                _metrics = RedisMetrics(broker_url)
+            else:
+                _metrics = MemoryMetrics()
+        return _metrics
+
+
+def increment_counter(name: str, amount: float = 1) -> None:
+    if not amount:
+        return
+    try:
+        get_metrics().increment(name, amount)
+    except Exception as e:
+        # Like progress events, metrics must never take the operation down with them
+        print(f"⚠️ Could not update metric {name}: {e}")
+
+
+def set_gauge(name: str, value: float) -> None:
+    try:
+        get_metrics().set_gauge(name, value)
+    except Exception as e:
+        print(f"⚠️ Could not update metric {name}: {e}")
+
+
+def increment_counter_later(name: str, amount: float = 1) -> None:
+    """`increment_counter` for code on the event loop: queued for the metrics thread instead of blocking."""
+    if amount:
+        _writer.submit(increment_counter, name, amount)
+
+
+def set_gauge_later(name: str, value: float) -> None:
+    """`set_gauge` for code on the event loop: queued for the metrics thread instead of blocking."""
+    _writer.submit(set_gauge, name, value)
+
+
+def flush_metrics() -> None:
+    """Wait until every update queued so far has been published."""
+    _writer.submit(lambda: None).result()
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rainer', '0011_rainerjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeGenerationTelemetry',
+            fields=[
+                ('id', models.UUIDField(auto_created=True, default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('operation', models.CharField(db_index=True, max_length=64)),
+                ('llm_model', models.CharField(max_length=255)),
+                ('rainer_project', models.CharField(default='', max_length=255)),
+                ('rainer_path', models.CharField(default='', max_length=255)),
+                ('success', models.BooleanField(default=False)),
+                ('wall_seconds', models.FloatField(default=0)),
+                ('iterations', models.IntegerField(default=0)),
+                ('agent_turns', models.JSONField(default=list)),
+                ('tool_calls', models.JSONField(default=dict)),
+                ('input_tokens', models.IntegerField(default=0)),
+                ('output_tokens', models.IntegerField(default=0)),
+                ('tokens_saved', models.IntegerField(default=0)),
+                ('generation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='telemetry', to='rainer.codegenerationdata')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rainer', '0012_codegenerationtelemetry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codegenerationtelemetry',
+            name='stop_reason',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='codegenerationtelemetry',
+            name='abandoned_turns',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='codegenerationtelemetry',
+            name='abandoned_tool_calls',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='codegenerationtelemetry',
+            name='abandoned_tokens',
+            field=models.IntegerField(default=0),
+        ),
+    ]
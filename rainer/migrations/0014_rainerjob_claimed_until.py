@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rainer', '0013_codegenerationtelemetry_abandoned'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rainerjob',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -4,11 +4,13 @@ from typing import List, Dict, Any
 from django.db import models
 
 import quicke
-from quicke.lib import BaseModel
+from quicke.lib import BaseModel, quicke_choices
 from rainer import RainerFile
 
 
-@quicke.model()
+@quicke.model({
+    "exclude_fields": ["telemetry"],
+})
 class CodeGenerationData(BaseModel):
     llm_model: str = models.CharField(max_length=255)
     instructions: List[Dict[str, str]] = models.JSONField(default=list)
@@ -58,6 +60,78 @@ class CodeGenerationData(BaseModel):
 
 
 
+@quicke.model({
+    "fields": {
+        "agent_turns": {"type": "Record<string, any>[]"},
+        "tool_calls": {"type": "Record<string, { count: number, seconds: number }>"},
+    }
+})
+class CodeGenerationTelemetry(BaseModel):
+    """
+    Performance of one agent operation run. Failed runs are recorded too, without a generation.
+    `agent_turns` holds one entry per model call; `tool_calls` maps a tool name to its call count and total seconds.
+    """
+    generation = models.ForeignKey(CodeGenerationData, null=True, blank=True, on_delete=models.SET_NULL,
+                                   related_name="telemetry")
+    operation: str = models.CharField(max_length=64, db_index=True)
+    llm_model: str = models.CharField(max_length=255)
+    rainer_project: str = models.CharField(max_length=255, default="")
+    rainer_path: str = models.CharField(max_length=255, default="")
+    success: bool = models.BooleanField(default=False)
+    wall_seconds: float = models.FloatField(default=0)
+    iterations: int = models.IntegerField(default=0)
+    agent_turns: List[Dict[str, Any]] = models.JSONField(default=list)
+    tool_calls: Dict[str, Dict[str, Any]] = models.JSONField(default=dict)
+    input_tokens: int = models.IntegerField(default=0)
+    output_tokens: int = models.IntegerField(default=0)
+    tokens_saved: int = models.IntegerField(default=0)
+    # "timeout" or "cancelled" when stopped early; the abandoned_* fields count the work that was in flight
+    stop_reason: str = models.CharField(max_length=16, blank=True, default="")
+    abandoned_turns: int = models.IntegerField(default=0)
+    abandoned_tool_calls: int = models.IntegerField(default=0)
+    abandoned_tokens: int = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+
+class RainerJobStatus(models.TextChoices):
+    QUEUED = "queued", "Queued"
+    RUNNING = "running", "Running"
+    SUCCEEDED = "succeeded", "Succeeded"
+    FAILED = "failed", "Failed"
+
+
+@quicke.model({
+    "fields": {
+        "status": {"type": quicke_choices(RainerJobStatus)},
+        "payload": {"type": "Record<string, any>"},
+        "result": {"type": "Record<string, any>"},
+    }
+})
+class RainerJob(BaseModel):
+    """
+    A file generation (rainer/file/new, rainer/file/update) running outside the request,
+    polled through rainer/jobs/<id>.
+    """
+    kind: str = models.CharField(max_length=64)
+    status: str = models.CharField(max_length=32, choices=RainerJobStatus.choices, default=RainerJobStatus.QUEUED)
+    payload: Dict[str, Any] = models.JSONField(default=dict)
+    result: Dict[str, Any] = models.JSONField(default=dict)
+    error: str = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker while the job runs; a running job whose claim ran out lost its worker
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (RainerJobStatus.SUCCEEDED, RainerJobStatus.FAILED)
+
+
 @quicke.model({
     "exclude_fields": ["to_dict", "from_dict"],
 })
@@ -0,0 +1,122 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Rough size of a token for English text and code; close enough to budget a conversation
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def item_text(item: dict) -> str:
+    """The part of a conversation item that is sent to the model as text."""
+    if item.get("type") == "function_call_output":
+        output = item.get("output", "")
+        return output if isinstance(output, str) else json.dumps(output)
+    if item.get("type") == "function_call":
+        return item.get("arguments", "")
+
+    content = item.get("content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def item_tokens(item: dict) -> int:
+    return estimate_tokens(item_text(item))
+
+
+def with_text(item: dict, text: str) -> dict:
+    """Copy of `item` with its text replaced, keeping ids and call ids so tool calls stay paired."""
+    item = dict(item)
+    if item.get("type") == "function_call_output":
+        item["output"] = text
+    elif isinstance(item.get("content"), str):
+        item["content"] = text
+    else:
+        parts = [part for part in item.get("content", []) if isinstance(part, dict) and "text" in part]
+        item["content"] = [{**parts[0], "text": text}] if parts else text
+    return item
+
+
+class ContextBudget:
+    """
+    Keeps an operation's conversation under a token budget before each model call.
+
+    The first `pinned` items (the task the operation was seeded with), the latest item and the most
+    recent ones up to `recent_share` of the budget are never touched. Older items are compacted oldest
+    first, and only until the conversation fits again: first stale tool outputs are replaced by a
+    placeholder naming the call (the agent can simply call the tool again), then items the caller can
+    `condense` (pinned or not, e.g. a project tree) are swapped for their shorter form, then long stale
+    assistant messages are cut down to their opening lines. Other user messages are kept whole, since
+    they carry the task. Tool call items themselves are kept, so every call still has its output.
+    """
+
+    def __init__(self, budget: int, recent_share: float = 0.5, summary_chars: int = 400):
+        self.budget = budget
+        self.recent_share = recent_share
+        self.summary_chars = summary_chars
+
+    def compact(self, items: List[dict], pinned: int = 0,
+                condense: Optional[Dict[int, Callable[[], str]]] = None) -> Tuple[List[dict], int]:
+        """
+        Returns the (possibly) compacted conversation and the number of tokens saved.
+        `condense` maps the index of an item to a function returning a shorter text for it.
+        """
+        sizes = [item_tokens(item) for item in items]
+        total = sum(sizes)
+        if not self.budget or total <= self.budget:
+            return items, 0
+
+        # The latest item (normally the prompt being answered) is always kept as-is
+        recent_start = len(items) - 1
+        recent_tokens = sizes[-1]
+        while recent_start > 1 and recent_tokens + sizes[recent_start - 1] <= self.budget * self.recent_share:
+            recent_start -= 1
+            recent_tokens += sizes[recent_start]
+
+        calls: Dict[str, str] = {
+            item.get("call_id", ""): f"{item.get('name', 'tool')}({item.get('arguments', '')})"
+            for item in items if item.get("type") == "function_call"
+        }
+        condense = condense or {}
+        compacted = list(items)
+        saved = 0
+
+        def condensed(i: int, _item: dict, _calls: Dict[str, str]) -> Optional[str]:
+            return condense[i]() if i in condense else None
+
+        for replace in (self._elide_tool_output, condensed, self._summarize_message):
+            for i in range(recent_start):
+                if i < pinned and i not in condense:
+                    continue
+                if total - saved <= self.budget:
+                    return compacted, saved
+
+                text = replace(i, compacted[i], calls)
+                if text is None:
+                    continue
+                replacement = with_text(compacted[i], text)
+                reduction = sizes[i] - item_tokens(replacement)
+                if reduction > 0:
+                    compacted[i] = replacement
+                    sizes[i] -= reduction
+                    saved += reduction
+
+        return compacted, saved
+
+    def _elide_tool_output(self, _i: int, item: dict, calls: Dict[str, str]):
+        if item.get("type") != "function_call_output":
+            return None
+        return f"[output of {calls.get(item.get('call_id', ''), 'tool call')} elided to save context; call again if needed]"
+
+    def _summarize_message(self, _i: int, item: dict, _calls: Dict[str, str]):
+        if item.get("role") != "assistant":
+            return None
+
+        text = item_text(item)
+        if len(text) <= self.summary_chars or text.endswith(" elided ...]"):
+            return None
+        head = text[:self.summary_chars].rsplit("\n", 1)[0]
+        return f"{head}\n[... {estimate_tokens(text[len(head):])} tokens of an earlier message elided ...]"
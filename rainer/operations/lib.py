@@ -1,17 +1,99 @@
-﻿import concurrent.futures
-import asyncio
+﻿import asyncio
+import concurrent.futures
+import threading
+import time
 from abc import ABC, abstractmethod
 from dataclasses import field
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-from agents import trace as conversation_trace, Runner, MessageOutputItem, ItemHelpers
+from agents import trace as conversation_trace, Runner, MessageOutputItem, ItemHelpers, HandoffOutputItem, \
+    ToolCallItem, ToolCallOutputItem, ModelProvider, MultiProvider, RunConfig
 
 from gpt.lib import GptAgentWithIntro
+from gpt.tools import ToolContext
+from rainer.events import emit_event, is_cancelled
+from rainer.fileapi import get_project_tree_json, get_project_tree_outline_json
+from rainer.metrics import increment_counter
+from rainer.rate_limits import INTERACTIVE, current_lane
+from rainer.operations.context_budget import ContextBudget
+from rainer.operations.rate_limited_model import RateLimitedModelProvider
+from rainer.operations.resilient_model import ResilientModelProvider
+from rainer.operations.replay_cache import ReplayCache
+from rainer.operations.telemetry import OperationTelemetry, TelemetryHooks
+from rainer.settings import RAINER_OPERATION_TOKEN_BUDGET, RAINER_REPLAY_MODE, RAINER_REPLAY_DIR, \
+    RAINER_REPLAY_TTL_SECONDS, RAINER_REPLAY_MAX_BYTES, RAINER_MODEL_PROVIDER, RAINER_MOCK_LATENCY_SECONDS, \
+    RAINER_MOCK_LATENCY_JITTER
+
+replay_cache = ReplayCache(RAINER_REPLAY_DIR, RAINER_REPLAY_MODE, RAINER_REPLAY_TTL_SECONDS, RAINER_REPLAY_MAX_BYTES)
+
+
+def wrap_model_provider(provider: ModelProvider) -> ModelProvider:
+    """
+    `provider` with retries and hedging around the rate limit scheduler, so every attempt
+    waits for its turn like a first call.
+    """
+    return ResilientModelProvider(RateLimitedModelProvider(provider))
+
+
+def make_model_provider() -> Optional[ModelProvider]:
+    """The provider agent operations run their models on, wrapped by `wrap_model_provider`."""
+    if RAINER_MODEL_PROVIDER == "mock":
+        from rainer.operations.mock_model import MockModelProvider
+        provider = MockModelProvider(latency=RAINER_MOCK_LATENCY_SECONDS, jitter=RAINER_MOCK_LATENCY_JITTER)
+    elif RAINER_MODEL_PROVIDER == "openai":
+        provider = MultiProvider()  # The SDK default, shared so its OpenAI client reuses connections
+    else:
+        raise ValueError(f"Unknown RAINER_MODEL_PROVIDER {RAINER_MODEL_PROVIDER!r}, expected openai or mock")
+    return wrap_model_provider(provider)
+
+
+# Replaceable, e.g. by the rainerbench command, to run operations on another model backend
+model_provider = make_model_provider()
+
+# Levels of the project tree kept when compaction cuts down the tree an operation was seeded with
+CONDENSED_TREE_DEPTH = 2
+
+# Streamed text is forwarded to the event stream in chunks of at least this many characters
+PARTIAL_MESSAGE_CHARS = 200
+
+
+# How often a running operation checks its event stream for a cancel request
+CANCEL_POLL_SECONDS = 0.5
+
+# Extra time run() waits past the deadline for arun() to stop by itself before cancelling it from outside
+RUN_GRACE_SECONDS = 5
+
+# Writes progress events and stop counters one at a time, in order, off the operation loop: with the
+# Redis event stream each write is a network round trip that would stall every operation on the loop
+_event_writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="rainer-events")
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+def usage_of(result) -> Tuple[int, int]:
+    """(input, output) tokens reported by the model across all responses of one run."""
+    input_tokens = output_tokens = 0
+    for response in getattr(result, "raw_responses", []):
+        usage = getattr(response, "usage", None)
+        input_tokens += getattr(usage, "input_tokens", 0) or 0
+        output_tokens += getattr(usage, "output_tokens", 0) or 0
+    return input_tokens, output_tokens
+
+
+def count_stop(reason: str, turns: int, tool_calls: int, tokens: int) -> None:
+    increment_counter(f"operations_{reason}")
+    increment_counter("abandoned_agent_turns", turns)
+    increment_counter("abandoned_tool_calls", tool_calls)
+    increment_counter("abandoned_tokens", tokens)
 
 
 # --- Base OperationSpec ---
 
 class AgentOperationSpec(ABC):
+    operation: str = "unknown"  # Operation type, used to group telemetry
+    lane: str = INTERACTIVE  # Rate limit priority of its model calls; background work uses BATCH
     conversation_id: str
     project: str
     instruction: str
@@ -26,6 +108,11 @@ class AgentOperationSpec(ABC):
     current_step: int = 1
     trace: str = "unknown_op"
     message_history: List[str] = field(default_factory=list)
+    token_budget: int = RAINER_OPERATION_TOKEN_BUDGET
+    event_stream: str = ""
+    tokens_saved: Dict[int, int] = field(default_factory=dict)
+    telemetry: OperationTelemetry
+    tool_context: ToolContext
 
     def __init__(
             self,
@@ -42,6 +129,9 @@ class AgentOperationSpec(ABC):
             conversation: Optional[List[dict]] = None,
             message_history: Optional[List[str]] = None,
             max_steps: Optional[int] = None,
+            token_budget: int = RAINER_OPERATION_TOKEN_BUDGET,
+            event_stream: str = "",
+            telemetry: Optional[OperationTelemetry] = None,
     ):
         self.conversation_id = conversation_id
         self.project = project
@@ -55,25 +145,37 @@ class AgentOperationSpec(ABC):
         self.conversation = conversation if conversation is not None else []
         self.message_history = message_history if message_history is not None else []
         self.max_steps = max_steps
+        self.token_budget = token_budget
+        self.context_budget = ContextBudget(token_budget)
+        # Items `init` seeded the conversation with; compaction never touches them, except those in `condensable`
+        self.pinned_items = 0
+        # Index of an item -> its shorter text, for items compaction may cut down (see `add_project_tree`)
+        self.condensable: Dict[int, Callable[[], str]] = {}
+        self.tokens_saved = {}
+        self.event_stream = event_stream
+        self.telemetry = telemetry if telemetry is not None else OperationTelemetry()
+        self.tool_context = ToolContext()
         self.last_message = ""
         self.current_step = 1
+        self._last_write: Optional[concurrent.futures.Future] = None
 
     @abstractmethod
     def init(self):
         ...
 
     @abstractmethod
-    def loop(self):
+    async def loop(self):
         ...
 
     @abstractmethod
     def done_if(self) -> bool:
         ...
 
-    def __execute__(self) -> Tuple[bool, str]:
+    async def __execute__(self) -> Tuple[bool, str]:
         with conversation_trace(self.trace, group_id=self.conversation_id):
             self.add_as_user([f"--- START ---"])
-            self.init()
+            await asyncio.to_thread(self.init)  # Tree dumps and file reads; other operations keep running meanwhile
+            self.pinned_items = len(self.conversation)
 
             while True:
                 if self.done_if():
@@ -81,26 +183,186 @@ class AgentOperationSpec(ABC):
                 if isinstance(self.max_steps, int) and self.current_step > self.max_steps:
                     return False, f"Maximum operation loop steps ({self.max_steps}) exceeded"
 
+                await self.check_cancelled()
+                self.emit("step_start", step=self.current_step)
+                started = time.perf_counter()
+
                 self.add_as_user([f"--- ITERATION {self.current_step} ---"])
-                self.loop()
+                await self.loop()
+
+                self.emit("step_end", step=self.current_step, seconds=round(time.perf_counter() - started, 3))
                 self.current_step += 1
 
+    def emit(self, event_type: str, **data) -> None:
+        """Publish a progress event to this operation's event stream, if it has one, without waiting for the write."""
+        if self.event_stream:
+            self._last_write = _event_writer.submit(emit_event, self.event_stream, event_type, **data)
+
+    async def flush_events(self) -> None:
+        """Wait until the events emitted so far are written, so those published after the operation follow them."""
+        if self._last_write is not None:
+            await asyncio.wrap_future(self._last_write)
+
+    async def cancel_requested(self) -> bool:
+        return bool(self.event_stream) and await asyncio.to_thread(is_cancelled, self.event_stream)
+
+    async def check_cancelled(self) -> None:
+        if await self.cancel_requested():
+            raise OperationCancelled("Operation cancelled")
+
     def add_as_user(self, messages: List[str]):
         for msg in messages:
             self.conversation.append({"role": "user", "content": msg})
         return self
 
-    def run_with_agent(self, agent):
-        result = Runner.run_sync(agent, self.conversation, max_turns=13)
-        self.conversation = result.to_input_list()
+    def add_project_tree(self, before: str = "", after: str = ""):
+        """
+        Add the project's whole tree, between `before` and `after`, as a user message. Unlike the rest of
+        what `init` adds it is not pinned: compaction may cut it down to its top CONDENSED_TREE_DEPTH levels,
+        as the agent can always call project_tree for the whole tree.
+        """
+        self.add_as_user([f"{before}{get_project_tree_json(self.project)}{after}"])
+        self.condensable[len(self.conversation) - 1] = lambda: (
+            f"{before}{get_project_tree_outline_json(self.project, CONDENSED_TREE_DEPTH)}\n"
+            f"[Deeper levels of the project tree elided to save context; call project_tree for all of it]{after}"
+        )
+        return self
+
+    def compact_conversation(self) -> int:
+        """Fit the conversation into `token_budget`, recording the estimated tokens saved for this step."""
+        self.conversation, saved = self.context_budget.compact(self.conversation, self.pinned_items, self.condensable)
+        if saved:
+            self.tokens_saved[self.current_step] = self.tokens_saved.get(self.current_step, 0) + saved
+            print(f"🗜️ {self.trace} step {self.current_step}: compacted conversation, saved ~{saved} tokens")
+            self.emit("compaction", step=self.current_step, tokens_saved=saved)
+        return saved
+
+    async def call_agent(self, agent, conversation: List[dict]) -> Tuple[List[dict], List[str]]:
+        """One agent turn on `conversation`; returns the conversation after the turn and the new messages."""
+        await self.check_cancelled()
+        self.emit("agent_turn_start", step=self.current_step, agent=agent.name)
+        started = time.perf_counter()
+
+        key = replay_cache.key(agent, conversation) if replay_cache.enabled else ""
+        entry = await asyncio.to_thread(replay_cache.get, key) if key else None
+        if entry is not None:
+            print(f"♻️ Replayed {agent.name} turn from cache")
+            self.end_agent_turn(agent, started, 0, 0, replayed=True)
+            return conversation + entry["items"], entry["messages"]
+
+        hooks = TelemetryHooks(self.telemetry)
+        try:
+            if self.event_stream:
+                result = await self.run_streamed(agent, conversation, hooks)
+            else:
+                result = await Runner.run(agent, conversation, context=self.tool_context, max_turns=13, hooks=hooks,
+                                          run_config=run_config())
+        except asyncio.CancelledError:
+            # Stopped mid-turn; the model call in flight is aborted with it, after its input was sent
+            self.telemetry.abandoned_tool_calls += hooks.tools_in_flight()
+            self.end_agent_turn(agent, started, hooks.input_tokens + (hooks.llm_in_flight or 0), hooks.output_tokens,
+                                abandoned=True)
+            raise
+        self.end_agent_turn(agent, started, *usage_of(result))
 
-        for new_item in result.new_items:
-            if isinstance(new_item, MessageOutputItem):
-                self.last_message = ItemHelpers.text_message_output(new_item)
-                self.message_history.append(self.last_message)
+        items = result.to_input_list()
+        messages = [
+            ItemHelpers.text_message_output(new_item)
+            for new_item in result.new_items if isinstance(new_item, MessageOutputItem)
+        ]
 
+        if key and not getattr(model_provider, "simulated", False):
+            await asyncio.to_thread(replay_cache.put, key, items[len(conversation):], messages)
+        return items, messages
+
+    def end_agent_turn(self, agent, started: float, input_tokens: int, output_tokens: int, replayed=False,
+                       abandoned=False) -> None:
+        seconds = time.perf_counter() - started
+        self.telemetry.add_agent_turn(self.current_step, agent.name, seconds, input_tokens, output_tokens, replayed,
+                                      abandoned)
+        self.emit("agent_turn_end", step=self.current_step, agent=agent.name, replayed=replayed,
+                  seconds=round(seconds, 3), input_tokens=input_tokens, output_tokens=output_tokens,
+                  **({"abandoned": True} if abandoned else {}))
+
+    async def run_streamed(self, agent, conversation: List[dict], hooks: TelemetryHooks):
+        """Runner.run, streamed so tool calls, handoffs and partial messages reach the event stream live."""
+        result = Runner.run_streamed(agent, conversation, context=self.tool_context, max_turns=13, hooks=hooks,
+                                     run_config=run_config())
+        partial: List[str] = []
+
+        def flush():
+            if partial:
+                self.emit("message_delta", step=self.current_step, agent=agent.name, text="".join(partial))
+                partial.clear()
+
+        try:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and getattr(event.data, "type", "") == "response.output_text.delta":
+                    partial.append(event.data.delta)
+                    if sum(len(text) for text in partial) >= PARTIAL_MESSAGE_CHARS:
+                        flush()
+                elif event.type == "run_item_stream_event":
+                    flush()
+                    self.emit_item(agent, event.item)
+        except asyncio.CancelledError:
+            # The streamed run works in its own task, which would otherwise carry on without us
+            cancel_streamed_run(result)
+            raise
+
+        flush()
         return result
 
+    def emit_item(self, agent, item) -> None:
+        if isinstance(item, ToolCallItem):
+            raw = item.raw_item
+            self.emit("tool_call", step=self.current_step, agent=agent.name, tool=getattr(raw, "name", ""),
+                      arguments=str(getattr(raw, "arguments", ""))[:500])
+        elif isinstance(item, ToolCallOutputItem):
+            self.emit("tool_output", step=self.current_step, agent=agent.name, chars=len(str(item.output)))
+        elif isinstance(item, HandoffOutputItem):
+            self.emit("handoff", step=self.current_step, source=item.source_agent.name, target=item.target_agent.name)
+        elif isinstance(item, MessageOutputItem):
+            self.emit("message", step=self.current_step, agent=agent.name,
+                      text=ItemHelpers.text_message_output(item))
+
+    async def run_with_agent(self, agent) -> List[str]:
+        self.compact_conversation()
+        self.conversation, messages = await self.call_agent(agent, self.conversation)
+        self.record_messages(messages)
+
+        return messages
+
+    async def run_agents_concurrently(self, prompts: List[Tuple[GptAgentWithIntro, str]]):
+        """
+        Run agents side by side, each on its own fork of the conversation with its prompt appended.
+        The forks' new items are merged back in the order of `prompts`, not completion order,
+        so the resulting conversation is the same however the calls interleave.
+        If one agent fails, the others are cancelled and awaited before its error is raised.
+        """
+        self.compact_conversation()
+        base = list(self.conversation)
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [
+                    group.create_task(self.call_agent(agent, base + [{"role": "user", "content": prompt}]))
+                    for agent, prompt in prompts
+                ]
+        except ExceptionGroup as failed:
+            # Raised as a single call would raise it, so OperationCancelled and timeouts are handled as usual
+            raise failed.exceptions[0] from None
+        results = [task.result() for task in tasks]
+
+        for items, messages in results:
+            self.conversation.extend(items[len(base):])
+            self.record_messages(messages)
+
+        return [messages for _, messages in results]
+
+    def record_messages(self, messages: List[str]):
+        for message in messages:
+            self.last_message = message
+            self.message_history.append(message)
+
     def get_agent(self, name: str):
         for agent in self.agents:
             if agent.name == name:
@@ -113,23 +375,117 @@ class AgentOperationSpec(ABC):
         return "\n\n".join(
             [f"{a.name}: \"{getattr(a, 'intro', 'NO_INTRO')}\"" for a in self.agents])
 
+    async def arun(self) -> Tuple[bool, str]:
+        """Run the operation on the caller's event loop; many operations can share one loop."""
+        self.emit("operation_start", trace=self.trace, project=self.project, path=self.path)
+        self.telemetry.operation = self.operation
+        self.telemetry.llm_model = str(getattr(self.lead, "model", None) or "")
+        started = time.perf_counter()
+        current_lane.set(self.lane)  # Seen by the model calls of this task and those it starts
+        self.tool_context.deadline = time.monotonic() + self.timeout_seconds
+        execution = asyncio.ensure_future(self.__execute__())
+        watcher = asyncio.ensure_future(self.watch(execution))
+        try:
+            success, message = await execution
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling() or not self.telemetry.stop_reason:
+                # Cancelled by whoever awaits this operation, e.g. run() giving up on it
+                self.telemetry.stop_reason = self.telemetry.stop_reason or "cancelled"
+                self.finish(started, False, "Operation cancelled")
+                raise
+            success, message = False, self.stop_message()
+            print(message)
+        except OperationCancelled as ex:
+            self.telemetry.stop_reason = "cancelled"
+            success, message = False, str(ex)
+        except Exception as ex:
+            print(ex)
+            success, message = False, str(ex)
+        finally:
+            watcher.cancel()
+
+        self.finish(started, success, message)
+        await self.flush_events()
+        return success, message
+
+    async def watch(self, execution: asyncio.Future) -> None:
+        """Cancel `execution` at the deadline or on a cancel request, aborting the model calls in flight."""
+        while not execution.done():
+            remaining = self.tool_context.deadline - time.monotonic()
+            if remaining <= 0:
+                self.telemetry.stop_reason = "timeout"
+            elif await self.cancel_requested():
+                self.telemetry.stop_reason = "cancelled"
+            else:
+                await asyncio.sleep(min(remaining, CANCEL_POLL_SECONDS) if self.event_stream else remaining)
+                continue
+            execution.cancel()
+            return
+
+    def stop_message(self) -> str:
+        if self.telemetry.stop_reason == "timeout":
+            return f"Operation timed out after {self.timeout_seconds} seconds."
+        return "Operation cancelled"
+
+    def finish(self, started: float, success: bool, message: str) -> None:
+        seconds = time.perf_counter() - started
+        self.telemetry.success = success
+        self.telemetry.wall_seconds = round(seconds, 3)
+        self.telemetry.iterations = self.current_step - 1
+        self.telemetry.tokens_saved = sum(self.tokens_saved.values())
+
+        if self.telemetry.stop_reason:
+            _event_writer.submit(count_stop, self.telemetry.stop_reason, self.telemetry.abandoned_turns,
+                                 self.telemetry.abandoned_tool_calls, self.telemetry.abandoned_tokens)
+
+        self.emit("operation_end", success=success, steps=self.current_step - 1, seconds=round(seconds, 3),
+                  **({} if success else {"error": message}),
+                  **({"stop_reason": self.telemetry.stop_reason} if self.telemetry.stop_reason else {}))
+
     def run(self) -> Tuple[bool, str]:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            try:
-                future = executor.submit(__run_asyncio_loop__, self)
-                return future.result(timeout=self.timeout_seconds)
-            except concurrent.futures.TimeoutError:
-                error = f"Operation timed out after {self.timeout_seconds} seconds."
-                print(error)
-                return False, error
-            except Exception as ex:
-                print(ex)
-                return False, str(ex)
-
-
-def __run_asyncio_loop__(spec: AgentOperationSpec):
-    try:
-        asyncio.get_running_loop()
-    except RuntimeError:
-        asyncio.set_event_loop(asyncio.new_event_loop())
-    return spec.__execute__()
+        """Blocking wrapper around `arun()` for synchronous callers such as Django views."""
+        loop = get_operation_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("run() would block the operation loop; await arun() instead")
+
+        future = asyncio.run_coroutine_threadsafe(self.arun(), loop)
+        try:
+            return future.result(timeout=self.timeout_seconds + RUN_GRACE_SECONDS)
+        except concurrent.futures.TimeoutError:
+            # arun() stops itself at the deadline unless something blocks the loop; cancel it rather than leak it
+            self.telemetry.stop_reason = "timeout"
+            future.cancel()
+            return False, f"Operation timed out after {self.timeout_seconds} seconds."
+
+
+def run_config() -> Optional[RunConfig]:
+    return RunConfig(model_provider=model_provider) if model_provider is not None else None
+
+
+def cancel_streamed_run(result) -> None:
+    """Stop the task behind a Runner.run_streamed result; older SDKs have no RunResultStreaming.cancel."""
+    if hasattr(result, "cancel"):
+        result.cancel()
+        return
+    task = getattr(result, "run_loop_task", None) or getattr(result, "_run_impl_task", None)
+    if task is not None and not task.done():
+        task.cancel()
+
+
+_operation_loop: Optional[asyncio.AbstractEventLoop] = None
+_operation_loop_lock = threading.Lock()
+
+
+def get_operation_loop() -> asyncio.AbstractEventLoop:
+    """The event loop shared by every synchronous `run()` in this process, started on first use."""
+    global _operation_loop
+    with _operation_loop_lock:
+        if _operation_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="rainer-operations", daemon=True).start()
+            _operation_loop = loop
+        return _operation_loop
@@ -1,11 +1,11 @@
-﻿import json
-import uuid
+﻿import uuid
 import logging
 from dataclasses import dataclass
+from typing import Optional
 
-from rainer import project_trees
-from task_manager.models import Agent
+from task_manager.agent_registry import agent_registry
 from rainer.operations.lib import AgentOperationSpec
+from rainer.operations.telemetry import OperationTelemetry
 from rainer.fileapi import unpack_file_ref
 from rainer.instructions import RefactorFile
 
@@ -14,14 +14,14 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 class MakeFileSpec(AgentOperationSpec):
+    operation = "makefile"
     def init(self):
         logging.info("Initialized MakeFileSpec with parameters")
-        self.add_as_user([
-            f"""
+        self.add_project_tree("""
 --- PROJECT FILES ---
 --- THESE ARE ALL THE FILES THAT CURRENTLY EXIST IN THE PROJECT ---
-{json.dumps(project_trees.get(self.project, {}))}
-""",
+""", "\n")
+        self.add_as_user([
             f"""
 --- FILE CREATION REQUEST ---
 PROJECT (CASE SENSITIVE): {self.project}
@@ -30,7 +30,8 @@ INSTRUCTION: {self.instruction}
 
 --- GUIDELINES ---
 - Implement only what is required by the file creation instruction and nothing else.
-- Use `project_file_lookup` to inspect existing code if needed.
+- Use `project_file_lookup` to inspect existing code if needed; use `project_file_batch_lookup` to read several files at once.
+- Use `project_grep` to find where names are defined or used.
 - Do not assume or create dependencies unless explicitly required.
 - If the request is ambiguous, output only `>>>TASK_FAILED`.
 - Otherwise, generate a complete and functional file following the given instruction.
@@ -40,7 +41,7 @@ INSTRUCTION: {self.instruction}
 
         logging.info("Initialized OVERDRIVE for file creation")
 
-    def loop(self):
+    async def loop(self):
         self.add_as_user([
             f"""
 OVERDRIVE, implement the file creation task.
@@ -48,7 +49,7 @@ IF the output needs refinement, return only >>>TASK_REFINEMENT.
 ELSE return the final file content as a plaintext string.
 REMEMBER: Final task output must start with >>>TASK_RESULT or >>>TASK_FAILED and contain the full file contents."""
         ])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
 
     def done_if(self) -> bool:
         return (self.last_message or "").strip().startswith(">>>TASK_RESULT") or \
@@ -57,14 +58,15 @@ REMEMBER: Final task output must start with >>>TASK_RESULT or >>>TASK_FAILED and
 
 # --- Execution Entry Point ---
 
-def execute(refactor_file: RefactorFile):
+def make_spec(refactor_file: RefactorFile, event_stream: str = "",
+              telemetry: Optional[OperationTelemetry] = None) -> MakeFileSpec:
     conversation_id = uuid.uuid4().hex[:16]
     project, path = unpack_file_ref(refactor_file)
     file_instruction = refactor_file.get("content", "") if isinstance(refactor_file, dict) else refactor_file.content or ""
 
-    # Load agents from DB
-    overdrive_agent = Agent.objects.get(name="OVERDRIVE")
-    supporting_agents = list(Agent.objects.filter(name__in=["NEONRAIL", "SUGARBYTE", "HEXLACE"]))
+    # Runtime agents, cached per process
+    overdrive_agent = agent_registry.get("OVERDRIVE")
+    supporting_agents = agent_registry.filter(["NEONRAIL", "SUGARBYTE", "HEXLACE"])
 
     return MakeFileSpec(
         conversation_id=conversation_id,
@@ -74,6 +76,12 @@ def execute(refactor_file: RefactorFile):
         max_steps=10,
         output_instruction="Output the full file contents as plaintext.",
         agents=supporting_agents,
-        lead=overdrive_agent.to_runtime_agent(),
-        trace=f"MAKEFILE : {project} | {path}"
-    ).run()
+        lead=overdrive_agent,
+        trace=f"MAKEFILE : {project} | {path}",
+        event_stream=event_stream,
+        telemetry=telemetry
+    )
+
+
+def execute(refactor_file: RefactorFile, event_stream: str = "", telemetry: Optional[OperationTelemetry] = None):
+    return make_spec(refactor_file, event_stream, telemetry).run()
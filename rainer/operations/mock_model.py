@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import json
+import random
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from agents import ModelProvider, ModelResponse, Usage
+from agents.models.interface import Model
+from openai.types.responses import (
+    Response, ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText,
+    ResponseTextDeltaEvent, ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+from rainer.operations.context_budget import estimate_tokens, item_text
+
+# Size of the text chunks a streamed mock response is split into
+STREAM_CHUNK_CHARS = 40
+
+# How many times longer than usual a simulated slow call takes
+SLOW_CALL_FACTOR = 10
+
+
+class ModelTime:
+    """
+    Wall time spent waiting on the model, counted once while any call is in flight,
+    so agents answering side by side are not counted twice.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self._active = 0
+        self._since = 0.0
+
+    def enter(self) -> None:
+        self.calls += 1
+        if self._active == 0:
+            self._since = time.perf_counter()
+        self._active += 1
+
+    def exit(self) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self.seconds += time.perf_counter() - self._since
+
+
+# Set around an operation (e.g. by the benchmark) to attribute mock model time to it;
+# tasks the operation starts inherit it
+model_time: contextvars.ContextVar[Optional[ModelTime]] = contextvars.ContextVar("model_time", default=None)
+
+
+def auto_reply(prompt: str, reply_chars: int) -> str:
+    """A reply that moves our operations along: the JSON, or the result marker, the last prompt asks for."""
+    body = "\n".join(f"# mock line {i}" for i in range(reply_chars // 14 + 1))[:reply_chars]
+    if "JSON array" in prompt:
+        return "[]"
+    if "TASK_PATCH" in prompt:
+        # The mock never sees the file, so its patch cannot apply and operations take their full-output path
+        return f"TASK_PATCH\n<<<<<<< SEARCH\n=======\n{body}\n>>>>>>> REPLACE"
+    if "TASK_OUTPUT" in prompt:
+        return f"TASK_OUTPUT\n{body}"
+    if ">>>TASK_RESULT" in prompt:
+        return f">>>TASK_RESULT\n{body}"
+    return body
+
+
+class MockModel(Model):
+    """
+    Offline stand-in for the OpenAI Responses model.
+
+    Every agent turn first makes the scripted `tool_calls` (those the agent has), one per model call,
+    then answers with `auto_reply`. Each call sleeps for `latency` ± `jitter` seconds; a `slow_rate`
+    share of calls takes SLOW_CALL_FACTOR times as long and a `failure_rate` share fails with a
+    ConnectionError, to exercise retries and hedging.
+    """
+
+    def __init__(self, name: str, latency: float, jitter: float, tool_calls: List[Dict], reply_chars: int,
+                 failure_rate: float = 0.0, slow_rate: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.tool_calls = tool_calls
+        self.reply_chars = reply_chars
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        output, usage = await self.respond(system_instructions, input, tools)
+        return ModelResponse(output, usage, None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs) -> AsyncIterator:
+        output, usage = await self.respond(system_instructions, input, tools)
+        for item in output:
+            if isinstance(item, ResponseOutputMessage):
+                text = item.content[0].text
+                for start in range(0, len(text), STREAM_CHUNK_CHARS):
+                    yield ResponseTextDeltaEvent.model_construct(
+                        type="response.output_text.delta", item_id=item.id, output_index=0, content_index=0,
+                        delta=text[start:start + STREAM_CHUNK_CHARS], sequence_number=0, logprobs=[])
+
+        response = Response.model_construct(
+            id=f"mock_{uuid.uuid4().hex}", object="response", created_at=time.time(), model=self.name,
+            output=output, tools=[], tool_choice="auto", parallel_tool_calls=True, status="completed",
+            usage=ResponseUsage.model_construct(
+                input_tokens=usage.input_tokens, output_tokens=usage.output_tokens, total_tokens=usage.total_tokens,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0)))
+        yield ResponseCompletedEvent.model_construct(type="response.completed", response=response, sequence_number=0)
+
+    async def respond(self, system_instructions, input, tools):
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else list(input)
+        texts = [system_instructions or ""] + [item_text(item) for item in items]
+
+        # Tool outputs since the latest user message tell how far into the script this turn is
+        turn_start = max((i for i, item in enumerate(items) if item.get("role") == "user"), default=0)
+        done_calls = sum(1 for item in items[turn_start:] if item.get("type") == "function_call_output")
+        available = {tool.name for tool in tools}
+        script = [call for call in self.tool_calls if call["name"] in available]
+
+        stats = model_time.get()
+        if stats:
+            stats.enter()
+        try:
+            seconds = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+            if random.random() < self.slow_rate:
+                seconds *= SLOW_CALL_FACTOR
+            await asyncio.sleep(seconds)
+        finally:
+            if stats:
+                stats.exit()
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Simulated connection failure")
+
+        if done_calls < len(script):
+            call = script[done_calls]
+            output = ResponseFunctionToolCall(
+                id=f"fc_{uuid.uuid4().hex}", call_id=f"call_{uuid.uuid4().hex}", type="function_call",
+                name=call["name"], arguments=json.dumps(call.get("arguments", {})), status="completed")
+            reply = output.arguments
+        else:
+            reply = auto_reply(self.prompt_of(items, turn_start), self.reply_chars)
+            output = ResponseOutputMessage(
+                id=f"msg_{uuid.uuid4().hex}", type="message", role="assistant", status="completed",
+                content=[ResponseOutputText(type="output_text", text=reply, annotations=[])])
+
+        input_tokens = sum(estimate_tokens(text) for text in texts)
+        output_tokens = estimate_tokens(reply)
+        usage = Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                      total_tokens=input_tokens + output_tokens)
+        return [output], usage
+
+    @staticmethod
+    def prompt_of(items: List[dict], turn_start: int) -> str:
+        """The run of user messages ending at `turn_start`; operations often ask in several messages at once."""
+        start = turn_start
+        while start > 0 and items[start - 1].get("role") == "user":
+            start -= 1
+        return "\n".join(item_text(item) for item in items[start:turn_start + 1])
+
+
+class MockModelProvider(ModelProvider):
+    """Hands out MockModels for every model name, so agent operations run without calling OpenAI."""
+    simulated = True  # Its responses are never written to the replay cache
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0, tool_calls: Optional[List[Dict]] = None,
+                 reply_chars: int = 2000, failure_rate: float = 0.0, slow_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tool_calls = tool_calls or []
+        self.reply_chars = reply_chars
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return MockModel(model_name or "mock", self.latency, self.jitter, self.tool_calls, self.reply_chars,
+                         self.failure_rate, self.slow_rate)
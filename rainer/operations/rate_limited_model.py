@@ -0,0 +1,92 @@
+from typing import AsyncIterator, Optional
+
+import openai
+from agents import ModelProvider, ModelResponse
+from agents.models.interface import Model
+
+from rainer.operations.context_budget import estimate_tokens, item_text
+from rainer.rate_limits import RateLimitScheduler, get_scheduler, retry_after
+from rainer.settings import RAINER_RATE_LIMIT_OUTPUT_TOKENS
+
+
+def estimate_input_tokens(system_instructions: Optional[str], input) -> int:
+    items = [input] if isinstance(input, str) else [item_text(item) for item in input]
+    return estimate_tokens(system_instructions or "") + sum(estimate_tokens(text) for text in items)
+
+
+def estimate_call_tokens(system_instructions: Optional[str], input, model_settings) -> int:
+    """Tokens to reserve for one model call: its input, plus the most it may answer with."""
+    return estimate_input_tokens(system_instructions, input) + \
+        (getattr(model_settings, "max_tokens", None) or RAINER_RATE_LIMIT_OUTPUT_TOKENS)
+
+
+class RateLimitedModel(Model):
+    """Waits for the scheduler before each call of the wrapped model, then settles what the call really used."""
+
+    def __init__(self, model: Model, name: str, scheduler: Optional[RateLimitScheduler] = None):
+        self.model = model
+        self.name = name
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> RateLimitScheduler:
+        return self._scheduler or get_scheduler()
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        reserved = estimate_call_tokens(system_instructions, input, model_settings)
+        await self.scheduler.acquire(self.name, reserved)
+        try:
+            response = await self.model.get_response(system_instructions, input, model_settings, tools,
+                                                     output_schema, handoffs, tracing, **kwargs)
+        except openai.RateLimitError as e:
+            await self.scheduler.pause(self.name, retry_after(e))
+            raise
+
+        await self.scheduler.settle(self.name, reserved, getattr(response.usage, "total_tokens", 0) or 0)
+        return response
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs) -> AsyncIterator:
+        reserved = estimate_call_tokens(system_instructions, input, model_settings)
+        await self.scheduler.acquire(self.name, reserved)
+        used = 0
+        try:
+            async for event in self.model.stream_response(system_instructions, input, model_settings, tools,
+                                                          output_schema, handoffs, tracing, **kwargs):
+                if getattr(event, "type", "") == "response.completed":
+                    used = getattr(getattr(event.response, "usage", None), "total_tokens", 0) or 0
+                yield event
+        except openai.RateLimitError as e:
+            await self.scheduler.pause(self.name, retry_after(e))
+            raise
+
+        await self.scheduler.settle(self.name, reserved, used)
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self) -> None:
+        await self.model.close()
+
+    async def _cleanup_on_run_end(self, owner: object) -> None:
+        await self.model._cleanup_on_run_end(owner)
+
+
+class RateLimitedModelProvider(ModelProvider):
+    """Hands out the wrapped provider's models behind the process-wide rate limit scheduler."""
+
+    def __init__(self, provider: ModelProvider, scheduler: Optional[RateLimitScheduler] = None):
+        self.provider = provider
+        self.scheduler = scheduler
+
+    @property
+    def simulated(self) -> bool:
+        return getattr(self.provider, "simulated", False)
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        model = self.provider.get_model(model_name)
+        return RateLimitedModel(model, model_name or getattr(model, "model", "") or "default", self.scheduler)
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
@@ -1,7 +1,7 @@
 import json
 import uuid  # 🆔 For generating unique identifiers
-import concurrent.futures  # 🧵 For managing concurrent executions
-import asyncio  # ⏳ For handling asynchronous operations
+import concurrent.futures  # 🧵 For waiting on the operation loop with a timeout
+import asyncio  # ⏳ For handing the loop to the shared operation loop
 
 from agents import (
     trace,  # 🔍 For tracing execution for debugging
@@ -12,9 +12,12 @@ from agents import (
     ToolCallItem,  # 🛠️ Represents a call to a tool
     ToolCallOutputItem,  # 🔧 Output of a tool call
 )
-from gpt.the_a_team import AGENT_BLACKSOCKET  # ⚙️ Agent specialized for refactoring
+from gpt.the_a_team import A_TEAM  # ⚙️ BLACKSOCKET is the agent specialized for refactoring, built on first use
 from rainer.fileapi import unpack_file_ref  # 📦 Unpack file references
 from rainer.instructions import RefactorFile  # 📜 Definition for refactoring files
+from rainer.metrics import increment_counter  # 📈 Counts work abandoned at the timeout
+from rainer.operations.lib import get_operation_loop, run_config, usage_of  # 🔁 Shared loop and model backend
+from rainer.operations.telemetry import OperationTelemetry, TelemetryHooks  # 🧮 Tracks the model call in flight
 
 TIMEOUT_SECONDS = 300  # ⏰ Timeout for operations in seconds
 
@@ -31,14 +34,8 @@ def build_input_items(project: str, path: str, instruction: str):
     return [as_user(steps)]
 
 
-def run_refactor_loop(conversation_id: str, input_items: list):
-    # 🌀 Runs a loop for refactoring until output condition is met
-    try:
-        asyncio.get_running_loop()  # 👀 Check for existing event loop
-    except RuntimeError:
-        loop = asyncio.new_event_loop()  # 🆕 Create a new event loop if none exists
-        asyncio.set_event_loop(loop)  # Set the new loop
-
+async def run_refactor_loop(conversation_id: str, input_items: list, progress: dict, hooks: TelemetryHooks):
+    # 🌀 Runs a loop for refactoring until output condition is met; `progress` counts finished turns and tokens
     draft = ""
     text_output = ""  # 📝 Initialize output string
     did_double_check = False
@@ -48,8 +45,11 @@ def run_refactor_loop(conversation_id: str, input_items: list):
     try:
         while not text_output.startswith("OUTPUT_RESULT"):  # 🔄 Continue until output condition
             with trace("file refactoring", group_id=conversation_id):  # 📊 Trace the operation
-                result = Runner.run_sync(AGENT_BLACKSOCKET, input_items)  # 🏃‍♂️ Run the agent synchronously
+                result = await Runner.run(A_TEAM["BLACKSOCKET"], input_items, hooks=hooks,
+                                          run_config=run_config())  # 🏃‍♂️ Run the agent
                 input_items = result.to_input_list()  # 🔄 Prepare for next iteration
+                progress["turns"] += 1
+                progress["tokens"] += sum(usage_of(result))
 
                 for new_item in result.new_items:  # 📦 Process each new output item
                     agent_name = new_item.agent.name
@@ -100,13 +100,25 @@ def refactor_op(refactor_file: RefactorFile):
     input_items = build_input_items(project, path, refactor_instruction)  # 🛠️ Prepare input items
 
     print(json.dumps(refactor_instruction, indent=4))
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:  # 👩‍💼 Manage worker thread
-        try:
-            future = executor.submit(run_refactor_loop, conversation_id, input_items)  # 🏃‍♂️ Start the refactor loop
-            return future.result(timeout=TIMEOUT_SECONDS)  # ⏳ Wait for result or timeout
-        except concurrent.futures.TimeoutError:
-            print(f"Refactoring operation timed out after {TIMEOUT_SECONDS} seconds.")  # ⏱️ Handle timeout
-            return "FAILED"  # 🚫 Return empty on timeout
-        except Exception:
-            print("Refactoring failed")
-            return "FAILED"
+    progress = {"turns": 0, "tokens": 0}
+    hooks = TelemetryHooks(OperationTelemetry())  # 👀 Knows whether a model call is open when the timeout hits
+    # 🏃‍♂️ Start the refactor loop on the shared operation loop, where it can be cancelled
+    future = asyncio.run_coroutine_threadsafe(run_refactor_loop(conversation_id, input_items, progress, hooks),
+                                              get_operation_loop())
+    try:
+        return future.result(timeout=TIMEOUT_SECONDS)  # ⏳ Wait for result or timeout
+    except concurrent.futures.TimeoutError:
+        in_flight = hooks.llm_in_flight  # 📸 Read before the cancellation unwinds the run
+        tools_in_flight = hooks.tools_in_flight()
+        future.cancel()  # 🛑 Abort the model call in flight instead of leaving it running in the background
+        increment_counter("operations_timeout")
+        if in_flight is not None or tools_in_flight:
+            increment_counter("abandoned_agent_turns")
+            increment_counter("abandoned_tool_calls", tools_in_flight)
+            increment_counter("abandoned_tokens", in_flight or 0)
+        print(f"Refactoring operation timed out after {TIMEOUT_SECONDS} seconds "
+              f"({progress['turns']} turns, {progress['tokens']} tokens spent).")  # ⏱️ Handle timeout
+        return "FAILED"  # 🚫 Return empty on timeout
+    except Exception:
+        print("Refactoring failed")
+        return "FAILED"
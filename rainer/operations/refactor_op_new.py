@@ -1,28 +1,43 @@
+import asyncio
 import json
 import uuid
 import logging
 from dataclasses import dataclass
+from typing import Optional
 
-from rainer import project_trees
 
 # Setting up logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-from gpt.the_a_team import AGENT_NEONRAIL, AGENT_BLACKSOCKET, AGENT_OVERDRIVE, \
-    AGENT_CASSETTEECHO
-from rainer.fileapi import unpack_file_ref
+from gpt.the_a_team import A_TEAM
+from rainer.fileapi import get_rainer_file_contents, unpack_file_ref
 from rainer.instructions import RefactorFile
 from rainer.operations.lib import AgentOperationSpec
+from rainer.operations.telemetry import OperationTelemetry
+from rainer.patching import PatchError, apply_patch, parse_patch
+from rainer.settings import RAINER_REFACTOR_OUTPUT
+
+OUTPUT_INSTRUCTIONS = {
+    "patch": "Output only the changes to the file, as SEARCH/REPLACE blocks",
+    "full": "Output the full updated code for the file",
+}
 
 
 # --- RefactorSpec Implementation ---
 
 @dataclass
 class RefactorSpec(AgentOperationSpec):
+    operation = "refactor"
     step: int = 1
+    # Supporting agents answer side by side on forks of the conversation instead of one after another
+    parallel_phases: bool = True
+    # "patch": the lead returns only the changed lines, and the full file only if they do not apply; or "full"
+    output_mode: str = RAINER_REFACTOR_OUTPUT
 
-    def __init__(self, **kwargs):
+    def __init__(self, *, parallel_phases: bool = True, output_mode: str = RAINER_REFACTOR_OUTPUT, **kwargs):
         super().__init__(**kwargs)
+        self.parallel_phases = parallel_phases
+        self.output_mode = output_mode
         logging.info("Initialized RefactorSpec with parameters")
 
     def init(self):
@@ -36,22 +51,25 @@ class RefactorSpec(AgentOperationSpec):
 
 IMPLEMENT only what is REQUIRED by REFACTOR INSTRUCTION, and NOTHING ELSE!
 DO NOT MAKE ASSUMPTIONS! USE project_file_lookup TOOL to find out how existing code works!
-NO TEST IMPLEMENTATIONS REQUIRED, ONLY DOUBLE-CHECKING""",
-
-            f"""PROJECT STRUCTURE: {json.dumps(project_trees.get(self.project, {}))}"""
+USE project_file_batch_lookup TOOL to read SEVERAL FILES AT ONCE!
+USE project_grep TOOL to find where names are defined or used!
+NO TEST IMPLEMENTATIONS REQUIRED, ONLY DOUBLE-CHECKING"""
         ])
+        self.add_project_tree("PROJECT STRUCTURE: ")
         logging.info("Initialized task for file refactoring in project: %s", self.project)
 
-    def loop(self) -> str:
+    async def loop(self) -> str:
         while not self.done_if():
             logging.info("Entering TURN %d | ASSESSMENT PHASE", self.step)
-            self.assess_phase()
+            await self.assess_phase()
 
             logging.info("Entering TURN %d | IMPLEMENT PHASE", self.step)
-            self.implement_phase()
+            await self.implement_phase()
 
             logging.info("Entering TURN %d | SUMMARY PHASE", self.step)
-            self.summary_phase()
+            await self.summary_phase()
+            if self.output_mode == "patch" and self.last_message.lstrip().startswith("TASK_PATCH"):
+                await self.apply_patch_output()
 
             self.step += 1
 
@@ -60,23 +78,21 @@ NO TEST IMPLEMENTATIONS REQUIRED, ONLY DOUBLE-CHECKING""",
     def done_if(self) -> bool:
         return (self.last_message or "").lstrip().startswith("TASK_OUTPUT")
 
-    def assess_phase(self):
+    async def assess_phase(self):
         self.add_as_user([
             f"PRAGMA OVERRIDE: All responses start with 'ROUND {self.step} ASSESSMENT'",
             f"{self.lead.name}, assess current TASK state."
         ])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
 
-        for agent in self.agents:
-            self.add_as_user([f"{agent.name}, offer new input, otherwise respond SKIP."])
-            self.run_with_agent(agent)
+        await self.ask_agents(lambda agent: f"{agent.name}, offer new input, otherwise respond SKIP.")
 
         self.add_as_user([f"""{self.lead.name}, generate atomic tasks for required agents for ROUND {self.step}. 
         Output only JSON array of objects representing tasks {{ 
             "agent": "AGENT_NAME", 
             "task": "?Exactly what needs to happen?"
         }}"""])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
 
         tasks_json = json.loads(self.last_message
                                 .strip()
@@ -85,29 +101,69 @@ NO TEST IMPLEMENTATIONS REQUIRED, ONLY DOUBLE-CHECKING""",
                                 ) or []
         print(json.dumps(tasks_json, indent=4))
 
-    def implement_phase(self):
+    async def implement_phase(self):
         self.add_as_user([f"PRAGMA OVERRIDE: All responses start with 'ROUND {self.step} IMPLEMENTATION'"])
+        await self.ask_agents(lambda agent: f"{agent.name}, IMPLEMENT your assigned instruction, output NOOP otherwise.")
+
+    async def ask_agents(self, prompt_for):
+        if self.parallel_phases:
+            await self.run_agents_concurrently([(agent, prompt_for(agent)) for agent in self.agents])
+            return
+
         for agent in self.agents:
-            self.add_as_user([f"{agent.name}, IMPLEMENT your assigned instruction, output NOOP otherwise."])
-            self.run_with_agent(agent)
+            self.add_as_user([prompt_for(agent)])
+            await self.run_with_agent(agent)
 
-    def summary_phase(self):
+    async def summary_phase(self):
         self.add_as_user([f"{self.lead.name}, can you compile a SUMMARY of the changes implemented so far?."])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
 
         self.add_as_user([
-            f"""{self.lead.name}, if the current changes satisfy REFACTOR INSTRUCTION,
-> OUTPUT FULL, UPDATED CONTENTS FOR REFACTOR FILE AS PLAINTEXT, NO MARKDOWN ANNOTATIONS
-> OUTPUT SHOULD BEGIN WITH 'TASK_OUTPUT'""",
+            self.patch_request() if self.output_mode == "patch" else self.full_output_request(),
             "IF there is more work to be done, output only MOVE_ONE",
             "IF the task has failed for whatever reason, output only FAILED {reason}"
         ])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
+
+    def full_output_request(self) -> str:
+        return f"""{self.lead.name}, if the current changes satisfy REFACTOR INSTRUCTION,
+> OUTPUT FULL, UPDATED CONTENTS FOR REFACTOR FILE AS PLAINTEXT, NO MARKDOWN ANNOTATIONS
+> OUTPUT SHOULD BEGIN WITH 'TASK_OUTPUT'"""
+
+    def patch_request(self) -> str:
+        return f"""{self.lead.name}, if the current changes satisfy REFACTOR INSTRUCTION,
+> OUTPUT ONLY THE CHANGES TO REFACTOR FILE AS SEARCH/REPLACE BLOCKS, NO MARKDOWN ANNOTATIONS:
+<<<<<<< SEARCH
+exact, current lines of REFACTOR FILE
+=======
+the lines that replace them
+>>>>>>> REPLACE
+> EACH SEARCH MUST COPY ENOUGH LINES TO MATCH ONE PLACE IN THE FILE; A UNIFIED DIFF IS ALSO ACCEPTED
+> OUTPUT SHOULD BEGIN WITH 'TASK_PATCH'"""
+
+    async def apply_patch_output(self):
+        """Turn the lead's TASK_PATCH into the TASK_OUTPUT of the patched file, or ask for the full file instead."""
+        patch = self.last_message.lstrip().removeprefix("TASK_PATCH")
+        original = await asyncio.to_thread(get_rainer_file_contents, self.project, self.path)
+        try:
+            updated, fuzzy = apply_patch(original, patch, self.path)
+        except PatchError as e:
+            logging.info("Patch for %s did not apply: %s", self.path, e)
+            self.emit("patch_failed", step=self.step, error=str(e))
+            self.add_as_user([f"""{self.lead.name}, your changes could not be applied: {e}
+> OUTPUT FULL, UPDATED CONTENTS FOR REFACTOR FILE AS PLAINTEXT, NO MARKDOWN ANNOTATIONS
+> OUTPUT SHOULD BEGIN WITH 'TASK_OUTPUT'"""])
+            await self.run_with_agent(self.lead)
+            return
+
+        self.emit("patch_applied", step=self.step, hunks=len(parse_patch(patch)), fuzzy_hunks=fuzzy)
+        self.last_message = f"TASK_OUTPUT\n{updated}"
 
 
 # --- Runtime Entry Point ---
 
-def execute(refactor_file: RefactorFile):
+def make_spec(refactor_file: RefactorFile, event_stream: str = "", telemetry: Optional[OperationTelemetry] = None,
+              output_mode: str = RAINER_REFACTOR_OUTPUT) -> RefactorSpec:
     conversation_id = uuid.uuid4().hex[:16]
     project, path = unpack_file_ref(refactor_file)
     refactor_instruction = refactor_file.get("content", "") if isinstance(refactor_file,
@@ -118,9 +174,16 @@ def execute(refactor_file: RefactorFile):
         project=project,
         path=path,
         instruction=refactor_instruction,
-        output_instruction="Output the full updated code for the file",
-        agents=[AGENT_BLACKSOCKET, AGENT_NEONRAIL, AGENT_CASSETTEECHO],
-        lead=AGENT_OVERDRIVE,
-        trace=f"REFACTOR : {project} | {path}"
-    ).run()
+        output_instruction=OUTPUT_INSTRUCTIONS[output_mode],
+        agents=[A_TEAM["BLACKSOCKET"], A_TEAM["NEONRAIL"], A_TEAM["CASSETTEECHO"]],
+        lead=A_TEAM["OVERDRIVE"],
+        trace=f"REFACTOR : {project} | {path}",
+        event_stream=event_stream,
+        telemetry=telemetry,
+        output_mode=output_mode
+    )
+
+
+def execute(refactor_file: RefactorFile, event_stream: str = "", telemetry: Optional[OperationTelemetry] = None):
+    return make_spec(refactor_file, event_stream, telemetry).run()
 
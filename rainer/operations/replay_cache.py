@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# off: no caching. record: always call the model and store the response.
+# replay: serve stored responses, calling (and recording) the model on a miss.
+# strict: serve stored responses only; a miss is an error (for CI runs that must not reach the API).
+REPLAY_MODES = ("off", "record", "replay", "strict")
+
+# Eviction brings the directory down to this share of `max_bytes`, so the next scan is many writes away
+EVICT_TO_SHARE = 0.9
+
+
+class ReplayMiss(RuntimeError):
+    pass
+
+
+def describe_agent(agent) -> Dict:
+    """Everything about an agent that changes what the model is asked, in a JSON-stable form."""
+    instructions = agent.instructions
+    if callable(instructions):
+        instructions = f"{instructions.__module__}.{instructions.__qualname__}"
+
+    return {
+        "model": str(agent.model or ""),
+        "model_settings": repr(getattr(agent, "model_settings", None)),
+        "instructions": instructions or "",
+        "tools": [
+            [tool.name, getattr(tool, "description", ""), getattr(tool, "params_json_schema", {})]
+            for tool in agent.tools
+        ],
+        "handoffs": [getattr(handoff, "name", str(handoff)) for handoff in getattr(agent, "handoffs", [])],
+    }
+
+
+class ReplayCache:
+    """
+    On-disk cache of agent turns: the conversation items and messages one `Runner.run` added,
+    keyed by a hash of the model, instructions, tools and the input conversation.
+
+    One JSON file per entry. Entries older than `ttl_seconds` are ignored, and the least
+    recently used ones are evicted once the directory grows past `max_bytes`. The directory is
+    only listed then: between scans, its size is tracked from what this process writes.
+    """
+
+    def __init__(self, directory: str, mode: str = "off", ttl_seconds: int = 0, max_bytes: int = 0):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode {mode!r}, expected one of {', '.join(REPLAY_MODES)}")
+        self.directory = directory
+        self.mode = mode if directory else "off"
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes: Optional[int] = None  # Directory size at the last scan plus what was written since
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def key(self, agent, conversation: List[dict]) -> str:
+        payload = json.dumps([describe_agent(agent), conversation], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The stored turn for `key` when the mode allows replaying it; raises ReplayMiss in strict mode."""
+        entry = self._read(key) if self.mode in ("replay", "strict") else None
+        if entry is None:
+            self.misses += 1
+            if self.mode == "strict":
+                raise ReplayMiss(f"No recorded model response for {key} (RAINER_REPLAY_MODE=strict)")
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, items: List[dict], messages: List[str]) -> None:
+        if self.mode not in ("record", "replay"):
+            return
+
+        try:
+            data = json.dumps({"created": time.time(), "items": items, "messages": messages})
+        except (TypeError, ValueError):
+            return  # Not JSON-safe; this turn is simply not cached
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        written = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self._grow(written - replaced)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get("created", 0) > self.ttl_seconds:
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return entry
+
+    def _grow(self, size: int) -> None:
+        """Account for `size` more bytes on disk, evicting once the directory may have passed `max_bytes`."""
+        if not self.max_bytes:
+            return
+
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+                if self._bytes <= self.max_bytes:
+                    return
+            # First write of this process, or over the limit: list the directory, which also
+            # picks up what other processes wrote meanwhile
+            self._bytes = self._evict()
+
+    def _evict(self) -> int:
+        """Remove the least recently used entries while the directory is over its limit; returns its new size."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO_SHARE:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
@@ -0,0 +1,79 @@
+from typing import AsyncIterator, Optional
+
+from agents import ModelProvider, ModelResponse
+from agents.models.interface import Model
+
+from rainer.resilience import call_with_retries, hedged
+
+
+class ResilientModel(Model):
+    """
+    Retries failed calls of the wrapped model when the error is worth it, and hedges slow ones.
+    A stream is only retried or hedged until its first event; after that, events have been passed on.
+    """
+
+    def __init__(self, model: Model, name: str):
+        self.model = model
+        self.name = name
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        return await call_with_retries(self.name, lambda: hedged(
+            self.name, lambda: self.model.get_response(*args, **kwargs)))
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator:
+        stream, first = await call_with_retries(self.name, lambda: hedged(
+            self.name, lambda: self.open_stream(*args, **kwargs), self.close_stream))
+        if stream is None:
+            return
+
+        try:
+            yield first
+            async for event in stream:
+                yield event
+        finally:
+            await stream.aclose()
+
+    async def open_stream(self, *args, **kwargs):
+        """The wrapped model's stream and its first event, or (None, None) for an empty stream."""
+        stream = self.model.stream_response(*args, **kwargs)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return None, None
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    @staticmethod
+    async def close_stream(opened) -> None:
+        """Close a stream from `open_stream` that lost the hedge."""
+        stream, _ = opened
+        if stream is not None:
+            await stream.aclose()
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self) -> None:
+        await self.model.close()
+
+    async def _cleanup_on_run_end(self, owner: object) -> None:
+        await self.model._cleanup_on_run_end(owner)
+
+
+class ResilientModelProvider(ModelProvider):
+    """Hands out the wrapped provider's models with retries and hedging."""
+
+    def __init__(self, provider: ModelProvider):
+        self.provider = provider
+
+    @property
+    def simulated(self) -> bool:
+        return getattr(self.provider, "simulated", False)
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        model = self.provider.get_model(model_name)
+        return ResilientModel(model, getattr(model, "name", None) or model_name or "default")
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
@@ -0,0 +1,104 @@
+import math
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from agents import RunHooks
+
+from rainer.operations.rate_limited_model import estimate_input_tokens
+
+
+@dataclass
+class OperationTelemetry:
+    """Timings and token counts gathered while one agent operation runs."""
+    operation: str = ""
+    llm_model: str = ""
+    success: bool = False
+    wall_seconds: float = 0.0
+    iterations: int = 0
+    agent_turns: List[Dict] = field(default_factory=list)
+    tool_calls: Dict[str, Dict] = field(default_factory=dict)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    tokens_saved: int = 0
+    # "timeout" or "cancelled" when the operation was stopped before it finished
+    stop_reason: str = ""
+    # Work in flight when it was stopped: turns and tool calls cut short, and the tokens their model calls used
+    abandoned_turns: int = 0
+    abandoned_tool_calls: int = 0
+    abandoned_tokens: int = 0
+
+    def add_agent_turn(self, step: int, agent: str, seconds: float, input_tokens: int, output_tokens: int,
+                       replayed: bool = False, abandoned: bool = False) -> None:
+        self.agent_turns.append({
+            "step": step,
+            "agent": agent,
+            "seconds": round(seconds, 3),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "replayed": replayed,
+            "abandoned": abandoned,
+        })
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        if abandoned:
+            self.abandoned_turns += 1
+            self.abandoned_tokens += input_tokens + output_tokens
+
+    def add_tool_call(self, tool: str, seconds: float) -> None:
+        stats = self.tool_calls.setdefault(tool, {"count": 0, "seconds": 0.0})
+        stats["count"] += 1
+        stats["seconds"] = round(stats["seconds"] + seconds, 3)
+
+    def to_fields(self) -> Dict:
+        return asdict(self)
+
+
+class TelemetryHooks(RunHooks):
+    """
+    Run hooks timing every tool call of a `Runner.run` into an OperationTelemetry. They also count
+    the tokens of each model call as it returns, so a run that is cut short still reports what it used,
+    and keep the estimated input of the call in flight, which a cut-short run has sent but not heard back on.
+    """
+
+    def __init__(self, telemetry: OperationTelemetry):
+        self.telemetry = telemetry
+        # Start times per (agent, tool); the SDK reports no call id, so same-named calls pair up in order
+        self._started: Dict[Tuple[str, str], Deque[float]] = defaultdict(deque)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Estimated input tokens of the model call in flight; None between calls
+        self.llm_in_flight: Optional[int] = None
+
+    def tools_in_flight(self) -> int:
+        return sum(len(started) for started in self._started.values())
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self.llm_in_flight = estimate_input_tokens(system_prompt, input_items)
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        self.llm_in_flight = None
+        usage = getattr(response, "usage", None)
+        self.input_tokens += getattr(usage, "input_tokens", 0) or 0
+        self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._started[(agent.name, tool.name)].append(time.perf_counter())
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        started = self._started[(agent.name, tool.name)]
+        if started:
+            self.telemetry.add_tool_call(tool.name, time.perf_counter() - started.popleft())
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile, e.g. share=0.95 for p95; 0 for no values."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def spread(values: List[float]) -> Dict[str, float]:
+    return {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
@@ -0,0 +1,206 @@
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+# Lowest similarity (0..1) at which a hunk that matches nowhere exactly is still applied to the closest lines
+FUZZY_THRESHOLD = 0.9
+
+SEARCH_MARKER = re.compile(r"^\s*<{5,}\s*SEARCH\s*$")
+DIVIDER = re.compile(r"^\s*={5,}\s*$")
+REPLACE_MARKER = re.compile(r"^\s*>{5,}\s*REPLACE\s*$")
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+class PatchError(ValueError):
+    pass
+
+
+@dataclass
+class Hunk:
+    search: List[str] = field(default_factory=list)
+    replace: List[str] = field(default_factory=list)
+    line_hint: Optional[int] = None  # 0-based line the hunk expects to start at, from a unified diff header
+
+
+def parse_search_replace(text: str) -> List[Hunk]:
+    """
+    Blocks of
+        <<<<<<< SEARCH
+        lines to find
+        =======
+        lines to put in their place
+        >>>>>>> REPLACE
+    Anything outside the blocks (prose, code fences) is ignored.
+    """
+    hunks, hunk, section = [], None, None
+    for line in text.split("\n"):
+        if SEARCH_MARKER.match(line):
+            hunk, section = Hunk(), "search"
+        elif hunk is not None and section == "search" and DIVIDER.match(line):
+            section = "replace"
+        elif hunk is not None and section == "replace" and REPLACE_MARKER.match(line):
+            hunks.append(hunk)
+            hunk, section = None, None
+        elif hunk is not None:
+            getattr(hunk, section).append(line)
+
+    if hunk is not None:
+        raise PatchError("Unterminated SEARCH/REPLACE block")
+    return hunks
+
+
+def parse_unified_diff(text: str) -> List[Hunk]:
+    hunks, hunk = [], None
+    for line in text.split("\n"):
+        header = HUNK_HEADER.match(line)
+        if header:
+            hunk = Hunk(line_hint=max(0, int(header.group(1)) - 1))
+            hunks.append(hunk)
+        elif hunk is None or line.startswith(("--- ", "+++ ", "diff ", "index ", "\\")):
+            continue
+        elif line.startswith("+"):
+            hunk.replace.append(line[1:])
+        elif line.startswith("-"):
+            hunk.search.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            # Models often drop the leading space of blank context lines
+            hunk.search.append(line[1:])
+            hunk.replace.append(line[1:])
+        else:
+            hunk = None  # Prose after the diff
+
+    # A trailing blank "context" line is usually just the end of the message
+    for hunk in hunks:
+        while hunk.search and hunk.replace and hunk.search[-1] == hunk.replace[-1] == "":
+            hunk.search.pop()
+            hunk.replace.pop()
+    return hunks
+
+
+def parse_patch(text: str) -> List[Hunk]:
+    if any(SEARCH_MARKER.match(line) for line in text.split("\n")):
+        hunks = parse_search_replace(text)
+    elif any(HUNK_HEADER.match(line) for line in text.split("\n")):
+        hunks = parse_unified_diff(text)
+    else:
+        hunks = []
+
+    if not hunks:
+        raise PatchError("No SEARCH/REPLACE blocks or unified diff hunks found")
+    return hunks
+
+
+def squash(line: str) -> str:
+    """The line with all runs of whitespace collapsed and none at the ends."""
+    return " ".join(line.split())
+
+
+def indent_of(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def reindent(lines: List[str], found: List[str], search: List[str]) -> List[str]:
+    """Shift `lines` by the indentation difference between the file's lines and the hunk's."""
+    pairs = [(f, s) for f, s in zip(found, search) if f.strip() and s.strip()]
+    if not pairs:
+        return lines
+    file_indent, hunk_indent = indent_of(pairs[0][0]), indent_of(pairs[0][1])
+    if file_indent == hunk_indent:
+        return lines
+
+    shifted = []
+    for line in lines:
+        if line.strip() and line.startswith(hunk_indent):
+            line = file_indent + line[len(hunk_indent):]
+        shifted.append(line)
+    return shifted
+
+
+def closest(candidates: List[int], hint: Optional[int], what: str) -> int:
+    if len(candidates) == 1:
+        return candidates[0]
+    if hint is None:
+        raise PatchError(f"{what} matches {len(candidates)} places in the file; include more surrounding lines")
+    return min(candidates, key=lambda start: abs(start - hint))
+
+
+def locate(lines: List[str], hunk: Hunk) -> Tuple[int, int, List[str], bool]:
+    """(start, end, replacement, fuzzy) for one hunk, trying ever looser ways of matching its search lines."""
+    search, n = hunk.search, len(hunk.search)
+    preview = (next((line.strip() for line in search if line.strip()), "") or "<blank>")[:60]
+    what = f"Hunk starting with {preview!r}"
+
+    if not search:
+        if not any(line.strip() for line in lines):
+            return 0, len(lines), hunk.replace, False
+        if hunk.line_hint is not None:
+            at = min(hunk.line_hint, len(lines))
+            return at, at, hunk.replace, False
+        raise PatchError("A SEARCH block is empty; include the lines to replace")
+
+    normalizers: List[Callable[[str], str]] = [lambda line: line, str.rstrip, str.strip, squash]
+    for normalize in normalizers:
+        wanted = [normalize(line) for line in search]
+        normalized = [normalize(line) for line in lines]
+        candidates = [i for i in range(len(lines) - n + 1) if normalized[i:i + n] == wanted]
+        if candidates:
+            start = closest(candidates, hunk.line_hint, what)
+            return start, start + n, reindent(hunk.replace, lines[start:start + n], search), False
+
+    # Fuzzy: the window of the same length whose squashed text is most similar
+    wanted_text = "\n".join(squash(line) for line in search)
+    squashed = [squash(line) for line in lines]
+    scored = []
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(wanted_text)
+    for i in range(len(lines) - n + 1):
+        matcher.set_seq1("\n".join(squashed[i:i + n]))
+        if matcher.real_quick_ratio() >= FUZZY_THRESHOLD and matcher.quick_ratio() >= FUZZY_THRESHOLD:
+            ratio = matcher.ratio()
+            if ratio >= FUZZY_THRESHOLD:
+                scored.append((ratio, i))
+    if not scored:
+        raise PatchError(f"{what} does not match the file")
+
+    best = max(ratio for ratio, _ in scored)
+    start = closest([i for ratio, i in scored if ratio >= best - 0.01], hunk.line_hint, what)
+    return start, start + n, reindent(hunk.replace, lines[start:start + n], search), True
+
+
+def check_syntax(path: str, original: str, updated: str) -> None:
+    """Python files that compiled before the patch must still compile after it."""
+    if not path.endswith(".py"):
+        return
+    try:
+        compile(original, path, "exec")
+    except (SyntaxError, ValueError):
+        return
+    try:
+        compile(updated, path, "exec")
+    except (SyntaxError, ValueError) as e:
+        raise PatchError(f"Patched file no longer compiles: {e}")
+
+
+def apply_patch(original: str, patch: str, path: str = "") -> Tuple[str, int]:
+    """
+    Apply SEARCH/REPLACE blocks or a unified diff to `original`, hunk by hunk in order.
+    Returns the patched text and how many hunks only matched fuzzily; raises PatchError
+    when a hunk cannot be placed unambiguously or the result no longer compiles.
+    """
+    newline = "\r\n" if "\r\n" in original else "\n"
+    lines = original.replace("\r\n", "\n").split("\n")
+    fuzzy = 0
+    offset = 0  # Lines added so far, to keep later unified diff line hints accurate
+
+    for hunk in parse_patch(patch):
+        if hunk.line_hint is not None:
+            hunk.line_hint += offset
+        start, end, replacement, was_fuzzy = locate(lines, hunk)
+        lines[start:end] = replacement
+        offset += len(replacement) - (end - start)
+        fuzzy += was_fuzzy
+
+    updated = newline.join(lines)
+    check_syntax(path, original, updated)
+    return updated, fuzzy
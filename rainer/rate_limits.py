@@ -0,0 +1,292 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import increment_counter_later, set_gauge_later
+from .settings import RAINER_RATE_LIMITS, RAINER_RATE_LIMIT_DEFAULT, RAINER_RATE_LIMIT_BACKEND
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Highest priority first: a batch call only goes ahead while no interactive call waits for the same model
+LANES = (INTERACTIVE, BATCH)
+
+# How often a queued call checks whether it is its turn; the head of a queue sleeps until the buckets refill
+QUEUE_POLL_SECONDS = 0.05
+
+# Pause after a 429 that says nothing about when to retry
+RATE_LIMITED_PAUSE_SECONDS = 5.0
+
+# Lane of the model calls made in this context; agent operations set it from their `lane`
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("current_lane", default=INTERACTIVE)
+
+Limits = Tuple[int, int]  # Requests and tokens per minute; 0 for no limit
+
+
+class TokenBucket:
+    """`capacity` units that refill evenly over a minute; 0 capacity never runs out."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+            self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` units are available, after refilling."""
+        if not self.capacity:
+            self.level = 0.0  # Keeps an unlimited bucket from drifting as calls are taken from it
+            return 0.0
+        # A call bigger than the whole bucket goes ahead once the bucket is full
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+
+class MemoryRateLimits:
+    """Token buckets of this process, one pair (requests, tokens) per model."""
+    blocking = False  # Safe to call on the event loop
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, model: str, limits: Limits, tokens: int) -> float:
+        """Take one request and `tokens` tokens and return 0, or return the seconds to wait before trying again."""
+        now = time.monotonic()
+        with self._lock:
+            paused = self._paused_until.get(model, 0) - now
+            if paused > 0:
+                return paused
+
+            requests_bucket, tokens_bucket = self._buckets_for(model, limits)
+            requests_bucket.refill(now)
+            tokens_bucket.refill(now)
+            wait = max(requests_bucket.wait_for(1), tokens_bucket.wait_for(tokens))
+            if wait == 0:
+                requests_bucket.level -= 1
+                tokens_bucket.level -= tokens
+            return wait
+
+    def refund(self, model: str, tokens: int) -> None:
+        """Return reserved tokens the call did not use; negative to charge for more than was reserved."""
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets and buckets[1].capacity:
+                buckets[1].level = min(buckets[1].capacity, buckets[1].level + tokens)
+
+    def pause(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._paused_until[model] = max(self._paused_until.get(model, 0), time.monotonic() + seconds)
+
+    def _buckets_for(self, model: str, limits: Limits) -> Tuple[TokenBucket, TokenBucket]:
+        buckets = self._buckets.get(model)
+        if buckets is None or (buckets[0].capacity, buckets[1].capacity) != limits:
+            buckets = self._buckets[model] = (TokenBucket(limits[0]), TokenBucket(limits[1]))
+        return buckets
+
+
+# Same buckets as MemoryRateLimits, updated atomically in one Redis hash per model
+RESERVE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated', 'paused_until')
+local now, rpm, tpm, amount = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local paused_until = tonumber(state[4]) or 0
+if paused_until > now then return tostring(paused_until - now) end
+
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+local tokens = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+local wait = 0
+if rpm > 0 and requests < 1 then wait = math.max(wait, (1 - requests) * 60 / rpm) end
+if tpm > 0 and tokens < math.min(amount, tpm) then wait = math.max(wait, (math.min(amount, tpm) - tokens) * 60 / tpm) end
+if wait == 0 then
+    if rpm > 0 then requests = requests - 1 end
+    if tpm > 0 then tokens = tokens - amount end
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+class RedisRateLimits:
+    """Token buckets in Redis, shared by every process that calls the same models with the same API key."""
+    blocking = True  # Every call is a round trip to Redis, so async callers make it from a worker thread
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._reserve = self._redis.register_script(RESERVE_SCRIPT)
+
+    @staticmethod
+    def key(model: str) -> str:
+        return f"rainer:ratelimit:{model}"
+
+    def reserve(self, model: str, limits: Limits, tokens: int) -> float:
+        return float(self._reserve(keys=[self.key(model)], args=[time.time(), limits[0], limits[1], tokens]))
+
+    def refund(self, model: str, tokens: int) -> None:
+        self._redis.hincrbyfloat(self.key(model), "tokens", tokens)
+
+    def pause(self, model: str, seconds: float) -> None:
+        pipeline = self._redis.pipeline()
+        pipeline.hset(self.key(model), "paused_until", time.time() + seconds)
+        pipeline.expire(self.key(model), 120)
+        pipeline.execute()
+
+
+class RateLimitScheduler:
+    """
+    Gates every model call on per-model request and token buckets, so bursts queue here instead of
+    turning into 429s. Waiting calls are served in order per lane, interactive before batch.
+    """
+
+    def __init__(self, backend, limits: Dict[str, Limits], default: Limits):
+        self.backend = backend
+        self.limits = limits
+        self.default = default
+        self._queues: Dict[str, Dict[str, Deque[object]]] = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, model: str) -> Limits:
+        return self.limits.get(model, self.default)
+
+    async def acquire(self, model: str, tokens: int, lane: Optional[str] = None) -> None:
+        """Wait, without blocking the event loop, until the call may be made."""
+        lane = lane or current_lane.get()
+        wait = await self._off_loop(self._try_first, model, tokens)
+        if not wait:
+            return
+
+        ticket = self._enqueue(model, lane)
+        started = time.perf_counter()
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = await self._off_loop(self._attempt, model, lane, ticket, tokens)
+        finally:
+            self._dequeue(model, lane, ticket)
+            self._count_wait(lane, time.perf_counter() - started)
+
+    def acquire_sync(self, model: str, tokens: int, lane: Optional[str] = None) -> None:
+        """`acquire` for synchronous callers, blocking the calling thread."""
+        lane = lane or current_lane.get()
+        wait = self._try_first(model, tokens)
+        if not wait:
+            return
+
+        ticket = self._enqueue(model, lane)
+        started = time.perf_counter()
+        try:
+            while wait:
+                time.sleep(wait)
+                wait = self._attempt(model, lane, ticket, tokens)
+        finally:
+            self._dequeue(model, lane, ticket)
+            self._count_wait(lane, time.perf_counter() - started)
+
+    async def settle(self, model: str, reserved: int, used: int) -> None:
+        """Correct the token bucket once the call reports what it actually used."""
+        await self._off_loop(self.settle_sync, model, reserved, used)
+
+    def settle_sync(self, model: str, reserved: int, used: int) -> None:
+        if used and used != reserved:
+            self.backend.refund(model, reserved - used)
+
+    async def pause(self, model: str, seconds: Optional[float] = None) -> None:
+        """Hold back every call to `model`, e.g. after a 429, instead of letting them all retry at once."""
+        await self._off_loop(self.pause_sync, model, seconds)
+
+    def pause_sync(self, model: str, seconds: Optional[float] = None) -> None:
+        self.backend.pause(model, seconds or RATE_LIMITED_PAUSE_SECONDS)
+        increment_counter_later(f"rate_limit_pauses.{model}")
+
+    def queue_depth(self, model: str, lane: str) -> int:
+        with self._lock:
+            return len(self._queues.get(model, {}).get(lane, ()))
+
+    def waiting(self, model: str) -> int:
+        """Calls to `model` queued in any lane."""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.get(model, {}).values())
+
+    async def _off_loop(self, method, *args):
+        """`method(*args)`, in a worker thread when the backend would block the event loop."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def _try_first(self, model: str, tokens: int) -> float:
+        """Reserve right away when nobody is queued for the model; otherwise the seconds until the next attempt."""
+        with self._lock:
+            if any(self._queues.get(model, {}).values()):
+                return QUEUE_POLL_SECONDS
+        return self.backend.reserve(model, self.limits_for(model), tokens)
+
+    def _attempt(self, model: str, lane: str, ticket: object, tokens: int) -> float:
+        with self._lock:
+            queues = self._queues[model]
+            higher = LANES[:LANES.index(lane)]
+            if queues[lane][0] is not ticket or any(queues[other] for other in higher):
+                return QUEUE_POLL_SECONDS
+        # Only the head of the queue gets here, so no one in this process can reserve in between
+        # Capped, so the head notices sooner when another process refunds tokens or a pause is lifted
+        return min(self.backend.reserve(model, self.limits_for(model), tokens), 1.0)
+
+    def _enqueue(self, model: str, lane: str) -> object:
+        ticket = object()
+        with self._lock:
+            queue = self._queues.setdefault(model, {name: deque() for name in LANES})[lane]
+            queue.append(ticket)
+            depth = len(queue)
+        set_gauge_later(f"rate_limit_queue_depth.{model}.{lane}", depth)
+        return ticket
+
+    def _dequeue(self, model: str, lane: str, ticket: object) -> None:
+        with self._lock:
+            queue = self._queues[model][lane]
+            if ticket in queue:
+                queue.remove(ticket)
+            depth = len(queue)
+        set_gauge_later(f"rate_limit_queue_depth.{model}.{lane}", depth)
+
+    @staticmethod
+    def _count_wait(lane: str, seconds: float) -> None:
+        increment_counter_later(f"rate_limit_waits.{lane}")
+        increment_counter_later(f"rate_limit_wait_seconds.{lane}", round(seconds, 3))
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """The process-wide scheduler, on Redis (the Celery broker) when RAINER_RATE_LIMIT_BACKEND=redis."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if RAINER_RATE_LIMIT_BACKEND == "redis":
+                from django.conf import settings
+                backend = RedisRateLimits(settings.CELERY_BROKER_URL)
+            elif RAINER_RATE_LIMIT_BACKEND == "memory":
+                backend = MemoryRateLimits()
+            else:
+                raise ValueError(f"Unknown RAINER_RATE_LIMIT_BACKEND {RAINER_RATE_LIMIT_BACKEND!r}, "
+                                 f"expected memory or redis")
+            _scheduler = RateLimitScheduler(backend, RAINER_RATE_LIMITS, RAINER_RATE_LIMIT_DEFAULT)
+        return _scheduler
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked to wait in a 429's Retry-After header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import openai
+
+from .metrics import increment_counter_later, set_gauge_later
+from .rate_limits import get_scheduler, retry_after
+from .settings import RAINER_MODEL_RETRIES, RAINER_RETRY_BASE_SECONDS, RAINER_RETRY_MAX_SECONDS, \
+    RAINER_HEDGE_REQUESTS, RAINER_HEDGE_MIN_SAMPLES
+
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+# Latencies kept per model to compute its hedge delay
+LATENCY_SAMPLES = 200
+
+T = TypeVar("T")
+
+
+def classify(error: BaseException) -> str:
+    """Whether a failed model call is worth retrying, and why."""
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(error, (openai.APITimeoutError, TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, (openai.APIConnectionError, ConnectionError)):
+        return TRANSIENT
+    if isinstance(error, openai.APIStatusError):
+        return TRANSIENT if error.status_code in (408, 409) or error.status_code >= 500 else FATAL
+    return FATAL  # Bad requests, auth errors and bugs fail the same way every time
+
+
+def backoff_seconds(attempt: int, error: BaseException) -> float:
+    """Full jitter: anywhere up to the exponential backoff, so retrying callers spread out; never before Retry-After."""
+    ceiling = min(RAINER_RETRY_MAX_SECONDS, RAINER_RETRY_BASE_SECONDS * 2 ** attempt)
+    return max(random.uniform(0, ceiling), retry_after(error) or 0)
+
+
+def should_retry(model: str, attempt: int, error: BaseException) -> Optional[float]:
+    """Seconds to wait before retrying `error`, or None when it should be raised, counting either way."""
+    kind = classify(error)
+    if kind == FATAL:
+        increment_counter_later(f"model_errors.{FATAL}")
+        return None
+    if attempt >= RAINER_MODEL_RETRIES:
+        increment_counter_later("model_retries_exhausted")
+        return None
+
+    delay = backoff_seconds(attempt, error)
+    increment_counter_later(f"model_retries.{kind}")
+    print(f"🔁 {model} call failed ({kind}: {error}); retry {attempt + 1}/{RAINER_MODEL_RETRIES} in {delay:.1f}s")
+    return delay
+
+
+async def call_with_retries(model: str, make_call: Callable[[], Awaitable[T]]) -> T:
+    attempt = 0
+    while True:
+        try:
+            return await make_call()
+        except Exception as e:
+            delay = should_retry(model, attempt, e)
+            if delay is None:
+                raise
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def call_with_retries_sync(model: str, make_call: Callable[[], T]) -> T:
+    attempt = 0
+    while True:
+        try:
+            return make_call()
+        except Exception as e:
+            delay = should_retry(model, attempt, e)
+            if delay is None:
+                raise
+        attempt += 1
+        time.sleep(delay)
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model; their p95 is how long a call may take before it is hedged."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=size))
+        self._delays: Dict[str, float] = {}  # p95 per model, recomputed after new samples
+        self._published: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[model].append(seconds)
+            self._delays.pop(model, None)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        from .operations.telemetry import percentile
+
+        with self._lock:
+            delay = self._delays.get(model)
+            if delay is None:
+                samples = self._samples.get(model, ())
+                if len(samples) < RAINER_HEDGE_MIN_SAMPLES:
+                    return None
+                delay = self._delays[model] = percentile(list(samples), 0.95)
+
+            gauge = round(delay, 3)
+            if self._published.get(model) == gauge:
+                return delay
+            self._published[model] = gauge
+        set_gauge_later(f"model_hedge_delay_seconds.{model}", gauge)
+        return delay
+
+
+latencies = LatencyTracker()
+
+
+async def hedged(model: str, make_call: Callable[[], Awaitable[T]],
+                 discard: Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+    """
+    `make_call()`, and with RAINER_HEDGE_REQUESTS once more if it has not answered after the model's
+    p95 latency; the first success wins and the other call is cancelled. Not while calls to the
+    model queue for the rate limits: a duplicate would only queue behind them.
+    When both calls succeed at once, the result not returned is passed to `discard`, e.g. to close it.
+    """
+    delay = latencies.hedge_delay(model) if RAINER_HEDGE_REQUESTS else None
+
+    starts = [time.perf_counter()]
+    calls = [asyncio.ensure_future(make_call())]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(calls, timeout=delay)
+            if not done and not get_scheduler().waiting(model):
+                increment_counter_later("model_hedges")
+                starts.append(time.perf_counter())
+                calls.append(asyncio.ensure_future(make_call()))
+
+        pending, error = set(calls), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = []
+            for call in calls:
+                if call not in done:
+                    continue
+                if call.exception() is not None:
+                    error = error or call.exception()
+                else:
+                    succeeded.append(call)
+            if not succeeded:
+                continue
+
+            # Both calls can answer in the same round; the one not returned may hold e.g. an open stream
+            winner = succeeded[0]
+            if discard is not None:
+                for call in succeeded[1:]:
+                    await discard(call.result())
+
+            index = calls.index(winner)
+            latencies.add(model, time.perf_counter() - starts[index])
+            if index:
+                increment_counter_later("model_hedge_wins")
+            return winner.result()
+        raise error
+    finally:
+        for call in calls:
+            if not call.done():
+                call.cancel()
@@ -0,0 +1,166 @@
+import os
+import threading
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+FileStat = Tuple[int, int]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Case-folded trigrams of `text`; matching is verified against the real lines afterwards."""
+    folded = text.lower()
+    return set(map("".join, zip(folded, folded[1:], folded[2:])))
+
+
+def read_text(abs_path: str, max_bytes: int) -> Optional[str]:
+    """Contents of a UTF-8 text file no larger than `max_bytes`, or None if it should not be indexed."""
+    try:
+        if os.path.getsize(abs_path) > max_bytes:
+            return None
+        with open(abs_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if b"\0" in data:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def match_lines(text: str, query: str, case_sensitive: bool, context: int) -> Iterator[Dict]:
+    lines = text.splitlines()
+    needle = query if case_sensitive else query.lower()
+
+    for number, line in enumerate(lines):
+        if needle in (line if case_sensitive else line.lower()):
+            yield {
+                "line": number + 1,
+                "text": line,
+                "before": lines[max(number - context, 0):number],
+                "after": lines[number + 1:number + 1 + context],
+            }
+
+
+class TrigramIndex:
+    """
+    Trigram -> file id postings over one project's text files, used to narrow a literal
+    search down to the few files that can contain it before their lines are scanned.
+
+    Postings are append-only arrays. Re-indexing or removing a file only retires its id;
+    retired ids are filtered out at query time, and `needs_compaction` tells the background
+    indexer when to rebuild from scratch.
+    """
+
+    def __init__(self, project: str, abs_base: str, max_file_bytes: int):
+        self.project = project
+        self.abs_base = abs_base
+        self.max_file_bytes = max_file_bytes
+        self.ready = False
+        self.postings: Dict[str, array] = {}
+        self.paths: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.signatures: Dict[str, FileStat] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def needs_compaction(self) -> bool:
+        retired = len(self.paths) - len(self.ids)
+        return retired > max(1000, len(self.ids))
+
+    def index_file(self, rel_path: str, text: Optional[str] = None) -> None:
+        """(Re-)index one file, reading it from disk unless the caller just wrote `text`."""
+        abs_path = os.path.join(self.abs_base, rel_path)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            self.remove(rel_path)
+            return
+
+        if text is None or st.st_size > self.max_file_bytes:
+            text = read_text(abs_path, self.max_file_bytes)
+
+        file_trigrams = trigrams(text) if text is not None else set()
+
+        with self._lock:
+            self._retire(rel_path)
+            self.signatures[rel_path] = (st.st_mtime_ns, st.st_size)
+            if text is None:
+                return  # Remember the stat so binary/oversized files are not re-read on every pass
+
+            file_id = len(self.paths)
+            self.paths.append(rel_path)
+            self.ids[rel_path] = file_id
+            for trigram in file_trigrams:
+                posting = self.postings.get(trigram)
+                if posting is None:
+                    posting = self.postings[trigram] = array("I")
+                posting.append(file_id)
+
+    def remove(self, rel_path: str) -> None:
+        """Drop `rel_path` and, if it was a directory, every file below it."""
+        prefix = rel_path.rstrip("/") + "/"
+        with self._lock:
+            for path in [p for p in self.signatures if p == rel_path or p.startswith(prefix)]:
+                self._retire(path)
+                del self.signatures[path]
+
+    def reconcile(self, rel_paths: List[str]) -> None:
+        """Bring the index in line with `rel_paths`, re-reading only files whose stat changed."""
+        current = set(rel_paths)
+        # Request threads index and remove files while this runs, so work from a copy
+        with self._lock:
+            signatures = dict(self.signatures)
+        for rel_path in [p for p in signatures if p not in current]:
+            self.remove(rel_path)
+
+        for rel_path in rel_paths:
+            try:
+                st = os.stat(os.path.join(self.abs_base, rel_path))
+            except OSError:
+                self.remove(rel_path)
+                continue
+            if signatures.get(rel_path) != (st.st_mtime_ns, st.st_size):
+                self.index_file(rel_path)
+
+        self.ready = True
+
+    def candidates(self, query: str, prefix: str = "") -> List[str]:
+        """Live files that contain every trigram of `query` (all files for queries under 3 chars)."""
+        with self._lock:
+            if len(query) < 3:
+                paths = list(self.ids)
+            else:
+                postings = [self.postings.get(t) for t in trigrams(query)]
+                if any(p is None for p in postings):
+                    return []
+                postings.sort(key=len)
+                file_ids = set(postings[0])
+                for posting in postings[1:]:
+                    file_ids.intersection_update(posting)
+                    if not file_ids:
+                        return []
+                paths = [self.paths[i] for i in sorted(file_ids) if self.ids.get(self.paths[i]) == i]
+
+        return [p for p in paths if not prefix or p == prefix or p.startswith(prefix.rstrip("/") + "/")]
+
+    def search(self, query: str, read_file: Callable[[str], str], prefix: str = "", context: int = 2,
+               case_sensitive: bool = False, max_results: int = 50) -> Dict:
+        matches = []
+        truncated = False
+
+        for rel_path in self.candidates(query, prefix):
+            for match in match_lines(read_file(rel_path), query, case_sensitive, context):
+                if len(matches) == max_results:
+                    truncated = True
+                    break
+                matches.append({"path": rel_path, **match})
+            if truncated:
+                break
+
+        return {"matches": matches, "complete": self.ready, "truncated": truncated}
+
+    def _retire(self, rel_path: str) -> None:
+        self.ids.pop(rel_path, None)
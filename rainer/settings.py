@@ -11,6 +11,94 @@ RAINER_PROJECTS = {
     for p in rainer_projects.split(";")
 }
 
+# Minimum seconds between stat scans that pick up files changed outside the fileapi
+RAINER_TREE_SYNC_INTERVAL = float(os.getenv("RAINER_TREE_SYNC_INTERVAL", "2"))
+
+# Chunk size used when streaming raw file contents from rainer/file
+RAINER_FILE_CHUNK_SIZE = 64 * 1024
+
+# Upper bound (bytes on disk) for file contents kept in the in-process content cache
+RAINER_FILE_CACHE_MAX_BYTES = int(os.getenv("RAINER_FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Where per-project tree snapshots are kept for fast cold starts; empty disables them
+RAINER_SNAPSHOT_DIR = os.getenv(
+    "RAINER_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rainer"),
+)
+
+# Trigram content search: built in a background thread and re-checked every refresh interval (seconds)
+RAINER_SEARCH_INDEX = os.getenv("RAINER_SEARCH_INDEX", "1") == "1"
+RAINER_SEARCH_REFRESH_INTERVAL = float(os.getenv("RAINER_SEARCH_REFRESH_INTERVAL", "30"))
+# Files larger than this are left out of the search index
+RAINER_SEARCH_MAX_FILE_BYTES = 1024 * 1024
+
+# Estimated tokens an agent operation may send per model call before older context is compacted; 0 disables
+RAINER_OPERATION_TOKEN_BUDGET = int(os.getenv("RAINER_OPERATION_TOKEN_BUDGET", "24000"))
+
+# Opt-in cache of model responses for agent operations: off, record, replay or strict (replay only)
+RAINER_REPLAY_MODE = os.getenv("RAINER_REPLAY_MODE", "off")
+RAINER_REPLAY_DIR = os.getenv("RAINER_REPLAY_DIR", os.path.join(RAINER_SNAPSHOT_DIR or ".rainer", "replay"))
+RAINER_REPLAY_TTL_SECONDS = int(os.getenv("RAINER_REPLAY_TTL_SECONDS", str(7 * 24 * 3600)))
+RAINER_REPLAY_MAX_BYTES = int(os.getenv("RAINER_REPLAY_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Model backend of agent operations: "openai", or "mock" for offline load tests and profiling
+# (scripted replies after a simulated latency of RAINER_MOCK_LATENCY_SECONDS ± RAINER_MOCK_LATENCY_JITTER)
+RAINER_MODEL_PROVIDER = os.getenv("RAINER_MODEL_PROVIDER", "openai")
+RAINER_MOCK_LATENCY_SECONDS = float(os.getenv("RAINER_MOCK_LATENCY_SECONDS", "1.0"))
+RAINER_MOCK_LATENCY_JITTER = float(os.getenv("RAINER_MOCK_LATENCY_JITTER", "0.25"))
+
+# Request and token limits per minute the model call scheduler keeps each model under, as
+# "model=requests:tokens" pairs separated by ";", e.g. "gpt-4o=500:30000;gpt-4-turbo=500:30000".
+# Models not listed get RAINER_RATE_LIMIT_DEFAULT; "" or 0 leaves that limit off
+rainer_rate_limits = os.getenv("RAINER_RATE_LIMITS", "")
+rainer_rate_limit_default = os.getenv("RAINER_RATE_LIMIT_DEFAULT", "")
+
+
+def parse_rate_limit(value: str) -> tuple:
+    requests, _, tokens = value.partition(":")
+    return int(requests or 0), int(tokens or 0)
+
+
+RAINER_RATE_LIMITS = {
+    pair.split("=")[0].strip(): parse_rate_limit(pair.split("=")[1])
+    for pair in rainer_rate_limits.split(";") if "=" in pair
+}
+RAINER_RATE_LIMIT_DEFAULT = parse_rate_limit(rainer_rate_limit_default)
+# "memory" shares the limits between the operations of one process, "redis" (the Celery broker) between all processes
+RAINER_RATE_LIMIT_BACKEND = os.getenv("RAINER_RATE_LIMIT_BACKEND", "memory")
+# Output tokens reserved for a model call that sets no max_tokens; the difference is settled from its usage
+RAINER_RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("RAINER_RATE_LIMIT_OUTPUT_TOKENS", "2000"))
+
+# Retries of model calls that failed with a 429, timeout, connection or 5xx error, with full-jitter
+# exponential backoff from RAINER_RETRY_BASE_SECONDS up to RAINER_RETRY_MAX_SECONDS
+RAINER_MODEL_RETRIES = int(os.getenv("RAINER_MODEL_RETRIES", "3"))
+RAINER_RETRY_BASE_SECONDS = float(os.getenv("RAINER_RETRY_BASE_SECONDS", "1"))
+RAINER_RETRY_MAX_SECONDS = float(os.getenv("RAINER_RETRY_MAX_SECONDS", "30"))
+# Send a duplicate of a model call still unanswered after that model's p95 latency (of its last
+# RAINER_HEDGE_MIN_SAMPLES or more calls) and use whichever answers first; costs the duplicates' tokens
+RAINER_HEDGE_REQUESTS = os.getenv("RAINER_HEDGE_REQUESTS", "0") == "1"
+RAINER_HEDGE_MIN_SAMPLES = int(os.getenv("RAINER_HEDGE_MIN_SAMPLES", "20"))
+
+# How refactor operations return their result: "patch" (SEARCH/REPLACE blocks or a unified diff, applied
+# by rainer.patching, with a full-file retry if they do not apply) or "full" (the whole updated file)
+RAINER_REFACTOR_OUTPUT = os.getenv("RAINER_REFACTOR_OUTPUT", "patch")
+
+# Where rainer/file/new and rainer/file/update jobs run: "celery" (needs a worker and the broker)
+# or "thread", an in-process pool for development without Redis
+RAINER_JOBS_BACKEND = os.getenv("RAINER_JOBS_BACKEND", "celery")
+RAINER_JOBS_THREADS = int(os.getenv("RAINER_JOBS_THREADS", "4"))
+# How long a worker's claim on a running job lasts; it is renewed every third of this while the job runs.
+# A job whose claim ran out (its worker died) is failed when polled, or taken over by a redelivered task
+RAINER_JOB_CLAIM_SECONDS = int(os.getenv("RAINER_JOB_CLAIM_SECONDS", "300"))
+
+# Job event streams (rainer/jobs/<id>/events) one process serves at once; more are turned away with
+# a 503 and Retry-After. An open stream holds a connection, and under WSGI a whole worker for up to a
+# minute, so serve the app with ASGI (api.asgi) when many clients follow jobs live
+RAINER_MAX_EVENT_STREAMS = int(os.getenv("RAINER_MAX_EVENT_STREAMS", "50"))
+
+# Suffix of the staged and backup copies rainer/batch keeps next to the files it is replacing
+RAINER_BATCH_TEMP_SUFFIX = ".rainer-tmp"
+
 EXCLUDED_DIRS = {
     "__pycache__",
     ".idea",
@@ -30,7 +118,8 @@ EXCLUDED_DIRS = {
 EXCLUDED_FILE_EXTENSIONS = {
     ".pyc",
     ".pyo",
-    ".env"
+    ".env",
+    ".rainer-tmp"
 }
 
 EXCLUDED_FILE_NAMES = {
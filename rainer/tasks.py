@@ -0,0 +1,7 @@
+from celery import shared_task
+
+
+@shared_task(name="rainer.run_job", ignore_result=True)
+def run_rainer_job(job_id: str) -> None:
+    from .jobs import run_job
+    run_job(job_id)
@@ -0,0 +1,60 @@
+from django.test import SimpleTestCase
+
+from rainer.operations.context_budget import ContextBudget, item_tokens
+
+TREE = "PROJECT STRUCTURE: " + "x" * 4000
+CONDENSED_TREE = "PROJECT STRUCTURE: {src: [12 entries]}"
+
+
+def conversation(*extra):
+    return [
+        {"role": "user", "content": "--- START ---"},
+        {"role": "user", "content": "TASK: " + "t" * 400},
+        {"role": "user", "content": TREE},
+        *extra,
+        {"role": "user", "content": "--- ITERATION 1 ---"},
+    ]
+
+
+def tokens(items):
+    return sum(item_tokens(item) for item in items)
+
+
+class ContextBudgetTests(SimpleTestCase):
+    def test_under_budget_is_left_alone(self):
+        items = conversation()
+        self.assertEqual(ContextBudget(10_000).compact(items, 3), (items, 0))
+
+    def test_pinned_tree_alone_cannot_be_compacted(self):
+        items = conversation()
+        compacted, saved = ContextBudget(500).compact(items, 3)
+        self.assertEqual((compacted, saved), (items, 0))
+
+    def test_condensable_tree_is_cut_down_while_the_task_stays_whole(self):
+        items = conversation()
+        compacted, saved = ContextBudget(500).compact(items, 3, {2: lambda: CONDENSED_TREE})
+        self.assertLessEqual(tokens(compacted), 500)
+        self.assertEqual(compacted[1], items[1])
+        self.assertEqual(compacted[2]["content"], CONDENSED_TREE)
+        self.assertEqual(saved, tokens(items) - tokens(compacted))
+
+    def test_stale_tool_outputs_go_before_the_tree(self):
+        call = {"type": "function_call", "call_id": "c1", "name": "project_file_lookup", "arguments": "{}"}
+        output = {"type": "function_call_output", "call_id": "c1", "output": "y" * 4000}
+        items = conversation(call, output)
+
+        condensed = []
+        compacted, _ = ContextBudget(1500).compact(items, 3, {2: lambda: condensed.append(2) or CONDENSED_TREE})
+        self.assertIn("elided", compacted[4]["output"])
+        self.assertEqual(compacted[2]["content"], TREE)
+        self.assertEqual(condensed, [])
+
+    def test_long_assistant_messages_are_summarized_but_user_messages_are_not(self):
+        items = conversation(
+            {"role": "user", "content": "u" * 4000},
+            {"role": "assistant", "content": "line\n" * 1000},
+        )
+        compacted, saved = ContextBudget(2000).compact(items, 3)
+        self.assertEqual(compacted[3], items[3])
+        self.assertIn("tokens of an earlier message elided", compacted[4]["content"])
+        self.assertGreater(saved, 0)
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rainer import fileapi
+from rainer.fileapi import apply_rainer_batch, iter_file_range, parse_byte_range, search_project_files
+from rainer.settings import RAINER_BATCH_TEMP_SUFFIX
+from rainer.search_index import TrigramIndex
+from rainer.tree_index import ProjectTreeIndex
+
+PROJECT = "rainer-tests"
+
+
+class ParseByteRangeTests(SimpleTestCase):
+    def test_closed_range(self):
+        self.assertEqual(parse_byte_range("bytes=0-9", 100), (0, 9))
+
+    def test_open_range_runs_to_the_end(self):
+        self.assertEqual(parse_byte_range("bytes=90-", 100), (90, 99))
+
+    def test_end_past_the_file_is_clamped(self):
+        self.assertEqual(parse_byte_range("bytes=50-500", 100), (50, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_byte_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_byte_range("bytes=-500", 100), (0, 99))
+
+    def test_nothing_to_honor(self):
+        for header in ("", "items=0-9", "bytes=0-9,20-29", "bytes=a-b", "bytes=-", "bytes=5"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_byte_range(header, 100))
+
+    def test_unsatisfiable(self):
+        for header, size in (("bytes=100-", 100), ("bytes=20-10", 100), ("bytes=-0", 100), ("bytes=-5", 0)):
+            with self.subTest(header=header, size=size):
+                with self.assertRaises(ValueError):
+                    parse_byte_range(header, size)
+
+
+class FileRangeTests(SimpleTestCase):
+    def setUp(self):
+        self.base = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base.cleanup)
+        with open(os.path.join(self.base.name, "data.txt"), "wb") as f:
+            f.write(bytes(range(256)) * 4)
+        patcher = mock.patch.dict(fileapi.paths, {PROJECT: self.base.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_raw(self, **headers):
+        return self.client.get("/rainer/file", {"project": PROJECT, "path": "data.txt", "mode": "raw"}, headers=headers)
+
+    def test_iter_file_range_chunks(self):
+        path = os.path.join(self.base.name, "data.txt")
+        chunks = list(iter_file_range(path, 10, 100, chunk_size=32))
+        self.assertEqual([len(chunk) for chunk in chunks], [32, 32, 32, 4])
+        self.assertEqual(b"".join(chunks), (bytes(range(256)) * 4)[10:110])
+
+    def test_full_file(self):
+        response = self.get_raw()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(256)) * 4)
+
+    def test_partial_content(self):
+        response = self.get_raw(Range="bytes=256-259")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 256-259/1024")
+        self.assertEqual(b"".join(response.streaming_content), bytes([0, 1, 2, 3]))
+
+    def test_unsatisfiable_range(self):
+        response = self.get_raw(Range="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.get_raw(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], "1024")
+
+
+class BatchTests(SimpleTestCase):
+    def setUp(self):
+        self.base = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base.cleanup)
+        self.write("keep.txt", "keep")
+        self.write("src/a.py", "a = 1\n")
+        self.write("src/b.py", "b = 1\n")
+
+        trees = {}
+        self.index = ProjectTreeIndex(PROJECT, self.base.name, trees)
+        self.index.rebuild()
+        for target, values in ((fileapi.paths, {PROJECT: self.base.name}), (fileapi.tree_indexes, {PROJECT: self.index})):
+            patcher = mock.patch.dict(target, values)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, rel_path, content):
+        abs_path = os.path.join(self.base.name, rel_path)
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        with open(abs_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def snapshot(self):
+        """Every path under the project with its contents (None for directories)."""
+        found = {}
+        for root, dirs, files in os.walk(self.base.name):
+            rel_root = os.path.relpath(root, self.base.name)
+            for name in dirs:
+                found[os.path.normpath(os.path.join(rel_root, name))] = None
+            for name in files:
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    found[os.path.normpath(os.path.join(rel_root, name))] = f.read()
+        return found
+
+    def test_applies_every_operation_and_refreshes_the_tree(self):
+        version = apply_rainer_batch(PROJECT, [
+            {"action": "update", "path": "src/a.py", "content": "a = 2\n"},
+            {"action": "create", "path": "docs/new.md", "content": "# New\n"},
+            {"action": "delete", "path": "src/b.py"},
+        ])
+
+        self.assertEqual(version, self.index.version)
+        self.assertEqual(self.snapshot(), {
+            "keep.txt": "keep", "src": None, "src/a.py": "a = 2\n", "docs": None, "docs/new.md": "# New\n",
+        })
+        self.assertIn("new.md", self.index.tree["docs"])
+        self.assertNotIn("b.py", self.index.tree["src"])
+
+    def test_invalid_batch_leaves_the_project_untouched(self):
+        before = self.snapshot()
+        for operations in (
+            [{"action": "create", "path": "new/c.py", "content": "c = 1\n"}, {"action": "update", "path": "missing.py", "content": ""}],
+            [{"action": "create", "path": "new/c.py", "content": "c = 1\n"}, {"action": "delete", "path": "missing.py"}],
+            [{"action": "update", "path": "src/a.py", "content": "a = 2\n"}, {"action": "create", "path": "../escape.py", "content": ""}],
+            [{"action": "update", "path": "src/a.py", "content": "a = 2\n"}, {"action": "rename", "path": "src/b.py"}],
+            [{"action": "update", "path": "src/a.py"}],
+            [{"action": "update", "path": "src/a.py", "content": "a = 2\n"}, {"action": "create", "path": "src", "content": ""}],
+            [{"action": "update", "path": "src/a.py", "content": "a = 2\n"}, {"action": "update", "path": "src/", "content": ""}],
+        ):
+            with self.subTest(operations=operations):
+                with self.assertRaises(ValueError):
+                    apply_rainer_batch(PROJECT, operations)
+                self.assertEqual(self.snapshot(), before)
+
+    def test_failure_while_moving_files_into_place_rolls_back(self):
+        before = self.snapshot()
+        version = self.index.version
+        replace = os.replace
+
+        def failing_replace(source, destination):
+            # Fail placing the third operation, after the first two are already in place
+            if f".new2{RAINER_BATCH_TEMP_SUFFIX}" in source:
+                raise OSError("disk full")
+            replace(source, destination)
+
+        with mock.patch("rainer.fileapi.os.replace", side_effect=failing_replace):
+            with self.assertRaises(OSError):
+                apply_rainer_batch(PROJECT, [
+                    {"action": "update", "path": "src/a.py", "content": "a = 2\n"},
+                    {"action": "delete", "path": "src/b.py"},
+                    {"action": "create", "path": "docs/new.md", "content": "# New\n"},
+                ])
+
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.index.version, version)
+
+
+class SearchFallbackTests(SimpleTestCase):
+    def setUp(self):
+        self.base = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base.cleanup)
+        for name, content in (("small.py", "needle = 1\n"), ("large.py", "needle = 2\n" + "#" * 100)):
+            with open(os.path.join(self.base.name, name), "w", encoding="utf-8") as f:
+                f.write(content)
+
+        index = ProjectTreeIndex(PROJECT, self.base.name, {})
+        index.rebuild()
+        search_index = TrigramIndex(PROJECT, index.abs_base, 64)
+        for target, values in ((fileapi.paths, {PROJECT: self.base.name}), (fileapi.tree_indexes, {PROJECT: index}),
+                               (fileapi.search_indexes, {PROJECT: search_index})):
+            patcher = mock.patch.dict(target, values)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch.object(fileapi, "RAINER_SEARCH_MAX_FILE_BYTES", 64)
+    def test_scan_before_the_index_is_ready_skips_large_files(self):
+        result = search_project_files(PROJECT, "needle")
+        self.assertFalse(result["complete"])
+        self.assertEqual([match["path"] for match in result["matches"]], ["small.py"])
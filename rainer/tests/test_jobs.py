@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from rainer import jobs
+from rainer.events import MemoryEventLog
+from rainer.jobs import WORKER_LOST, fail_expired_job, run_job
+from rainer.models import RainerJob, RainerJobStatus
+
+
+class JobClaimTests(TransactionTestCase):
+    def setUp(self):
+        self.events = MemoryEventLog()
+        patcher = mock.patch("rainer.events._event_log", self.events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def running_job(self, claimed_until, started_at=None):
+        return RainerJob.objects.create(kind="file/new", status=RainerJobStatus.RUNNING,
+                                        started_at=started_at or timezone.now(), claimed_until=claimed_until)
+
+    def event_types(self, job):
+        return [event["type"] for event in self.events.read(str(job.id), 0, 0)]
+
+    def test_job_whose_claim_ran_out_is_failed_when_polled(self):
+        job = self.running_job(timezone.now() - timedelta(seconds=1))
+        response = self.client.get(f"/rainer/jobs/{job.id}")
+        self.assertEqual(response.json()["status"], RainerJobStatus.FAILED)
+        self.assertEqual(response.json()["error"], WORKER_LOST)
+        self.assertEqual(self.event_types(job), ["job_end"])
+        self.assertFalse(fail_expired_job(str(job.id)))  # Only once
+
+    def test_job_with_a_live_claim_is_left_running(self):
+        job = self.running_job(timezone.now() + timedelta(seconds=60))
+        response = self.client.get(f"/rainer/jobs/{job.id}")
+        self.assertEqual(response.json()["status"], RainerJobStatus.RUNNING)
+        self.assertEqual(self.event_types(job), [])
+
+    def test_job_started_before_claims_were_kept_expires_by_its_start(self):
+        stale = self.running_job(None, timezone.now() - timedelta(seconds=jobs.RAINER_JOB_CLAIM_SECONDS + 1))
+        recent = self.running_job(None)
+        self.assertTrue(fail_expired_job(str(stale.id)))
+        self.assertFalse(fail_expired_job(str(recent.id)))
+
+    @mock.patch.object(jobs, "RAINER_JOB_CLAIM_SECONDS", 0.3)
+    def test_claim_is_renewed_while_the_job_runs(self):
+        job = RainerJob.objects.create(kind="file/new")
+        expired_while_running = []
+
+        def handler(payload, event_stream=""):
+            time.sleep(0.7)  # More than twice the claim
+            expired_while_running.append(fail_expired_job(event_stream))
+            return {"done": True}
+
+        with mock.patch.dict(jobs.JOB_HANDLERS, {"file/new": handler}):
+            run_job(str(job.id))
+
+        job.refresh_from_db()
+        self.assertEqual(expired_while_running, [False])
+        self.assertEqual(job.status, RainerJobStatus.SUCCEEDED)
+        self.assertEqual(self.event_types(job), ["job_start", "job_end"])
@@ -0,0 +1,105 @@
+from django.test import SimpleTestCase
+
+from rainer.patching import PatchError, apply_patch, parse_patch
+
+SOURCE = """def greet(name):
+    message = "Hello, " + name
+    return message
+
+
+def farewell(name):
+    return "Bye, " + name
+"""
+
+
+def search_replace(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+class ParsePatchTests(SimpleTestCase):
+    def test_search_replace_ignores_prose_and_fences(self):
+        text = "Here is the change:\n```\n" + search_replace("a = 1", "a = 2") + "\n```\nDone."
+        hunks = parse_patch(text)
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual(hunks[0].search, ["a = 1"])
+        self.assertEqual(hunks[0].replace, ["a = 2"])
+
+    def test_unterminated_block(self):
+        with self.assertRaises(PatchError):
+            parse_patch("<<<<<<< SEARCH\na = 1\n=======\na = 2\n")
+
+    def test_unified_diff_hunks_carry_their_line(self):
+        hunks = parse_patch("--- a/x.py\n+++ b/x.py\n@@ -3,2 +3,2 @@\n keep\n-old\n+new\n")
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual(hunks[0].line_hint, 2)
+        self.assertEqual(hunks[0].search, ["keep", "old"])
+        self.assertEqual(hunks[0].replace, ["keep", "new"])
+
+    def test_no_hunks(self):
+        with self.assertRaises(PatchError):
+            parse_patch("I could not find anything to change.")
+
+
+class ApplyPatchTests(SimpleTestCase):
+    def test_search_replace(self):
+        updated, fuzzy = apply_patch(SOURCE, search_replace('    return "Bye, " + name', '    return "Goodbye, " + name'))
+        self.assertEqual(updated, SOURCE.replace('"Bye, "', '"Goodbye, "'))
+        self.assertEqual(fuzzy, 0)
+
+    def test_hunks_apply_in_order(self):
+        patch = "\n".join([
+            search_replace('    message = "Hello, " + name\n    return message', '    return "Hello, " + name'),
+            search_replace('    return "Bye, " + name', '    return "Goodbye, " + name'),
+        ])
+        updated, _ = apply_patch(SOURCE, patch)
+        self.assertIn('    return "Hello, " + name\n', updated)
+        self.assertIn('    return "Goodbye, " + name\n', updated)
+        self.assertNotIn("message", updated)
+
+    def test_unified_diff(self):
+        patch = "@@ -6,2 +6,2 @@\n def farewell(name):\n-    return \"Bye, \" + name\n+    return \"Goodbye, \" + name\n"
+        updated, fuzzy = apply_patch(SOURCE, patch)
+        self.assertEqual(updated, SOURCE.replace('"Bye, "', '"Goodbye, "'))
+        self.assertEqual(fuzzy, 0)
+
+    def test_unified_diff_line_hint_picks_between_duplicates(self):
+        original = "x = 1\ny = 2\nx = 1\ny = 2\n"
+        updated, _ = apply_patch(original, "@@ -3,1 +3,1 @@\n-x = 1\n+x = 3\n")
+        self.assertEqual(updated, "x = 1\ny = 2\nx = 3\ny = 2\n")
+
+    def test_ambiguous_search_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_patch("x = 1\nx = 1\n", search_replace("x = 1", "x = 2"))
+
+    def test_whitespace_differences_are_tolerated_and_reindented(self):
+        # The model dropped the indentation of the method body
+        patch = search_replace('message = "Hello, " + name\nreturn message', 'return "Hi, " + name')
+        updated, fuzzy = apply_patch(SOURCE, patch)
+        self.assertIn('def greet(name):\n    return "Hi, " + name\n', updated)
+        self.assertEqual(fuzzy, 0)
+
+    def test_near_miss_applies_fuzzily(self):
+        patch = search_replace('    message = "Hello, " + nam\n    return message', '    return "Hi, " + name')
+        updated, fuzzy = apply_patch(SOURCE, patch)
+        self.assertIn('def greet(name):\n    return "Hi, " + name\n', updated)
+        self.assertEqual(fuzzy, 1)
+
+    def test_unrelated_search_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_patch(SOURCE, search_replace("import os", "import sys"))
+
+    def test_line_endings_are_kept(self):
+        updated, _ = apply_patch("a = 1\r\nb = 2\r\n", search_replace("b = 2", "b = 3"))
+        self.assertEqual(updated, "a = 1\r\nb = 3\r\n")
+
+    def test_python_that_stops_compiling_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_patch(SOURCE, search_replace("def farewell(name):", "def farewell(name"), "greetings.py")
+
+    def test_other_files_are_not_compiled(self):
+        updated, _ = apply_patch("a: 1\n", search_replace("a: 1", "a: (1"), "config.yaml")
+        self.assertEqual(updated, "a: (1\n")
+
+    def test_empty_search_fills_an_empty_file(self):
+        updated, _ = apply_patch("", "<<<<<<< SEARCH\n=======\nprint('hi')\n>>>>>>> REPLACE")
+        self.assertEqual(updated, "print('hi')")
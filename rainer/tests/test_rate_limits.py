@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rainer.metrics import MemoryMetrics, flush_metrics
+from rainer.rate_limits import BATCH, INTERACTIVE, MemoryRateLimits, RateLimitScheduler, TokenBucket
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_refills_evenly_over_a_minute(self):
+        bucket = TokenBucket(60)
+        bucket.level, bucket.updated = 0.0, 100.0
+        bucket.refill(110.0)
+        self.assertAlmostEqual(bucket.level, 10.0)
+        bucket.refill(1000.0)
+        self.assertEqual(bucket.level, 60)
+
+    def test_wait_for_missing_units(self):
+        bucket = TokenBucket(60)
+        bucket.level = 5.0
+        self.assertEqual(bucket.wait_for(5), 0.0)
+        self.assertAlmostEqual(bucket.wait_for(8), 3.0)
+
+    def test_call_bigger_than_the_bucket_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(100)
+        self.assertEqual(bucket.wait_for(500), 0.0)
+        bucket.level = 40.0
+        self.assertAlmostEqual(bucket.wait_for(500), 36.0)
+
+    def test_zero_capacity_never_runs_out(self):
+        bucket = TokenBucket(0)
+        self.assertEqual(bucket.wait_for(10 ** 9), 0.0)
+
+
+class MemoryRateLimitsTests(SimpleTestCase):
+    def test_reserve_takes_a_request_and_tokens(self):
+        limits = MemoryRateLimits()
+        self.assertEqual(limits.reserve("m", (2, 1000), 600), 0)
+        self.assertGreater(limits.reserve("m", (2, 1000), 600), 0)  # Out of tokens
+        limits.refund("m", 500)  # The first call used only 100
+        self.assertEqual(limits.reserve("m", (2, 1000), 600), 0)
+        self.assertGreater(limits.reserve("m", (2, 1000), 1), 0)  # Out of requests
+
+    def test_pause_holds_back_every_call(self):
+        limits = MemoryRateLimits()
+        limits.pause("m", 30)
+        wait = limits.reserve("m", (0, 0), 1)
+        self.assertGreater(wait, 29)
+        self.assertEqual(limits.reserve("other", (0, 0), 1), 0)
+
+
+class FakeLimits:
+    """Hands out only as many reservations as the test released."""
+    blocking = False
+
+    def __init__(self):
+        self.available = 0
+        self.threads = set()
+
+    def reserve(self, model, limits, tokens):
+        self.threads.add(threading.get_ident())
+        if self.available:
+            self.available -= 1
+            return 0
+        return 0.01
+
+    def refund(self, model, tokens):
+        pass
+
+    def pause(self, model, seconds):
+        pass
+
+
+class RateLimitSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = FakeLimits()
+        self.scheduler = RateLimitScheduler(self.backend, {}, (0, 0))
+        self.metrics = MemoryMetrics()
+        patcher = mock.patch("rainer.metrics._metrics", self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def wait_for_queue(self, lane, depth):
+        while self.scheduler.queue_depth("m", lane) < depth:
+            await asyncio.sleep(0.001)
+
+    async def test_interactive_calls_go_before_batch_calls(self):
+        order = []
+
+        async def call(name, lane):
+            await self.scheduler.acquire("m", 10, lane)
+            order.append(name)
+
+        tasks = [asyncio.create_task(call("batch 1", BATCH))]
+        await self.wait_for_queue(BATCH, 1)
+        tasks.append(asyncio.create_task(call("batch 2", BATCH)))
+        await self.wait_for_queue(BATCH, 2)
+        tasks.append(asyncio.create_task(call("interactive", INTERACTIVE)))
+        await self.wait_for_queue(INTERACTIVE, 1)
+
+        for released in range(1, 4):
+            self.backend.available = 1
+            while len(order) < released:
+                await asyncio.sleep(0.001)
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order, ["interactive", "batch 1", "batch 2"])
+        self.assertEqual(self.scheduler.waiting("m"), 0)
+        await asyncio.to_thread(flush_metrics)
+        metrics = self.metrics.snapshot()
+        self.assertEqual(metrics["rate_limit_waits.batch"], 2)
+        self.assertEqual(metrics["rate_limit_waits.interactive"], 1)
+        self.assertEqual(metrics["rate_limit_queue_depth.m.batch"], 0)
+
+    async def test_calls_do_not_jump_the_queue(self):
+        queued = asyncio.create_task(self.scheduler.acquire("m", 10, INTERACTIVE))
+        await self.wait_for_queue(INTERACTIVE, 1)
+
+        # A newcomer waits behind the queue even though a reservation is free
+        self.backend.available = 1
+        newcomer = asyncio.create_task(self.scheduler.acquire("m", 10, INTERACTIVE))
+        await queued
+        self.assertFalse(newcomer.done())
+
+        self.backend.available = 1
+        await newcomer
+
+    async def test_blocking_backend_is_called_off_the_loop(self):
+        self.backend.blocking = True
+        self.backend.available = 1
+        await self.scheduler.acquire("m", 10, INTERACTIVE)
+        self.assertNotIn(threading.get_ident(), self.backend.threads)
+
+    async def test_metrics_are_written_off_the_loop(self):
+        threads = set()
+        metrics = mock.Mock(increment=lambda *args: threads.add(threading.get_ident()),
+                            set_gauge=lambda *args: threads.add(threading.get_ident()))
+        with mock.patch("rainer.metrics._metrics", metrics):
+            queued = asyncio.create_task(self.scheduler.acquire("m", 10, INTERACTIVE))
+            await self.wait_for_queue(INTERACTIVE, 1)
+            self.backend.available = 1
+            await queued
+            await self.scheduler.pause("m", 1)
+            await asyncio.to_thread(flush_metrics)
+
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_settle_refunds_unused_tokens(self):
+        with mock.patch.object(self.backend, "refund") as refund:
+            self.scheduler.settle_sync("m", 100, 40)
+            self.scheduler.settle_sync("m", 100, 100)
+            self.scheduler.settle_sync("m", 100, 0)  # Usage unknown
+        refund.assert_called_once_with("m", 60)
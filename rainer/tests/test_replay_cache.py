@@ -0,0 +1,48 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rainer.operations.replay_cache import ReplayCache, ReplayMiss
+
+
+class ReplayCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def cache(self, mode="replay", max_bytes=0):
+        return ReplayCache(self.directory.name, mode, max_bytes=max_bytes)
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.directory.name, name)) for name in os.listdir(self.directory.name))
+
+    def test_replays_recorded_turns(self):
+        cache = self.cache()
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", [{"role": "assistant", "content": "hi"}], ["hi"])
+        self.assertEqual(cache.get("k")["messages"], ["hi"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_strict_mode_miss(self):
+        with self.assertRaises(ReplayMiss):
+            self.cache("strict").get("k")
+
+    def test_directory_is_only_listed_when_it_may_be_over_the_limit(self):
+        cache = self.cache(max_bytes=20_000)
+        with mock.patch("rainer.operations.replay_cache.os.scandir", wraps=os.scandir) as scandir:
+            for i in range(300):
+                cache.put(f"k{i}", [], ["x" * 100])
+                self.assertLessEqual(self.size(), 20_000)
+        # Entries of ~150 bytes: a scan on the first write, then one per 2000 bytes (EVICT_TO_SHARE) written
+        self.assertLess(scandir.call_count, 30)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.cache(max_bytes=1000)
+        cache.put("old", [], ["x" * 100])
+        for i in range(20):
+            os.utime(os.path.join(self.directory.name, "old.json"), (2_000_000_000 + i,) * 2)  # Used just now
+            cache.put(f"k{i}", [], ["x" * 100])
+        self.assertIsNotNone(cache.get("old"))
+        self.assertIsNone(cache.get("k0"))
@@ -0,0 +1,202 @@
+import asyncio
+from unittest import mock
+
+import openai
+from django.test import SimpleTestCase
+
+from rainer import resilience
+from rainer.metrics import MemoryMetrics, flush_metrics
+from rainer.operations.resilient_model import ResilientModel
+from rainer.resilience import FATAL, RATE_LIMITED, TIMEOUT, TRANSIENT, LatencyTracker, backoff_seconds, \
+    call_with_retries, call_with_retries_sync, classify, hedged
+
+
+def status_error(status_code, headers=None, error_class=openai.APIStatusError):
+    response = mock.Mock(status_code=status_code, headers=headers or {})
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+class ResilienceTestCase(SimpleTestCase):
+    def setUp(self):
+        self.metrics = MemoryMetrics()
+        patcher = mock.patch("rainer.metrics._metrics", self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def counted(self):
+        await asyncio.to_thread(flush_metrics)
+        return self.metrics.snapshot()
+
+
+class ClassifyTests(SimpleTestCase):
+    def test_kinds(self):
+        cases = [
+            (status_error(429, error_class=openai.RateLimitError), RATE_LIMITED),
+            (openai.APITimeoutError(request=mock.Mock()), TIMEOUT),
+            (TimeoutError(), TIMEOUT),
+            (openai.APIConnectionError(request=mock.Mock()), TRANSIENT),
+            (ConnectionResetError(), TRANSIENT),
+            (status_error(500, error_class=openai.InternalServerError), TRANSIENT),
+            (status_error(503), TRANSIENT),
+            (status_error(408), TRANSIENT),
+            (status_error(409), TRANSIENT),
+            (status_error(400, error_class=openai.BadRequestError), FATAL),
+            (status_error(401, error_class=openai.AuthenticationError), FATAL),
+            (status_error(404), FATAL),
+            (ValueError("bug"), FATAL),
+        ]
+        for error, kind in cases:
+            with self.subTest(error=repr(error)):
+                self.assertEqual(classify(error), kind)
+
+    def test_backoff_respects_retry_after(self):
+        error = status_error(429, {"retry-after": "7"}, openai.RateLimitError)
+        with mock.patch.object(resilience, "RAINER_RETRY_MAX_SECONDS", 1.0):
+            for attempt in range(5):
+                self.assertGreaterEqual(backoff_seconds(attempt, error), 7)
+
+    def test_backoff_stays_under_the_ceiling(self):
+        with mock.patch.object(resilience, "RAINER_RETRY_BASE_SECONDS", 1.0), \
+                mock.patch.object(resilience, "RAINER_RETRY_MAX_SECONDS", 30.0):
+            for attempt, ceiling in ((0, 1), (2, 4), (10, 30)):
+                self.assertLessEqual(backoff_seconds(attempt, TimeoutError()), ceiling)
+
+
+@mock.patch.object(resilience, "RAINER_MODEL_RETRIES", 2)
+@mock.patch.object(resilience, "backoff_seconds", return_value=0)
+class RetryTests(ResilienceTestCase):
+    async def test_transient_errors_are_retried(self, _):
+        outcomes = [ConnectionResetError(), TimeoutError(), "answer"]
+
+        async def make_call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(await call_with_retries("m", make_call), "answer")
+        metrics = await self.counted()
+        self.assertEqual(metrics["model_retries.transient"], 1)
+        self.assertEqual(metrics["model_retries.timeout"], 1)
+
+    async def test_fatal_errors_are_raised_at_once(self, _):
+        make_call = mock.AsyncMock(side_effect=status_error(400, error_class=openai.BadRequestError))
+        with self.assertRaises(openai.BadRequestError):
+            await call_with_retries("m", make_call)
+        self.assertEqual(make_call.await_count, 1)
+
+    def test_retries_run_out(self, _):
+        make_call = mock.Mock(side_effect=ConnectionResetError())
+        with self.assertRaises(ConnectionResetError):
+            call_with_retries_sync("m", make_call)
+        self.assertEqual(make_call.call_count, 3)
+        flush_metrics()
+        self.assertEqual(self.metrics.snapshot()["model_retries_exhausted"], 1)
+
+
+@mock.patch.object(resilience, "RAINER_HEDGE_REQUESTS", True)
+@mock.patch.object(resilience, "RAINER_HEDGE_MIN_SAMPLES", 3)
+class HedgedTests(ResilienceTestCase):
+    def setUp(self):
+        super().setUp()
+        latencies = LatencyTracker()
+        for _ in range(3):
+            latencies.add("m", 0.01)
+        patcher = mock.patch.object(resilience, "latencies", latencies)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def make_call(self, *delays):
+        """A call whose nth attempt answers after delays[n] seconds, recording whether it finished."""
+        async def call():
+            number = len(self.calls)
+            self.calls.append("started")
+            await asyncio.sleep(delays[number])
+            self.calls[number] = "finished"
+            return number
+        return call
+
+    async def test_slow_call_is_hedged_and_the_duplicate_wins(self):
+        self.assertEqual(await hedged("m", self.make_call(5, 0)), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(self.calls, ["started", "finished"])  # The slow call was cancelled
+        metrics = await self.counted()
+        self.assertEqual(metrics["model_hedges"], 1)
+        self.assertEqual(metrics["model_hedge_wins"], 1)
+
+    async def test_result_of_a_call_finishing_in_the_same_round_is_discarded(self):
+        answer = asyncio.Event()
+
+        async def make_call():
+            number = len(self.calls)
+            self.calls.append("started")
+            if number:
+                answer.set()  # Both calls now answer at once
+            await answer.wait()
+            return number
+
+        discard = mock.AsyncMock()
+        self.assertEqual(await hedged("m", make_call, discard), 0)
+        discard.assert_awaited_once_with(1)
+
+    async def test_hedged_stream_that_loses_is_closed(self):
+        answer, closed = asyncio.Event(), []
+
+        async def stream_response(*args, **kwargs):
+            number = len(self.calls)
+            self.calls.append("started")
+            if number:
+                answer.set()
+            await answer.wait()
+            try:
+                yield f"event of stream {number}"
+            finally:
+                closed.append(number)
+
+        model = ResilientModel(mock.Mock(stream_response=stream_response), "m")
+        events = [event async for event in model.stream_response()]
+        self.assertEqual(events, ["event of stream 0"])
+        self.assertEqual(sorted(closed), [0, 1])
+
+    async def test_hedge_delay_gauge_is_published_when_it_changes(self):
+        with mock.patch.object(resilience, "set_gauge_later") as set_gauge_later:
+            for _ in range(3):
+                await hedged("m", self.make_call(0, 0, 0))
+        # The fast calls added samples, but the p95 stayed the same
+        set_gauge_later.assert_called_once_with("model_hedge_delay_seconds.m", 0.01)
+
+    async def test_fast_call_is_not_hedged(self):
+        self.assertEqual(await hedged("m", self.make_call(0)), 0)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_not_hedged_without_enough_samples(self):
+        self.assertEqual(await hedged("other", self.make_call(0.05)), 0)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_not_hedged_while_calls_queue_for_rate_limits(self):
+        scheduler = mock.Mock(waiting=mock.Mock(return_value=2))
+        with mock.patch.object(resilience, "get_scheduler", return_value=scheduler):
+            self.assertEqual(await hedged("m", self.make_call(0.05)), 0)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_not_hedged_when_disabled(self):
+        with mock.patch.object(resilience, "RAINER_HEDGE_REQUESTS", False):
+            self.assertEqual(await hedged("m", self.make_call(0.05)), 0)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_failure_of_one_call_waits_for_the_other(self):
+        async def make_call():
+            self.calls.append("started")
+            if len(self.calls) == 1:
+                await asyncio.sleep(0.05)
+                raise ConnectionResetError()
+            await asyncio.sleep(0.1)
+            return "answer"
+
+        self.assertEqual(await hedged("m", make_call), "answer")
+
+    async def test_error_is_raised_when_every_call_fails(self):
+        make_call = mock.AsyncMock(side_effect=ConnectionResetError())
+        with self.assertRaises(ConnectionResetError):
+            await hedged("m", make_call)
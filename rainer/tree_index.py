@@ -0,0 +1,445 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .settings import EXCLUDED_DIRS, EXCLUDED_FILE_EXTENSIONS, EXCLUDED_FILE_NAMES, RAINER_BATCH_TEMP_SUFFIX
+
+# Snapshots taken with different exclusions describe a different tree
+EXCLUSIONS_FINGERPRINT = [sorted(EXCLUDED_DIRS), sorted(EXCLUDED_FILE_EXTENSIONS), sorted(EXCLUDED_FILE_NAMES),
+                          RAINER_BATCH_TEMP_SUFFIX]
+
+# Files are stored as None: a leaf's relative path is implied by its position in the tree,
+# so the index never keeps one full path string per file.
+TreeNode = Dict[str, Union[None, str, "TreeNode"]]
+DirStat = Tuple[int, int]
+
+# Bump when the snapshot layout changes; older snapshots are then ignored and rebuilt
+SNAPSHOT_FORMAT = 1
+
+
+def is_excluded_file(name: str) -> bool:
+    return name in EXCLUDED_FILE_NAMES or os.path.splitext(name)[1] in EXCLUDED_FILE_EXTENSIONS
+
+
+def is_excluded_dir(name: str) -> bool:
+    # Directory backups left behind by an interrupted rainer/batch are not part of the project
+    return name in EXCLUDED_DIRS or name.endswith(RAINER_BATCH_TEMP_SUFFIX)
+
+
+def join_rel(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+def split_rel_path(relative_path: str) -> Optional[List[str]]:
+    """Normalize a project-relative path into its segments, or None if it points outside the project."""
+    if not relative_path or os.path.isabs(relative_path):
+        return None
+
+    normalized = os.path.normpath(relative_path.replace("\\", "/")).replace("\\", "/").strip("/")
+    if normalized in ("", ".") or normalized == ".." or normalized.startswith("../"):
+        return None
+
+    return normalized.split("/")
+
+
+def stat_dir(abs_dir: str) -> Optional[DirStat]:
+    """Cheap change signature for a directory listing: (mtime_ns, size)."""
+    try:
+        st = os.stat(abs_dir)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def scan_dir(abs_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    List one directory with a single scandir call, returning the (subdirectory, file) names
+    that belong in the tree. Like os.walk, symlinked directories are neither listed nor followed.
+    """
+    dirs: List[str] = []
+    files: List[str] = []
+    with os.scandir(abs_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not is_excluded_dir(entry.name):
+                    dirs.append(entry.name)
+            elif entry.is_dir():
+                continue
+            elif not is_excluded_file(entry.name):
+                files.append(entry.name)
+    return dirs, files
+
+
+def walk_tree(abs_base: str, rel_dir: str = "", dir_stats: Optional[Dict[str, DirStat]] = None) -> TreeNode:
+    """Build the nested tree below `rel_dir`, recording a stat signature per directory into `dir_stats`."""
+    tree: TreeNode = {}
+    # Repeated names (__init__.py, index.ts, ...) share one string; the table itself is dropped after the walk
+    names: Dict[str, str] = {}
+    pending = [(rel_dir, tree)]
+
+    while pending:
+        rel_root, node = pending.pop()
+        abs_root = os.path.join(abs_base, rel_root) if rel_root else abs_base
+
+        # Stat before listing, so a change racing the scan still shows up on the next sync
+        signature = stat_dir(abs_root)
+        try:
+            dirs, files = scan_dir(abs_root)
+        except OSError:
+            continue  # os.walk skips unreadable directories as well
+
+        if dir_stats is not None and signature is not None:
+            dir_stats[rel_root] = signature
+
+        for name in dirs:
+            child: TreeNode = {}
+            node[names.setdefault(name, name)] = child
+            pending.append((join_rel(rel_root, name), child))
+
+        for name in files:
+            node[names.setdefault(name, name)] = None
+
+    return tree
+
+
+def materialize_tree(node: TreeNode, rel_dir: str = "") -> Dict[str, Union[str, Dict]]:
+    """Expand a compact tree into the public shape, where every file maps to its relative path."""
+    return {
+        name: materialize_tree(child, join_rel(rel_dir, name)) if isinstance(child, dict)
+        else join_rel(rel_dir, name) if child is None
+        else child
+        for name, child in node.items()
+    }
+
+
+def iter_tree_files(node: TreeNode, rel_dir: str = "") -> Iterator[str]:
+    """Relative paths of every file in a compact tree."""
+    for name, child in node.items():
+        if isinstance(child, dict):
+            yield from iter_tree_files(child, join_rel(rel_dir, name))
+        elif child is None:
+            yield join_rel(rel_dir, name)
+
+
+def describe_node(name: str, rel_path: str, node: Union[None, TreeNode], depth: int) -> Dict:
+    """
+    Lazily expandable view of a tree node: directories report `child_count` and only carry
+    `children` while `depth` allows, so clients can fetch deeper levels on demand.
+    """
+    if not isinstance(node, dict):
+        return {"name": name, "path": rel_path, "type": "file"}
+
+    entries = {child_name: child for child_name, child in node.items() if child_name != "__path__"}
+    described = {"name": name, "path": rel_path, "type": "directory", "child_count": len(entries)}
+
+    if depth > 0:
+        # Directories first, then files, each alphabetically
+        described["children"] = [
+            describe_node(child_name, join_rel(rel_path, child_name), child, depth - 1)
+            for child_name, child in sorted(entries.items(), key=lambda e: (not isinstance(e[1], dict), e[0]))
+        ]
+
+    return described
+
+
+class ProjectTreeIndex:
+    """
+    Keeps one project's nested file tree current without re-walking the whole project.
+
+    Writes made through the fileapi patch only the affected subtree via `refresh_path()`, and
+    `sync()` picks up external edits by re-listing only the directories whose stat changed.
+    Subtrees are replaced copy-on-write, so readers holding `trees[project]` never see a
+    half-applied update. `version` is bumped on every publish; the serialized JSON of the tree
+    and its `digest()`, which ETags are built from, are cached against that version.
+
+    A snapshot of the tree and its directory stats can be persisted, so a new process can
+    `warm_start()` from it and only re-list the directories whose stat changed meanwhile.
+    """
+
+    def __init__(self, project: str, base_dir: str, trees: Dict[str, TreeNode]):
+        self.project = project
+        self.base_dir = base_dir.replace("\\", "/")
+        self.abs_base = os.path.abspath(self.base_dir)
+        self.trees = trees
+        self.dir_stats: Dict[str, DirStat] = {}
+        self.last_sync = 0.0
+        self.version = 0
+        self.scan_seconds = 0.0
+        self.restored = False
+        self.saved_version = -1
+        self._json: Tuple[int, bytes] = (-1, b"")
+        self._digest: Tuple[int, str] = (-1, "")
+        self._staged: Optional[TreeNode] = None
+        self._lock = threading.RLock()
+
+    @property
+    def tree(self) -> TreeNode:
+        return self.trees.get(self.project, {})
+
+    def tree_json(self) -> bytes:
+        """JSON of the materialized tree, serialized at most once per version."""
+        version, data = self._json
+        if version == self.version:
+            return data
+
+        with self._lock:
+            version = self.version
+            data = json.dumps(materialize_tree(self.tree)).encode("utf-8")
+            self._json = (version, data)
+            return data
+
+    def digest(self) -> str:
+        """
+        Hash of the files and directories in the tree, computed at most once per version. Unlike
+        `version`, it is the same in every process that sees the same files, whatever order they were scanned in.
+        """
+        version, digest = self._digest
+        if version == self.version:
+            return digest
+
+        with self._lock:
+            version = self.version
+            data = json.dumps(self.tree, sort_keys=True, separators=(",", ":")).encode("utf-8")
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            self._digest = (version, digest)
+            return digest
+
+    def describe(self, prefix: str = "", depth: int = 1) -> Optional[Dict]:
+        """Describe the node at `prefix` down to `depth` levels, or None if it is not in the tree."""
+        parts = split_rel_path(prefix) if prefix.strip("/") not in ("", ".") else []
+        if parts is None:
+            return None
+
+        node = self.tree
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+
+        return describe_node(parts[-1] if parts else self.project, "/".join(parts), node, depth)
+
+    def rebuild(self) -> None:
+        """Full walk of the project, replacing the published tree and all directory stats."""
+        with self._lock:
+            started = time.perf_counter()
+            dir_stats: Dict[str, DirStat] = {}
+            nested = walk_tree(self.abs_base, dir_stats=dir_stats)
+            self.dir_stats = dir_stats
+            self._publish({"__path__": self.base_dir, **nested})
+            self.last_sync = time.monotonic()
+            self.scan_seconds = time.perf_counter() - started
+            self.restored = False
+
+    def warm_start(self, snapshot_path: str) -> None:
+        """Restore from `snapshot_path` and sync the changes since, or fall back to a full rebuild."""
+        with self._lock:
+            started = time.perf_counter()
+            self.restored = self.load_snapshot(snapshot_path)
+            if self.restored:
+                self.sync()
+                self.scan_seconds = time.perf_counter() - started
+            else:
+                self.rebuild()
+
+        self.save_snapshot(snapshot_path)
+
+    def load_snapshot(self, snapshot_path: str) -> bool:
+        try:
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("base_dir") != self.abs_base \
+                or snapshot.get("exclusions") != EXCLUSIONS_FINGERPRINT:
+            return False
+
+        with self._lock:
+            self.dir_stats = {rel_dir: (mtime_ns, size) for rel_dir, (mtime_ns, size) in snapshot["dir_stats"].items()}
+            self._publish({**snapshot["tree"], "__path__": self.base_dir})
+            self.saved_version = self.version
+        return True
+
+    def save_snapshot(self, snapshot_path: str) -> None:
+        """Persist the tree if it changed since the last save; written atomically via rename."""
+        with self._lock:
+            if self.version == self.saved_version:
+                return
+            # Published trees are never mutated, so only the stats need copying under the lock
+            version, tree, dir_stats = self.version, self.tree, dict(self.dir_stats)
+
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "base_dir": self.abs_base,
+            "exclusions": EXCLUSIONS_FINGERPRINT,
+            "tree": tree,
+            "dir_stats": dir_stats,
+        }
+
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, snapshot_path)
+        self.saved_version = version
+
+    def refresh_path(self, relative_path: str) -> None:
+        """Re-read a single path after it was written, created or deleted."""
+        parts = split_rel_path(relative_path)
+        if not parts or any(is_excluded_dir(part) for part in parts[:-1]):
+            return
+
+        with self._lock:
+            # Start from the first ancestor the index has never seen, so directories that
+            # were created along the way (or already existed on disk) are walked in full.
+            full_depth = len(parts)
+            depth = 1
+            while depth < full_depth and "/".join(parts[:depth]) in self.dir_stats:
+                depth += 1
+
+            parts = parts[:depth]
+            rel_path = "/".join(parts)
+            abs_path = self._abs(rel_path)
+            name = parts[-1]
+
+            if os.path.isdir(abs_path) and not os.path.islink(abs_path) and not is_excluded_dir(name):
+                self._purge_stats(rel_path)
+                self._replace_node(parts, walk_tree(self.abs_base, rel_path, self.dir_stats))
+            elif os.path.isfile(abs_path) and depth == full_depth and not is_excluded_file(name):
+                self._replace_node(parts, None)
+            else:
+                self._purge_stats(rel_path)
+                self._remove_node(parts)
+
+            self._restat("/".join(parts[:-1]))
+
+    def refresh_paths(self, relative_paths: List[str]) -> None:
+        """Re-read several written paths, publishing a single new tree (and version) for all of them."""
+        with self._lock:
+            self._staged = self.tree
+            try:
+                for relative_path in relative_paths:
+                    self.refresh_path(relative_path)
+                staged = self._staged
+            finally:
+                self._staged = None
+
+            if staged is not self.tree:
+                self._publish(staged)
+
+    def sync(self, min_interval: float = 0.0) -> bool:
+        """Re-list directories whose (mtime, size) changed since they were last indexed."""
+        with self._lock:
+            if time.monotonic() - self.last_sync < min_interval:
+                return False
+
+            changed = [
+                rel_dir for rel_dir, signature in self.dir_stats.items()
+                if stat_dir(self._abs(rel_dir)) != signature
+            ]
+
+            # Parents first: a rescanned parent may already have dropped or re-walked its children
+            for rel_dir in sorted(changed, key=lambda d: (d.count("/") if d else -1, d)):
+                if rel_dir in self.dir_stats:
+                    self._rescan_dir(rel_dir)
+
+            self.last_sync = time.monotonic()
+            return bool(changed)
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.join(self.abs_base, rel_path) if rel_path else self.abs_base
+
+    def _restat(self, rel_dir: str) -> None:
+        signature = stat_dir(self._abs(rel_dir))
+        if signature is not None:
+            self.dir_stats[rel_dir] = signature
+
+    def _purge_stats(self, rel_dir: str) -> None:
+        prefix = rel_dir + "/"
+        for key in [k for k in self.dir_stats if k == rel_dir or k.startswith(prefix)]:
+            del self.dir_stats[key]
+
+    def _working_tree(self) -> TreeNode:
+        return self._staged if self._staged is not None else self.tree
+
+    def _node_at(self, parts: List[str]) -> TreeNode:
+        node = self._working_tree()
+        for part in parts:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                return {}
+            node = child
+        return node
+
+    def _copy_path(self, parts: List[str]) -> Tuple[TreeNode, TreeNode]:
+        """Copy the dicts from the root down to the parent of `parts`; returns (root, parent)."""
+        root = dict(self._working_tree())
+        parent = root
+        for part in parts[:-1]:
+            child = parent.get(part)
+            child = dict(child) if isinstance(child, dict) else {}
+            parent[part] = child
+            parent = child
+        return root, parent
+
+    def _replace_node(self, parts: List[str], node: Optional[TreeNode]) -> None:
+        """Swap in a subtree (or a file leaf, for None) at `parts`, copy-on-write."""
+        root, parent = self._copy_path(parts)
+        parent[parts[-1]] = node
+        self._publish(root)
+
+    def _remove_node(self, parts: List[str]) -> None:
+        root, parent = self._copy_path(parts)
+        parent.pop(parts[-1], None)
+        self._publish(root)
+
+    def _publish(self, root: TreeNode) -> None:
+        if self._staged is not None:
+            self._staged = root  # Inside refresh_paths(): published once all paths are applied
+            return
+        self.trees[self.project] = root
+        self.version += 1
+
+    def _rescan_dir(self, rel_dir: str) -> None:
+        parts = rel_dir.split("/") if rel_dir else []
+        abs_dir = self._abs(rel_dir)
+        signature = stat_dir(abs_dir)
+
+        if signature is None or not os.path.isdir(abs_dir):
+            self._purge_stats(rel_dir)
+            if parts:
+                self._remove_node(parts)
+            return
+
+        current = self._node_at(parts)
+        fresh: TreeNode = {"__path__": self.base_dir} if not parts else {}
+
+        try:
+            dirs, files = scan_dir(abs_dir)
+        except OSError:
+            return  # Retried on the next sync, since its stat was not updated
+
+        for name in dirs:
+            rel_child = join_rel(rel_dir, name)
+            existing = current.get(name)
+            if isinstance(existing, dict) and rel_child in self.dir_stats:
+                fresh[name] = existing
+            else:
+                self._purge_stats(rel_child)
+                fresh[name] = walk_tree(self.abs_base, rel_child, self.dir_stats)
+
+        for name in files:
+            fresh[name] = None
+
+        for name, value in current.items():
+            if isinstance(value, dict) and name not in fresh:
+                self._purge_stats(join_rel(rel_dir, name))
+
+        self.dir_stats[rel_dir] = signature
+        if parts:
+            self._replace_node(parts, fresh)
+        else:
+            self._publish(fresh)
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from gpt.lib import GptAgentWithIntro
+from task_manager.models import Agent
+
+# Signals only reach the process that saved; other processes (e.g. Celery workers) rebuild after this many seconds
+AGENT_REGISTRY_TTL_SECONDS = float(os.getenv("AGENT_REGISTRY_TTL_SECONDS", "300"))
+
+
+class RuntimeAgentRegistry:
+    """
+    Runtime agents for every `Agent` row, built once per process and shared by all operations.
+
+    Saving or deleting an Agent, Directive or AgentDirective clears it (see `TaskManagerConfig.ready`),
+    and the next lookup rebuilds it. Bulk updates send no signals; call `invalidate()` after them.
+    """
+
+    def __init__(self, ttl_seconds: float = AGENT_REGISTRY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._agents: Optional[Dict[str, GptAgentWithIntro]] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> GptAgentWithIntro:
+        """Like `Agent.objects.get(name=name).to_runtime_agent()`, raising Agent.DoesNotExist the same way."""
+        agent = self._load().get(name)
+        if agent is None:
+            raise Agent.DoesNotExist(f"Agent matching name={name!r} does not exist.")
+        return agent
+
+    def filter(self, names: Iterable[str]) -> List[GptAgentWithIntro]:
+        """The existing agents among `names`, ordered by name like `Agent.objects.filter(name__in=...)`."""
+        agents = self._load()
+        return [agents[name] for name in sorted(set(names)) if name in agents]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._agents = None
+
+    def _load(self) -> Dict[str, GptAgentWithIntro]:
+        agents = self._agents
+        if agents is not None and time.monotonic() - self._built_at < self.ttl_seconds:
+            return agents
+
+        # Building under the lock makes an invalidation that arrives mid-build wait and clear the result after it
+        with self._lock:
+            if self._agents is None or time.monotonic() - self._built_at >= self.ttl_seconds:
+                self._agents = {agent.name: agent.to_runtime_agent() for agent in Agent.objects.all()}
+                self._built_at = time.monotonic()
+            return self._agents
+
+
+agent_registry = RuntimeAgentRegistry()
+
+
+def invalidate_agent_registry(**kwargs) -> None:
+    # After commit, so another thread cannot rebuild from the rows as they were before this transaction
+    transaction.on_commit(agent_registry.invalidate)
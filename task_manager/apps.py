@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class TaskManagerConfig(AppConfig):
+    name = "task_manager"
+
+    def ready(self):
+        from task_manager.agent_registry import invalidate_agent_registry
+        from task_manager.models import Agent, AgentDirective, Directive
+
+        for model in (Agent, Directive, AgentDirective):
+            post_save.connect(invalidate_agent_registry, sender=model, dispatch_uid=f"agent_registry_{model.__name__}")
+            post_delete.connect(invalidate_agent_registry, sender=model, dispatch_uid=f"agent_registry_{model.__name__}")
@@ -4,7 +4,7 @@ import quicke
 from django.db import models
 
 from gpt.lib import GptAgentWithIntro
-from gpt.tools import project_file_lookup
+from gpt.tools import project_file_lookup, project_file_batch_lookup, project_grep
 from quicke.lib import BaseModel
 from agents import Agent as GptAgent
 
@@ -44,7 +44,7 @@ class Agent(BaseModel):
             name=self.name,
             instructions=(self.persona or "") + "\n\n",
             model=self.model_name,
-            tools=tools or [project_file_lookup],
+            tools=tools or [project_file_lookup, project_file_batch_lookup, project_grep],
         )
         gpt_agent.intro = self.intro
 
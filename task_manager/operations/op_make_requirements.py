@@ -1,25 +1,28 @@
 # rainer/operations/op_make_requirements.py
-import json
 import uuid
 import logging
+from typing import Optional
 
-from rainer import project_trees
-from task_manager.models import Agent
+from task_manager.agent_registry import agent_registry
 from rainer.operations.lib import AgentOperationSpec
+from rainer.operations.telemetry import OperationTelemetry
+from rainer.rate_limits import BATCH
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
 class RequirementsSpec(AgentOperationSpec):
+    operation = "requirements"
+    lane = BATCH  # Planning runs from the command line; it yields to operations someone is waiting on
+
     def init(self):
         logging.info("Initialized RequirementsSpec with parameters")
-        self.add_as_user([
-            f"""
+        self.add_project_tree("""
 --- PROJECT FILES ---
 --- THESE ARE ALL THE FILES THAT CURRENTLY EXIST IN THE PROJECT --- 
-{json.dumps(project_trees.get(self.project, {}))}
-""",
+""", "\n")
+        self.add_as_user([
             f"""
 --- TASK DECOMPOSITION REQUEST ---
 PROJECT (CASE SENSITIVE): {self.project}
@@ -29,6 +32,7 @@ TASK INSTRUCTION: {self.output_instruction}
 --- GUIDELINES ---
 - Use only information that can be reasonably inferred or verified by accessing project files through `project_file_lookup`.
 - If file inspection is required, you must issue a query stating exactly which file(s) need to be looked up.
+- To inspect several files, look them up together with `project_file_batch_lookup`.
 - DO NOT invent any details or dependencies unless they are strictly required.
 - If nothing can be done due to ambiguity, output only `>>>TASK_FAILED`.
 - Otherwise, work step-by-step to produce a clear and complete checklist for the task.
@@ -38,7 +42,7 @@ TASK INSTRUCTION: {self.output_instruction}
 
         logging.info("Initialized OVERDRIVE for checklist decomposition")
 
-    def loop(self):
+    async def loop(self):
         self.add_as_user([
             f"""
 OVERDRIVE, try to implement the TASK INSTRUCTION.
@@ -46,7 +50,7 @@ IF the checklist needs more refinement, output only >>>TASK_REFINEMENT.
 ELSE return the final checklist as a JSON list of strings.
 REMEMBER: Final task output must start with >>>TASK_RESULT or >>>TASK_FAILED and be final."""
         ])
-        self.run_with_agent(self.lead)
+        await self.run_with_agent(self.lead)
 
     def done_if(self) -> bool:
         return (self.last_message or "").strip().startswith(">>>TASK_RESULT") or \
@@ -55,11 +59,11 @@ REMEMBER: Final task output must start with >>>TASK_RESULT or >>>TASK_FAILED and
 
 # --- Entry Point ---
 
-def execute(project: str, task_instruction: str):
+def make_spec(project: str, task_instruction: str, telemetry: Optional[OperationTelemetry] = None) -> RequirementsSpec:
     conversation_id = uuid.uuid4().hex[:16]
 
-    # Load OVERDRIVE from DB
-    overdrive_agent = Agent.objects.get(name="OVERDRIVE")
+    # Runtime OVERDRIVE, cached per process
+    overdrive_agent = agent_registry.get("OVERDRIVE")
 
     return RequirementsSpec(
         conversation_id=conversation_id,
@@ -67,6 +71,11 @@ def execute(project: str, task_instruction: str):
         instruction=task_instruction,
         max_steps=10,
         output_instruction="Generate a PLAINTEXT JSON list of strings representing minimal, explicit, actionable checklist items which, if implemented, result in the INTENDED OUTCOME",
-        lead=overdrive_agent.to_runtime_agent(),
-        trace=f"CHECKLIST : {project} | {task_instruction}"
-    ).run()
+        lead=overdrive_agent,
+        trace=f"CHECKLIST : {project} | {task_instruction}",
+        telemetry=telemetry
+    )
+
+
+def execute(project: str, task_instruction: str):
+    return make_spec(project, task_instruction).run()